@@ -0,0 +1,68 @@
+"""
+Benchmarks restoring the alarm store at startup.
+
+Run from the root folder: python -m benchmarks.bench_alarm_store
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+ALARM_COUNT = 100_000
+
+# The longest time restoring ALARM_COUNT alarms may take, in seconds
+RESTORE_BUDGET = 1.0
+
+
+def main():
+    """
+    Stores ALARM_COUNT alarms, then times restoring them like the alarm scheduler
+    does when the server starts, which loads them from the store and schedules
+    their timers and prefetches. Exits with an error if it takes longer than RESTORE_BUDGET.
+    """
+    start_time = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # the scheduler starts with the server, so the path is set before importing it
+        os.environ["ALARM_STORE_PATH"] = os.path.join(temp_dir, "alarms.db")
+
+        # pylint: disable=import-outside-toplevel
+        from server.routes.alarms.alarm_scheduler import (
+            get_alarms_between,
+            __restore_alarms,
+        )
+        from server.routes.alarms.alarm_store import AlarmStore
+
+        store = AlarmStore(os.environ["ALARM_STORE_PATH"])
+        store.save_many(
+            {
+                "title": f"alarm {i}",
+                "scheduled_time": start_time + datetime.timedelta(seconds=i),
+                "include_news": i % 2 == 0,
+                "include_weather": i % 3 == 0,
+            }
+            for i in range(ALARM_COUNT)
+        )
+        store.close()
+
+        started_at = time.perf_counter()
+        __restore_alarms()
+        restored_at = time.perf_counter()
+
+        alarm_count = len(
+            get_alarms_between(start_time, start_time + datetime.timedelta(days=2))
+        )
+
+    restore_time = restored_at - started_at
+
+    print(f"alarms:    {alarm_count}")
+    print(f"restore:   {restore_time:.3f}s")
+
+    if restore_time > RESTORE_BUDGET:
+        sys.exit(f"Restoring took longer than {RESTORE_BUDGET}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmarks the time it takes to import the server, with python -X importtime,
+and checks that modules loaded on first use are not imported with the server.
+
+Run from the root folder: python -m benchmarks.bench_import_time
+"""
+
+import statistics
+import subprocess
+import sys
+from typing import Dict, Tuple
+
+RUN_COUNT = 5
+
+# The number of slowest modules listed
+TOP_MODULE_COUNT = 10
+
+# Modules that are only imported when they are first used
+LAZY_MODULES = ("numpy", "pyttsx3", "uk_covid19")
+
+
+def import_times() -> Dict[str, Tuple[int, int]]:
+    """
+    Imports the server in a new interpreter.
+
+    :returns: A map of imported module names to their self and cumulative import times,
+    in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+
+    # lines look like: "import time:       345 |        345 |     pyttsx3"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_time, cumulative_time, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_time), int(cumulative_time))
+
+    return times
+
+
+def main():
+    """
+    Imports the server RUN_COUNT times, prints the median import time
+    and the slowest modules of the last run, and exits with an error
+    if any of LAZY_MODULES is imported.
+    """
+    runs = [import_times() for _ in range(RUN_COUNT)]
+    total_times = [times["server"][1] for times in runs]
+
+    print(f"import server: {statistics.median(total_times) / 1000:.1f}ms (median)")
+
+    for name, (self_time, cumulative_time) in sorted(
+        runs[-1].items(), key=lambda item: item[1][1], reverse=True
+    )[:TOP_MODULE_COUNT]:
+        print(
+            f"{name:>40}: {cumulative_time / 1000:.1f}ms ({self_time / 1000:.1f}ms self)"
+        )
+
+    eager_modules = [name for name in LAZY_MODULES if name in runs[-1]]
+
+    if eager_modules:
+        sys.exit(f"Imported with the server: {', '.join(eager_modules)}")
+
+
+if __name__ == "__main__":
+    main()
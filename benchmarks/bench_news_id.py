@@ -0,0 +1,70 @@
+"""
+Benchmarks calculate_news_id against the character-sum id it replaced.
+
+Run from the root folder: python -m benchmarks.bench_news_id
+"""
+
+import random
+import string
+import timeit
+from functools import reduce
+
+from server.api.news import calculate_news_id
+
+HEADLINE_COUNT = 10_000
+
+
+def character_sum_id(title: str, description: str) -> str:
+    """
+    The previous news id: the sum of the unicode values of every character, in hex.
+    """
+    return hex(
+        reduce(
+            lambda final, char: final + ord(char),
+            ((title or "") + (description or "")).lower(),
+            0,
+        )
+    )
+
+
+def random_headline(rng: random.Random):
+    """
+    Returns a random (title, description) pair of realistic lengths.
+    """
+
+    def words(count: int) -> str:
+        return " ".join(
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+            for _ in range(count)
+        )
+
+    return words(rng.randint(8, 15)), words(rng.randint(20, 40))
+
+
+def main():
+    """
+    Times both ids over HEADLINE_COUNT headlines and counts their collisions.
+    """
+    rng = random.Random(0)
+    headlines = [random_headline(rng) for _ in range(HEADLINE_COUNT)]
+
+    for name, news_id in (
+        ("character sum", character_sum_id),
+        ("fingerprint", calculate_news_id),
+    ):
+        duration = timeit.timeit(
+            lambda: [news_id(title, description) for title, description in headlines],
+            number=5,
+        )
+        distinct_ids = len(
+            {news_id(title, description) for title, description in headlines}
+        )
+
+        print(
+            f"{name:>14}: {duration / 5 * 1e6 / HEADLINE_COUNT:.2f}us per headline, "
+            f"{HEADLINE_COUNT - distinct_ids} collisions in {HEADLINE_COUNT} headlines"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Benchmarks reading the notifications from the published snapshot
+against reading them from the notification store.
+
+Run from the root folder: python -m benchmarks.bench_notifications
+"""
+
+import timeit
+
+from server.routes.alarms.notification_store import NotificationStore
+
+NOTIFICATION_COUNT = 100
+
+READ_COUNT = 100_000
+
+
+def main():
+    """
+    Times reading a full store of NOTIFICATION_COUNT notifications READ_COUNT times.
+    """
+    store = NotificationStore(max_size=NOTIFICATION_COUNT, max_age=24 * 60 * 60)
+
+    for index in range(NOTIFICATION_COUNT):
+        store[f"id{index}"] = {"title": f"title {index}", "content": "content"}
+
+    snapshot = store.snapshot()
+
+    for name, read in (
+        ("store", store.values),
+        ("snapshot", lambda: snapshot[1]),
+    ):
+        duration = timeit.timeit(read, number=READ_COUNT)
+
+        print(f"{name:>8}: {duration / READ_COUNT * 1e6:.3f}us per read")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ from server import server
 import json
 import os
 import logging
-from typing import Dict
+from typing import Dict, Any
 from flask import Flask
 
 from server.utils.logger import LoggerMiddleware
@@ -40,10 +40,11 @@ def __load_envs():
     """
     with open(CONFIG_PATH, "r") as config_file:
         # load json key val pairs into a dict
-        configs: Dict[str, str] = json.load(config_file)
+        configs: Dict[str, Any] = json.load(config_file)
 
         for key, val in configs.items():
-            os.environ[key.upper()] = val
+            # numeric options are stored as strings, like every environment variable
+            os.environ[key.upper()] = str(val)
 
 
 # === server initialization === #
@@ -62,3 +63,8 @@ app = Flask(__name__, template_folder=os.environ["TEMPLATES_PATH"])
 # and they must be imported *after* Flask is initialized.
 # pylint: disable=wrong-import-position, unused-import
 import server.routes
+from server.routes.alarms.alarm_scheduler import start_alarm_scheduler
+
+# Restores the stored alarms when the server starts, so they fire after a restart
+# even if no request comes in.
+start_alarm_scheduler()
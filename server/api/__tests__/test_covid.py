@@ -5,9 +5,13 @@ Test code for server.api.covid
 import datetime
 from pytest_mock import mock, MockerFixture
 
+from server.api.covid_store import CovidStore
 from server.api.covid import (
     fetch_covid_data,
-    __covid_api_client,
+    fetch_covid_trends,
+    covid_cache_stats,
+    __covid_cache,
+    __synced_area_types,
     __get_date,
     __get_new_cases_count,
     __get_cumulative_cases_count,
@@ -55,14 +59,56 @@ __mock_api_result = {
 __mock_today = datetime.datetime.strptime("2020-07-28", "%Y-%m-%d").date()
 
 
-def test_fetch_covid_data(mocker: MockerFixture):
-    mocker.patch.object(
-        __covid_api_client,
-        "get_json",
-        lambda: __mock_api_result,
-    )
+def __mock_covid_api(data_points, queries):
+    """
+    Creates a replacement of __covid_api answering queries from the given data points,
+    and recording the filters and the latest_by metric of every query.
+    """
+
+    def query_covid_api(filters, structure, latest_by=None):
+        queries.append((filters, latest_by))
+        conditions = dict(query_filter.split("=") for query_filter in filters)
+        matching = sorted(
+            (
+                data_point
+                for data_point in data_points
+                if all(
+                    data_point.get(key, value) == value
+                    for key, value in conditions.items()
+                    if key != "areaType"
+                )
+            ),
+            key=lambda data_point: data_point["date"],
+            reverse=True,
+        )
+
+        if latest_by:
+            latest = {}
+            for data_point in matching:
+                latest.setdefault(data_point["areaName"], data_point)
+            matching = list(latest.values())
+
+        return mock.Mock(get_json=lambda: {"data": matching})
+
+    return query_covid_api
+
+
+def __reset_covid_state(mocker: MockerFixture, tmp_path, store: CovidStore):
+    __covid_cache.clear()
+    __synced_area_types.clear()
+    mocker.patch("server.api.covid.__covid_store", store)
+    mocker.patch("server.api.covid.__covid_series_path", str(tmp_path))
     mocker.patch("datetime.date", mock.Mock(today=lambda: __mock_today))
 
+
+def test_fetch_covid_data(mocker: MockerFixture, tmp_path):
+    __reset_covid_state(mocker, tmp_path, CovidStore(":memory:"))
+    queries = []
+    mocker.patch(
+        "server.api.covid.__covid_api",
+        __mock_covid_api(__mock_api_result["data"], queries),
+    )
+
     result = fetch_covid_data()
 
     assert result[0]
@@ -70,6 +116,210 @@ def test_fetch_covid_data(mocker: MockerFixture):
     assert result[3] == 259022
     assert result[4] == 20
     assert result[5] == 41282
+    # the whole series is downloaded once, then the area type is synced
+    assert queries == [
+        (["areaType=nation", "areaName=England"], None),
+        (["areaType=nation"], "newCasesByPublishDate"),
+    ]
+
+
+def test_fetch_covid_data_cached(mocker: MockerFixture, tmp_path):
+    __reset_covid_state(mocker, tmp_path, CovidStore(":memory:"))
+    queries = []
+    mocker.patch(
+        "server.api.covid.__covid_api",
+        __mock_covid_api(__mock_api_result["data"], queries),
+    )
+
+    first = fetch_covid_data()
+    second = fetch_covid_data()
+
+    assert first == second
+    assert len(queries) == 2
+    assert covid_cache_stats()["hits"] == 1
+    assert covid_cache_stats()["misses"] == 1
+
+
+def test_fetch_covid_data_incremental(mocker: MockerFixture, tmp_path):
+    store = CovidStore(":memory:")
+    store.save_points(
+        "nation",
+        "England",
+        [
+            {**__mock_api_result["data"][1], "newDeathsByDeathDate": None},
+            {**__mock_data_point, "areaName": "England", "date": "2020-07-26"},
+        ],
+    )
+    __reset_covid_state(mocker, tmp_path, store)
+    queries = []
+    mocker.patch(
+        "server.api.covid.__covid_api",
+        __mock_covid_api(__mock_api_result["data"], queries),
+    )
+
+    result = fetch_covid_data()
+
+    # the latest day, then the stored days that may have been revised
+    assert queries == [
+        (["areaType=nation"], "newCasesByPublishDate"),
+        (["areaType=nation", "date=2020-07-27"], None),
+        (["areaType=nation", "date=2020-07-26"], None),
+    ]
+    assert result[2] == 547
+    assert result[4] == 20
+    assert store.latest_date("nation", "England") == "2020-07-28"
+
+
+def test_fetch_covid_data_up_to_date(mocker: MockerFixture, tmp_path):
+    store = CovidStore(":memory:")
+    store.save_points("nation", "England", __mock_api_result["data"])
+    __reset_covid_state(mocker, tmp_path, store)
+    queries = []
+    mocker.patch(
+        "server.api.covid.__covid_api",
+        __mock_covid_api(__mock_api_result["data"], queries),
+    )
+
+    result = fetch_covid_data("nation", "England")
+
+    assert queries == [(["areaType=nation"], "newCasesByPublishDate")]
+    assert result[3] == 259022
+    assert result[5] == 41282
+
+
+def test_fetch_covid_data_of_many_areas(mocker: MockerFixture, tmp_path):
+    nations = ["England", "Wales", "Scotland"]
+    data_points = [
+        {
+            **data_point,
+            "areaName": nation,
+            "areaCode": f"code-{nation}",
+            "newCasesByPublishDate": data_point["newCasesByPublishDate"] + index,
+        }
+        for index, nation in enumerate(nations)
+        for data_point in __mock_api_result["data"]
+    ]
+    data_points.append(
+        {**__mock_api_result["data"][0], "areaName": "South West", "areaCode": "sw"}
+    )
+    data_points.append(
+        {**__mock_api_result["data"][1], "areaName": "South West", "areaCode": "sw"}
+    )
+    store = CovidStore(":memory:")
+    for nation in nations:
+        # every stored nation is missing the latest day
+        store.save_points(
+            "nation",
+            nation,
+            [
+                data_point
+                for data_point in data_points
+                if data_point["areaName"] == nation
+                and data_point["date"] == "2020-07-27"
+            ],
+        )
+    __reset_covid_state(mocker, tmp_path, store)
+    queries = []
+    mocker.patch("server.api.covid.__covid_api", __mock_covid_api(data_points, queries))
+
+    results = [
+        fetch_covid_data(*area)
+        for area in [
+            ("nation", "England"),
+            ("nation", "Wales"),
+            ("nation", "Scotland"),
+            ("region", "South West"),
+        ]
+    ]
+
+    assert [result[2] for result in results] == [547, 548, 549, 547]
+    # nations are synced together, and the new region is downloaded by its name
+    assert queries == [
+        (["areaType=nation"], "newCasesByPublishDate"),
+        (["areaType=nation", "date=2020-07-27"], None),
+        (["areaType=nation", "date=2020-07-26"], None),
+        (["areaType=region", "areaName=South West"], None),
+        (["areaType=region"], "newCasesByPublishDate"),
+    ]
+
+
+def test_fetch_covid_data_far_behind(mocker: MockerFixture, tmp_path):
+    regions = ["South West", "London", "North East"]
+    data_points = [
+        {**data_point, "areaName": region, "areaCode": f"code-{region}"}
+        for region in regions
+        for data_point in __mock_api_result["data"]
+    ]
+    store = CovidStore(":memory:")
+    for region in regions[:2]:
+        store.save_points(
+            "region",
+            region,
+            [
+                {
+                    **__mock_data_point,
+                    "areaName": region,
+                    "areaCode": f"code-{region}",
+                    "date": "2020-07-01",
+                }
+            ],
+        )
+    __reset_covid_state(mocker, tmp_path, store)
+    queries = []
+    mocker.patch("server.api.covid.__covid_api", __mock_covid_api(data_points, queries))
+
+    result = fetch_covid_data("region", "South West")
+
+    assert result[2] == 547
+    assert store.latest_date("region", "London") == "2020-07-28"
+    assert queries[0] == (["areaType=region"], "newCasesByPublishDate")
+    # the stored regions are downloaded again by their names, at the same time
+    assert sorted(queries[1:]) == [
+        (["areaType=region", "areaName=London"], None),
+        (["areaType=region", "areaName=South West"], None),
+    ]
+
+
+def test_fetch_covid_trends(mocker: MockerFixture, tmp_path):
+    store = CovidStore(":memory:")
+    mocker.patch("server.api.covid.__covid_store", store)
+    mocker.patch("server.api.covid.__covid_series_path", str(tmp_path))
+
+    assert fetch_covid_trends() is None
+
+    # 100 new cases a day in the first week, then 150 a day
+    store.save_points(
+        "nation",
+        "England",
+        [
+            {
+                "date": (
+                    datetime.datetime(2020, 7, 1) + datetime.timedelta(days=day)
+                ).strftime("%Y-%m-%d"),
+                "areaCode": "E92000001",
+                "newCasesByPublishDate": 100 if day < 7 else 150,
+                "newDeathsByDeathDate": 10 if day < 12 else None,
+            }
+            for day in range(14)
+        ],
+    )
+
+    trends = fetch_covid_trends()
+
+    assert trends["date"] == datetime.date(2020, 7, 14)
+    assert trends["new_cases_average"] == 150
+    assert trends["new_cases_growth"] == 0.5
+    assert round(trends["new_cases_per_100k"], 3) == 0.266
+    assert trends["new_deaths_average"] == 10
+
+    store.save_points(
+        "region",
+        "South West",
+        [{**__mock_data_point, "areaName": "South West", "areaCode": "E12000009"}],
+    )
+
+    # only the populations of nations are known
+    assert fetch_covid_trends("region", "South West")["new_cases_per_100k"] is None
 
 
 def test_get_date():
@@ -0,0 +1,85 @@
+"""
+Test code for server.api.covid_series
+"""
+
+import numpy as np
+
+from server.api.covid_series import (
+    load_series,
+    per_100k,
+    rolling_average,
+    week_over_week_growth,
+    write_series,
+)
+
+__data_points = [
+    {
+        "date": "2020-07-28",
+        "areaCode": "E92000001",
+        "newCasesByPublishDate": 547,
+        "cumCasesByPublishDate": 259022,
+        "newDeathsByDeathDate": None,
+        "cumDeathsByDeathDate": None,
+    },
+    {
+        "date": "2020-07-27",
+        "areaCode": "E92000001",
+        "newCasesByPublishDate": 616,
+        "cumCasesByPublishDate": 258475,
+        "newDeathsByDeathDate": 20,
+        "cumDeathsByDeathDate": 41282,
+    },
+]
+
+
+def test_write_and_load_series(tmp_path):
+    write_series(str(tmp_path), "E92000001", __data_points)
+    series = load_series(str(tmp_path), "E92000001")
+
+    assert len(series) == 2
+    # series are ordered oldest first
+    assert list(series.dates.astype(str)) == ["2020-07-27", "2020-07-28"]
+    assert list(series["new_cases"]) == [616, 547]
+    assert series["new_deaths"][0] == 20
+    assert np.isnan(series["new_deaths"][1])
+    assert isinstance(series["cum_cases"].base, np.memmap)
+    assert load_series(str(tmp_path), "W92000004") is None
+
+
+def test_load_series_reloads_written_series(tmp_path):
+    write_series(str(tmp_path), "E92000001", __data_points[1:])
+    series = load_series(str(tmp_path), "E92000001")
+
+    assert load_series(str(tmp_path), "E92000001") is series
+
+    write_series(str(tmp_path), "E92000001", __data_points)
+
+    assert len(load_series(str(tmp_path), "E92000001")) == 2
+    # the previously loaded series is still readable
+    assert len(series) == 1
+
+
+def test_rolling_average():
+    values = np.array([1, 2, 3, np.nan, 5, np.nan, np.nan, np.nan])
+    averages = rolling_average(values, window=3)
+
+    assert np.isnan(averages[:2]).all()
+    assert list(averages[2:7]) == [2, 2.5, 4, 5, 5]
+    # no values in the window
+    assert np.isnan(averages[7])
+    assert np.isnan(rolling_average(np.array([1.0]))).all()
+
+
+def test_week_over_week_growth():
+    values = np.array([10.0] * 7 + [20.0] * 7 + [0.0] * 7 + [5.0] * 7)
+    growth = week_over_week_growth(values)
+
+    assert np.isnan(growth[:13]).all()
+    assert growth[13] == 1
+    assert growth[20] == -1
+    # growth from zero is undefined
+    assert np.isnan(growth[27])
+
+
+def test_per_100k():
+    assert list(per_100k(np.array([50.0, 100.0]), 200000)) == [25, 50]
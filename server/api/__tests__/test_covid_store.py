@@ -0,0 +1,71 @@
+"""
+Test code for server.api.covid_store
+"""
+
+from server.api.covid_store import CovidStore
+
+__data_points = [
+    {
+        "date": "2020-07-27",
+        "areaName": "England",
+        "areaCode": "E92000001",
+        "newCasesByPublishDate": 616,
+        "cumCasesByPublishDate": 258475,
+        "newDeathsByDeathDate": None,
+        "cumDeathsByDeathDate": None,
+    },
+    {
+        "date": "2020-07-28",
+        "areaName": "England",
+        "areaCode": "E92000001",
+        "newCasesByPublishDate": 547,
+        "cumCasesByPublishDate": 259022,
+        "newDeathsByDeathDate": None,
+        "cumDeathsByDeathDate": None,
+    },
+]
+
+
+def test_latest_points():
+    store = CovidStore(":memory:")
+
+    assert store.latest_date("nation", "England") is None
+
+    store.save_points("nation", "England", __data_points)
+
+    assert store.latest_date("nation", "England") == "2020-07-28"
+    assert store.latest_date("nation", "Wales") is None
+    assert store.latest_points("nation", "England", 2) == __data_points[::-1]
+    assert store.latest_points("nation", "England", 1) == __data_points[1:]
+
+
+def test_save_points_replaces_revised_points():
+    store = CovidStore(":memory:")
+    store.save_points("nation", "England", __data_points)
+
+    revised = {**__data_points[0], "newDeathsByDeathDate": 20}
+    store.save_points("nation", "England", [revised])
+
+    assert store.latest_points("nation", "England", 2) == [__data_points[1], revised]
+
+
+def test_store_survives_restart(tmp_path):
+    path = str(tmp_path / "covid.db")
+    store = CovidStore(path)
+    store.save_points("nation", "England", __data_points)
+    store.close()
+
+    assert CovidStore(path).latest_date("nation", "England") == "2020-07-28"
+
+
+def test_latest_dates():
+    store = CovidStore(":memory:")
+    store.save_points("nation", "England", __data_points)
+    store.save_points("nation", "Wales", __data_points[:1])
+    store.save_points("region", "South West", __data_points)
+
+    assert store.latest_dates("nation") == {
+        "England": "2020-07-28",
+        "Wales": "2020-07-27",
+    }
+    assert store.latest_dates("utla") == {}
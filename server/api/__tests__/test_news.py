@@ -1,4 +1,3 @@
-import requests
 import logging
 from pytest_mock import mock, MockerFixture
 
@@ -39,8 +38,8 @@ def test_fetch_news_headlines(mocker: MockerFixture):
         "os.environ",
         {"NEWS_API_KEY": __MOCK_API_KEY},
     )
-    mocker.patch(
-        "requests.get",
+    http_get = mocker.patch(
+        "server.api.news.http_get",
         return_value=mock.Mock(json=lambda: __MOCK_API_RESULT),
         autospec=True,
     )
@@ -49,8 +48,7 @@ def test_fetch_news_headlines(mocker: MockerFixture):
 
     assert len(result) == 2
 
-    # pylint: disable=no-member
-    requests.get.assert_called_once_with(
+    http_get.assert_called_once_with(
         f"{NEWS_API_URL}/v2/top-headlines",
         {"country": __mock_country, "apiKey": __MOCK_API_KEY},
     )
@@ -67,7 +65,9 @@ def test_calculate_news_id(mocker: MockerFixture):
         description="descriPtion",
     )
 
-    assert test_id == hex(0x6C6)
+    assert test_id == calculate_news_id(title="title ", description="DESCRIPTION")
+    # reordered characters no longer collide
+    assert test_id != calculate_news_id(title="eltit", description="description")
 
     invalid = calculate_news_id(1, 1)
 
@@ -1,7 +1,16 @@
-import requests
 from pytest_mock import mock, MockerFixture
 
-from server.api.weather import OPEN_WEATHER_API_URL, fetch_weather
+import requests
+
+from server.api.weather import (
+    OPEN_WEATHER_API_URL,
+    fetch_weather,
+    refresh_hot_weather_cells,
+    __cell_accesses,
+    __weather_cache,
+)
+from server.utils.cache import TTLCache
+from server.utils.geohash import decode_geohash
 
 __MOCK_API_KEY = "api-key"
 
@@ -39,8 +48,9 @@ __MOCK_API_RESULT = {
 
 
 def test_fetch_weather(mocker: MockerFixture):
-    mocker.patch(
-        "requests.get",
+    __weather_cache.clear()
+    http_get = mocker.patch(
+        "server.api.weather.http_get",
         return_value=mock.Mock(json=lambda: __MOCK_API_RESULT),
         autospec=True,
     )
@@ -52,10 +62,12 @@ def test_fetch_weather(mocker: MockerFixture):
 
     mock_lat = 0
     mock_long = 0
+    # the weather of the center of the geohash cell of the location is requested
+    cell_lat, cell_long = decode_geohash("s0000")
     expected_url = f"{OPEN_WEATHER_API_URL}/weather"
     expected_params = {
-        "lat": mock_lat,
-        "lon": mock_long,
+        "lat": cell_lat,
+        "lon": cell_long,
         "appid": __MOCK_API_KEY,
         "units": "metric",
     }
@@ -63,8 +75,85 @@ def test_fetch_weather(mocker: MockerFixture):
     result = fetch_weather(mock_lat, mock_long)
 
     assert result == __MOCK_API_RESULT
-    # pylint: disable=no-member
-    requests.get.assert_called_once_with(
+    http_get.assert_called_once_with(
         expected_url,
         expected_params,
     )
+
+
+class __MockClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def __patch_weather_cache(mocker: MockerFixture, clock: __MockClock) -> TTLCache:
+    cache = TTLCache(ttl=600, stale_ttl=1800, clock=clock, max_size=2)
+    mocker.patch("server.api.weather.__weather_cache", cache)
+    mocker.patch("server.api.weather.__clock", clock)
+    mocker.patch("server.api.weather.__refresh_thread", mock.Mock())
+    mocker.patch("os.environ", {"OPEN_WEATHER_API_KEY": __MOCK_API_KEY})
+    __cell_accesses.clear()
+
+    return cache
+
+
+def test_fetch_weather_shares_nearby_locations(mocker: MockerFixture):
+    __patch_weather_cache(mocker, __MockClock())
+    http_get = mocker.patch(
+        "server.api.weather.http_get",
+        return_value=mock.Mock(json=lambda: __MOCK_API_RESULT),
+    )
+
+    # two locations in Exeter about 1km apart, and one in London
+    assert fetch_weather(50.7184, -3.5339) == __MOCK_API_RESULT
+    assert fetch_weather(50.7240, -3.5275) == __MOCK_API_RESULT
+    fetch_weather(51.5074, -0.1278)
+
+    assert http_get.call_count == 2
+
+
+def test_fetch_weather_error_is_not_cached(mocker: MockerFixture):
+    __patch_weather_cache(mocker, __MockClock())
+    http_get = mocker.patch(
+        "server.api.weather.http_get",
+        side_effect=[
+            requests.ConnectionError(),
+            mock.Mock(json=lambda: __MOCK_API_RESULT),
+        ],
+    )
+
+    assert fetch_weather(0, 0) == {}
+    assert fetch_weather(0, 0) == __MOCK_API_RESULT
+    assert http_get.call_count == 2
+
+
+def test_refresh_hot_weather_cells(mocker: MockerFixture):
+    clock = __MockClock()
+    cache = __patch_weather_cache(mocker, clock)
+    http_get = mocker.patch(
+        "server.api.weather.http_get",
+        return_value=mock.Mock(json=lambda: __MOCK_API_RESULT),
+    )
+
+    fetch_weather(50.7184, -3.5339)
+    clock.now = 300
+    fetch_weather(51.5074, -0.1278)
+
+    # neither cell is close to expiring
+    assert refresh_hot_weather_cells() == 0
+
+    clock.now = 590
+
+    # Exeter expires before the next refresh
+    assert refresh_hot_weather_cells() == 1
+    assert cache.age("gcj2x") == 0
+    assert http_get.call_count == 3
+
+    clock.now = 850
+
+    # Exeter hasn't been asked for within the ttl, so only London is refreshed
+    assert refresh_hot_weather_cells() == 1
+    assert list(__cell_accesses) == ["gcpvj"]
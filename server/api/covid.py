@@ -1,19 +1,34 @@
 """
 This module handles interaction with the uk-covid19 API.
+
+Covid data is available for any area, identified by its area type and name,
+e.g. ("nation", "England") or ("region", "South West"). The time series of every area
+asked for is kept in a local store. The API is asked for new days once per area type,
+so the cost of keeping many areas of the same type up to date doesn't grow with their number.
 """
 
 import datetime
-from typing import Dict, Any, Tuple
-
-from uk_covid19 import Cov19API
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Any, List, Optional, Tuple
 
+from server.api.covid_store import CovidStore
+from server.utils.cache import TTLCache
 from server.utils.logger import log_exception
+from server.utils.single_flight import SingleFlight
 
-# A filter that shows only covid cases in England
-__CASE_FILTER_ENGLAND = [
-    "areaType=nation",
-    "areaName=England",
-]
+# Number of people living in each nation by area code, from ONS mid-2019 estimates.
+# Used to calculate rates per 100,000 people, which are only available for these nations:
+# the populations of regions and local authorities change with their boundaries,
+# so rates of other areas are None rather than calculated from outdated figures.
+__POPULATIONS = {
+    "E92000001": 56286961,
+    "N92000002": 1893667,
+    "S92000003": 5463300,
+    "W92000004": 3152879,
+}
 
 # The shape of the data we want. The API will return an array of json objects of this shape.
 __DATA_SHAPE = {
@@ -34,16 +49,70 @@ __DATA_SHAPE = {
 # The format of the date stored in a data point
 __DATE_FORMAT = "%Y-%m-%d"
 
-__covid_api_client = Cov19API(
-    filters=__CASE_FILTER_ENGLAND,
-    structure=__DATA_SHAPE,
+# Number of seconds fetched covid data is served without contacting the API.
+# The dataset is updated at most once a day.
+__COVID_CACHE_TTL = 10 * 60
+
+# Number of seconds after the ttl during which outdated covid data is still served
+# while it is refreshed in the background.
+__COVID_CACHE_STALE_TTL = 24 * 60 * 60
+
+# The metric used to ask the API for its latest data points
+__LATEST_BY_METRIC = "newCasesByPublishDate"
+
+# Number of stored days that are fetched again when a new day is published,
+# because deaths by death date are revised for a while after they are first published.
+__REVISED_DAYS = 2
+
+# When more days than this are missing from the store, the whole series of the areas
+# is downloaded again, which takes fewer API calls than asking for every missing day.
+__MAX_MISSING_DAYS = 14
+
+# a local copy of the time series, so only new days are fetched from the API.
+# Opened by __get_covid_store on first use, so importing the server doesn't touch the database.
+__covid_store: Optional[CovidStore] = None
+__covid_store_lock = Lock()
+
+# the folder the time series are also stored in as columns, to calculate trends over them
+__covid_series_path = os.environ.get("COVID_SERIES_PATH", ".covid_series")
+
+# a map of (area type, area name) to the latest covid data of the area
+__covid_cache = TTLCache(ttl=__COVID_CACHE_TTL, stale_ttl=__COVID_CACHE_STALE_TTL)
+
+# a map of area types to whether the stored areas of that type were recently synced
+__synced_area_types = TTLCache(ttl=__COVID_CACHE_TTL)
+
+# coalesces concurrent cache misses, refreshes and syncs into one API call
+__covid_flight = SingleFlight()
+
+# runs the queries downloading the series of several areas at the same time
+__download_executor = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="covid-download"
 )
 
 
-def fetch_covid_data() -> Tuple[bool, int, int, int, int]:
+def covid_area() -> Tuple[str, str]:
+    """
+    Returns the (area type, area name) covid data is shown for by default,
+    which can be configured with covid_area_type and covid_area_name.
+    """
+    return (
+        os.environ.get("COVID_AREA_TYPE", "nation"),
+        os.environ.get("COVID_AREA_NAME", "England"),
+    )
+
+
+def fetch_covid_data(
+    area_type: str = None, area_name: str = None
+) -> Tuple[bool, int, int, int, int]:
     """
-    Retrieves the latest Covid19 data from official uk-covid19 API represented in a Tuple.
+    Retrieves the latest Covid19 data of an area from official uk-covid19 API represented in a Tuple.
+    The data is cached; outdated data is served while it is refreshed in the background.
+    Only days that are not in the local store of the time series are fetched from the API.
 
+    :params area_type: The type of the area, e.g. "nation", "region", "utla" or "ltla".
+    Defaults to the type returned by covid_area.
+    :params area_name: The name of the area, e.g. "England". Defaults to the name returned by covid_area.
     :returns: A tuple that represents the latest Covid19 data.
     The first item tells whether the data is the latest. For example, this will be false
     if today's data is not available from the API.
@@ -55,10 +124,103 @@ def fetch_covid_data() -> Tuple[bool, int, int, int, int]:
 
     :raises Exception: An exception has occurred when querying the API.
     """
+    default_area_type, default_area_name = covid_area()
+    area = (area_type or default_area_type, area_name or default_area_name)
+
+    return __covid_cache.get(
+        area,
+        lambda: __covid_flight.do(
+            ("latest", *area), lambda: __fetch_latest_covid_data(*area)
+        ),
+    )
+
+
+def fetch_covid_trends(area_type: str = None, area_name: str = None) -> Dict[str, Any]:
+    """
+    Calculates trends of the covid data of an area stored by fetch_covid_data,
+    without contacting the API.
+
+    :params area_type: The type of the area. Defaults to the type returned by covid_area.
+    :params area_name: The name of the area. Defaults to the name returned by covid_area.
+    :returns: None if no data is stored yet. Otherwise a dictionary in the shape of:
+    {
+        "date": the latest available date,
+        "new_cases_average": average number of new cases a day in the week up to that date,
+        "new_cases_growth": change of that average since the week before, e.g. 0.1 for 10% more,
+        "new_cases_per_100k": that average per 100,000 people, only available for nations,
+        "new_deaths_average": average number of new deaths a day in the latest week with deaths data,
+    }
+    Values that can't be calculated, like the growth when less than two weeks are stored, are None.
+    The rate per 100,000 people is None for areas other than nations, as only the populations
+    of nations are known.
+    """
+    # numpy is imported on the first call rather than with the server,
+    # which keeps it out of the startup time
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    from server.api.covid_series import (
+        load_series,
+        per_100k,
+        rolling_average,
+        week_over_week_growth,
+    )
+
+    default_area_type, default_area_name = covid_area()
+    area_type = area_type or default_area_type
+    area_name = area_name or default_area_name
+    latest_data = __get_covid_store().latest_points(area_type, area_name, 1)
+
+    if not latest_data:
+        return None
+
+    area_code = latest_data[0]["areaCode"]
+    series = load_series(__covid_series_path, area_code)
+
+    if series is None:
+        __write_covid_series(area_type, area_name)
+        series = load_series(__covid_series_path, area_code)
+
+    new_cases_averages = rolling_average(series["new_cases"])
+    new_deaths_averages = rolling_average(series["new_deaths"])
+    # deaths by death date are only available a few days later
+    days_with_deaths = np.flatnonzero(~np.isnan(series["new_deaths"]))
+    population = __POPULATIONS.get(area_code)
+
+    return {
+        "date": __get_date(latest_data[0]),
+        "new_cases_average": __to_number(new_cases_averages[-1]),
+        "new_cases_growth": __to_number(week_over_week_growth(series["new_cases"])[-1]),
+        "new_cases_per_100k": __to_number(
+            per_100k(new_cases_averages[-1], population) if population else np.nan
+        ),
+        "new_deaths_average": __to_number(
+            new_deaths_averages[days_with_deaths[-1]]
+            if len(days_with_deaths)
+            else np.nan
+        ),
+    }
+
+
+def covid_cache_stats() -> Dict[str, int]:
+    """
+    Returns the hit/miss counters of the covid data cache.
+    """
+    return __covid_cache.stats()
+
+
+def __fetch_latest_covid_data(
+    area_type: str, area_name: str
+) -> Tuple[bool, int, int, int, int]:
+    """
+    Syncs the local store with the uk-covid19 API and reads the latest Covid19 data
+    of an area from it, in the shape described in fetch_covid_data.
+    """
     current_date = datetime.date.today()
 
     try:
-        data = __covid_api_client.get_json()["data"]
+        __sync_area(area_type, area_name)
+        data = __get_covid_store().latest_points(area_type, area_name, 2)
         latest_data = data[0]
         data_from_yesterday = data[1]
         data_date = __get_date(latest_data)
@@ -78,6 +240,168 @@ def fetch_covid_data() -> Tuple[bool, int, int, int, int]:
         raise api_exception
 
 
+def __sync_area(area_type: str, area_name: str):
+    """
+    Brings the stored time series of an area up to date with the uk-covid19 API.
+    The whole series of an area is downloaded the first time it is asked for.
+    After that, it is synced with the other stored areas of the same type
+    at most once every __COVID_CACHE_TTL seconds.
+    """
+    if __get_covid_store().latest_date(area_type, area_name) is None:
+        __covid_flight.do(
+            ("history", area_type, area_name),
+            lambda: __download_series([(area_type, area_name)]),
+        )
+
+    __synced_area_types.get(
+        area_type,
+        lambda: __covid_flight.do(
+            ("sync", area_type), lambda: __sync_area_type(area_type)
+        ),
+    )
+
+
+def __sync_area_type(area_type: str) -> int:
+    """
+    Brings the stored time series of every area of the given type up to date with the API.
+    The API is asked for the latest data point of every area of the type at once, and when
+    stored areas are behind, for the days in between and the recently revised days,
+    one day of every area at a time. Areas far behind have their whole series downloaded again.
+
+    :returns: The number of data points fetched from the API.
+    """
+    last_stored_dates = __get_covid_store().latest_dates(area_type)
+
+    if not last_stored_dates:
+        return 0
+
+    behind_areas = {
+        data_point["areaName"]: [data_point]
+        for data_point in __query_covid_api(
+            [f"areaType={area_type}"], latest_by=__LATEST_BY_METRIC
+        )
+        if data_point["areaName"] in last_stored_dates
+        and data_point["date"] > last_stored_dates[data_point["areaName"]]
+    }
+
+    if not behind_areas:
+        return 0
+
+    latest_date = max(__get_date(points[0]) for points in behind_areas.values())
+    oldest_date = min(
+        __get_date({"date": last_stored_dates[area_name]}) for area_name in behind_areas
+    )
+    missing_days = (latest_date - oldest_date).days - 1
+
+    if missing_days > __MAX_MISSING_DAYS:
+        return __download_series([(area_type, area_name) for area_name in behind_areas])
+
+    for days_ago in range(1, missing_days + __REVISED_DAYS + 1):
+        date = latest_date - datetime.timedelta(days=days_ago)
+
+        for data_point in __query_covid_api(
+            [f"areaType={area_type}", f"date={date.strftime(__DATE_FORMAT)}"]
+        ):
+            if data_point["areaName"] in behind_areas:
+                behind_areas[data_point["areaName"]].append(data_point)
+
+    for area_name, data_points in behind_areas.items():
+        __get_covid_store().save_points(area_type, area_name, data_points)
+        __write_covid_series(area_type, area_name)
+
+    return sum(len(data_points) for data_points in behind_areas.values())
+
+
+def __download_series(areas: List[Tuple[str, str]]) -> int:
+    """
+    Downloads and stores the whole time series of the given areas.
+    The API can't be asked for several areas by name in one query, and asking for
+    every area of a type would download the history of areas that are not needed,
+    so every area is asked for by its name, and the queries run at the same time.
+
+    :params areas: (area type, area name) tuples of the areas.
+    :returns: The number of data points fetched from the API.
+    """
+    queries = [
+        __download_executor.submit(
+            __query_covid_api, [f"areaType={area_type}", f"areaName={area_name}"]
+        )
+        for area_type, area_name in areas
+    ]
+    fetched_count = 0
+
+    for (area_type, area_name), query in zip(areas, queries):
+        data_points = query.result()
+        __get_covid_store().save_points(area_type, area_name, data_points)
+        __write_covid_series(area_type, area_name)
+        fetched_count += len(data_points)
+
+    return fetched_count
+
+
+def __get_covid_store() -> CovidStore:
+    """
+    Returns the local store of covid time series, opening it on first use.
+    """
+    global __covid_store
+
+    with __covid_store_lock:
+        if __covid_store is None:
+            __covid_store = CovidStore(os.environ.get("COVID_STORE_PATH", "covid.db"))
+
+        return __covid_store
+
+
+def __write_covid_series(area_type: str, area_name: str):
+    """
+    Stores the time series of an area in the local store as columns, for fetch_covid_trends.
+    """
+    # pylint: disable=import-outside-toplevel
+    from server.api.covid_series import write_series
+
+    data_points = __get_covid_store().load_points(area_type, area_name)
+
+    if data_points:
+        write_series(__covid_series_path, data_points[-1]["areaCode"], data_points)
+
+
+def __query_covid_api(
+    filters: List[str], latest_by: str = None
+) -> List[Dict[str, Any]]:
+    """
+    Queries the uk-covid19 API for the data points matching the given filters, latest first.
+
+    :params filters: The filters of the query, e.g. ["areaType=nation", "date=2020-07-28"]
+    :params latest_by: If given, only the latest data point having this metric is returned.
+    """
+    return __covid_api(
+        filters=filters,
+        structure=__DATA_SHAPE,
+        latest_by=latest_by,
+    ).get_json()["data"]
+
+
+def __covid_api(
+    filters: List[str], structure: Dict[str, Any], latest_by: str = None
+) -> Any:
+    """
+    Creates a uk-covid19 API client for a query.
+    uk_covid19 is imported on the first query rather than with the server,
+    which keeps it out of the startup time.
+    """
+    # pylint: disable=import-outside-toplevel
+    from uk_covid19 import Cov19API
+
+    return Cov19API(filters=filters, structure=structure, latest_by=latest_by)
+
+
+def __to_number(value: float) -> float:
+    """
+    Converts a NumPy number to a float, or None if it is NaN.
+    """
+    return None if math.isnan(value) else float(value)
+
+
 def __get_date(data_json: Dict[str, Any]) -> datetime.datetime:
     """
     Returns the date of a given data point from the API. Parses the date string
@@ -0,0 +1,186 @@
+"""
+This module keeps covid time series in a columnar format, to compute trends over them
+with vectorized NumPy operations instead of looping over data points.
+
+The series of an area is stored in a .npy file named after its area code, holding
+a 2-D float64 array with one row per column in SERIES_COLUMNS, oldest day first.
+Dates are stored as days since 1970-01-01, and missing values as NaN.
+Series files are memory-mapped when loaded, so processes reading the same series share
+one copy in the page cache. They are replaced atomically when written,
+so a reader never sees a partially written series.
+"""
+
+import os
+import tempfile
+from threading import Lock
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+
+# The columns of a series, and the metric of a uk-covid19 API data point stored in each
+SERIES_COLUMNS = {
+    "date": "date",
+    "new_cases": "newCasesByPublishDate",
+    "cum_cases": "cumCasesByPublishDate",
+    "new_deaths": "newDeathsByDeathDate",
+    "cum_deaths": "cumDeathsByDeathDate",
+}
+
+# Number of days in a week, the window of rolling averages and growth rates
+__WEEK = 7
+
+# A map of series file paths to (modification time of the file, series loaded from it)
+__loaded_series: Dict[str, Tuple[int, "CovidSeries"]] = {}
+__loaded_series_lock = Lock()
+
+
+class CovidSeries:
+    """
+    The covid time series of an area, one entry per day, oldest first.
+    Columns are read-only NumPy arrays, e.g. series["new_cases"].
+    """
+
+    def __init__(self, columns: np.ndarray):
+        """
+        :params columns: A 2-D array with one row per column in SERIES_COLUMNS.
+        """
+        self.__columns = columns
+        self.__column_index = {name: index for index, name in enumerate(SERIES_COLUMNS)}
+
+    def __len__(self) -> int:
+        return self.__columns.shape[1]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """
+        :raises KeyError: There is no such column.
+        """
+        return self.__columns[self.__column_index[column]]
+
+    @property
+    def dates(self) -> np.ndarray:
+        """
+        The dates of the entries as a datetime64[D] array.
+        """
+        return self["date"].astype("datetime64[D]")
+
+
+def write_series(directory: str, area_code: str, data_points: Iterable[Dict[str, Any]]):
+    """
+    Stores the time series of an area, replacing the stored one.
+
+    :params directory: The folder series files are stored in.
+    :params area_code: The code of the area, e.g. "E92000001".
+    :params data_points: Data points in the shape returned by the uk-covid19 API, in any order.
+    """
+    data_points = list(data_points)
+    columns = np.full((len(SERIES_COLUMNS), len(data_points)), np.nan)
+
+    if data_points:
+        columns[0] = np.array(
+            [data_point["date"] for data_point in data_points], dtype="datetime64[D]"
+        ).astype(np.float64)
+
+        for index, metric in enumerate(list(SERIES_COLUMNS.values())[1:], start=1):
+            columns[index] = np.array(
+                [data_point.get(metric) for data_point in data_points], dtype=np.float64
+            )
+
+        columns = columns[:, np.argsort(columns[0], kind="stable")]
+
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+    try:
+        with os.fdopen(file_descriptor, "wb") as temporary_file:
+            np.save(temporary_file, columns)
+
+        os.replace(temporary_path, __series_path(directory, area_code))
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def load_series(directory: str, area_code: str) -> CovidSeries:
+    """
+    Memory-maps the stored time series of an area. The mapping is reused
+    until the series is written again.
+
+    :params directory: The folder series files are stored in.
+    :params area_code: The code of the area, e.g. "E92000001".
+    :returns: The series, or None if no series is stored for the area.
+    """
+    path = __series_path(directory, area_code)
+
+    try:
+        modified_at = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with __loaded_series_lock:
+        if path in __loaded_series and __loaded_series[path][0] == modified_at:
+            return __loaded_series[path][1]
+
+        series = CovidSeries(np.load(path, mmap_mode="r"))
+        __loaded_series[path] = (modified_at, series)
+
+        return series
+
+
+def rolling_average(values: np.ndarray, window: int = __WEEK) -> np.ndarray:
+    """
+    Calculates the average of every window of consecutive days, ignoring missing values.
+
+    :params values: The values of a column, one per day.
+    :params window: The number of days averaged.
+    :returns: An array of the average of the window ending on each day.
+    The first window - 1 days, and windows without any values, are NaN.
+    """
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    averages = np.full(len(values), np.nan)
+
+    if len(values) >= window:
+        window_counts = counts[window:] - counts[:-window]
+        np.divide(
+            sums[window:] - sums[:-window],
+            window_counts,
+            out=averages[window - 1 :],
+            where=window_counts > 0,
+        )
+
+    return averages
+
+
+def week_over_week_growth(values: np.ndarray) -> np.ndarray:
+    """
+    Calculates how much the weekly average of a column changed since the week before.
+
+    :params values: The values of a column, one per day.
+    :returns: An array of the growth on each day, where 0.1 means the average of the week
+    ending on that day is 10% higher than the week before. Days without a previous week are NaN.
+    """
+    averages = rolling_average(values)
+    growth = np.full(len(values), np.nan)
+
+    if len(values) > __WEEK:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            growth[__WEEK:] = averages[__WEEK:] / averages[:-__WEEK] - 1
+
+        growth[~np.isfinite(growth)] = np.nan
+
+    return growth
+
+
+def per_100k(values: np.ndarray, population: int) -> np.ndarray:
+    """
+    Converts counts into rates per 100,000 people.
+
+    :params values: The values of a column.
+    :params population: The number of people living in the area.
+    """
+    return values * 100000 / population
+
+
+def __series_path(directory: str, area_code: str) -> str:
+    return os.path.join(directory, f"{area_code}.npy")
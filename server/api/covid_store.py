@@ -0,0 +1,144 @@
+"""
+This module keeps a local copy of the covid time series, so the uk-covid19 API
+only has to be asked for the dates that are not stored yet.
+
+Data points are stored in a SQLite database in WAL mode, keyed by area and date,
+so storing a data point again replaces the one fetched before, e.g. when the API revises it.
+"""
+
+import sqlite3
+from threading import Lock
+from typing import Any, Dict, Iterable, List
+
+# The columns of a data point, in the shape returned by the uk-covid19 API
+STORED_METRICS = (
+    "areaCode",
+    "newCasesByPublishDate",
+    "cumCasesByPublishDate",
+    "newDeathsByDeathDate",
+    "cumDeathsByDeathDate",
+)
+
+
+class CovidStore:
+    """
+    A durable store of covid data points, backed by a SQLite database.
+    """
+
+    def __init__(self, path: str):
+        """
+        :params path: Path to the database file. ":memory:" keeps the store in memory.
+        """
+        # the store is shared by request threads and the cache refresh threads
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__lock = Lock()
+
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS covid_data (
+                    area_type TEXT NOT NULL,
+                    area_name TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    area_code TEXT,
+                    new_cases INTEGER,
+                    cum_cases INTEGER,
+                    new_deaths INTEGER,
+                    cum_deaths INTEGER,
+                    PRIMARY KEY (area_type, area_name, date)
+                ) WITHOUT ROWID
+                """)
+
+    def latest_date(self, area_type: str, area_name: str) -> str:
+        """
+        Returns the date of the latest data point stored for the given area
+        in the format "YYYY-MM-DD", or None if nothing is stored for it.
+        """
+        with self.__lock:
+            (date,) = self.__connection.execute(
+                "SELECT MAX(date) FROM covid_data WHERE area_type = ? AND area_name = ?",
+                (area_type, area_name),
+            ).fetchone()
+
+        return date
+
+    def latest_dates(self, area_type: str) -> Dict[str, str]:
+        """
+        Returns a map of the names of the stored areas of the given type
+        to the date of their latest data point, in the format "YYYY-MM-DD".
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT area_name, MAX(date) FROM covid_data "
+                "WHERE area_type = ? GROUP BY area_name",
+                (area_type,),
+            ).fetchall()
+
+        return dict(rows)
+
+    def save_points(
+        self, area_type: str, area_name: str, data_points: Iterable[Dict[str, Any]]
+    ):
+        """
+        Stores data points of an area in a single transaction,
+        replacing stored data points of the same dates.
+
+        :params area_type: The type of the area, e.g. "nation".
+        :params area_name: The name of the area, e.g. "England".
+        :params data_points: Data points in the shape returned by the uk-covid19 API.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO covid_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        area_type,
+                        area_name,
+                        data_point["date"],
+                        *(data_point.get(metric) for metric in STORED_METRICS),
+                    )
+                    for data_point in data_points
+                ),
+            )
+
+    def latest_points(
+        self, area_type: str, area_name: str, count: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Loads the latest data points stored for an area.
+
+        :params area_type: The type of the area, e.g. "nation".
+        :params area_name: The name of the area, e.g. "England".
+        :params count: The maximum number of data points loaded. -1 loads every data point.
+        :returns: Data points in the shape returned by the uk-covid19 API, latest first.
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT date, area_code, new_cases, cum_cases, new_deaths, cum_deaths "
+                "FROM covid_data WHERE area_type = ? AND area_name = ? "
+                "ORDER BY date DESC LIMIT ?",
+                (area_type, area_name, count),
+            ).fetchall()
+
+        return [
+            {"date": date, "areaName": area_name, **dict(zip(STORED_METRICS, metrics))}
+            for date, *metrics in rows
+        ]
+
+    def load_points(self, area_type: str, area_name: str) -> List[Dict[str, Any]]:
+        """
+        Loads every data point stored for an area.
+
+        :params area_type: The type of the area, e.g. "nation".
+        :params area_name: The name of the area, e.g. "England".
+        :returns: Data points in the shape returned by the uk-covid19 API, oldest first.
+        """
+        return self.latest_points(area_type, area_name, -1)[::-1]
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self.__lock:
+            self.__connection.close()
@@ -5,14 +5,19 @@ This module handles interactions with NewsAPI
 import logging
 import os
 from typing import List, Dict
-from functools import reduce
 
 import requests
 
+from server.utils.fingerprint import content_fingerprint
+from server.utils.http_client import http_get
 from server.utils.logger import log_exception
+from server.utils.single_flight import SingleFlight
 
 NEWS_API_URL = "https://newsapi.org"
 
+# coalesces concurrent requests for the headlines of the same country
+__news_flight = SingleFlight()
+
 
 def fetch_news_headlines(country: str) -> List[Dict[str, any]]:
     """
@@ -23,29 +28,41 @@ def fetch_news_headlines(country: str) -> List[Dict[str, any]]:
     The list of codes are available in the docs linked above.
     :returns A list of dictionaries of information of a news headline
     """
+    return __news_flight.do(
+        ("top-headlines", country), lambda: __request_news_headlines(country)
+    )
+
+
+def __request_news_headlines(country: str) -> List[Dict[str, any]]:
+    """
+    Requests top news headlines of the given country from newsapi.org.
+    See fetch_news_headlines.
+    """
     req_params = {"country": country, "apiKey": os.environ["NEWS_API_KEY"]}
 
     try:
-        response = requests.get(f"{NEWS_API_URL}/v2/top-headlines", params=req_params)
+        response = http_get(f"{NEWS_API_URL}/v2/top-headlines", params=req_params)
         json = response.json()
 
         return json["articles"]
-    except requests.ConnectionError as conn_err:
+    except requests.RequestException as conn_err:
         log_exception("fetch_news_headlines", conn_err)
         return []
 
 
-def calculate_news_id(title: str = "", description: str = "") -> hex:
+def calculate_news_id(title: str = "", description: str = "") -> str:
     """
-    Calculate an idempotency ID of a piece of news, by taking and summing the unicode values
-    of each character (in lower case if applicable) in title and description
-    and representing the final value in hex.
+    Calculate an idempotency ID of a piece of news, by taking a stable 64-bit hash
+    of its title and description, ignoring case and whitespace.
 
     Example:
         assert calculate_news_id(
             title="example title",
             description="example description"
-        ) == hex(0xcde)
+        ) == calculate_news_id(
+            title="Example  Title",
+            description="example description"
+        )
 
     :params title: Title of the news headline.
     :params description: Description of the news headline.
@@ -57,13 +74,7 @@ def calculate_news_id(title: str = "", description: str = "") -> hex:
         if not isinstance(title, str) or not isinstance(description, str):
             raise ValueError()
 
-        return hex(
-            reduce(
-                lambda final, char: final + ord(char),
-                ((title or "") + (description or "")).lower(),
-                0,
-            )
-        )
+        return content_fingerprint(title, description)
     except ValueError:
         logging.error(
             "ValueError encountered when trying to calculate idempotency id for a news headline. "
@@ -1,25 +1,196 @@
 """
 This module handles interactions with the OpenWeather api
+
+Weather is cached per geohash cell, so users close to each other share one cached entry,
+and the number of api calls grows with the number of distinct places instead of requests.
+Cells asked for recently are refreshed together in the background before they expire.
 """
 
 import os
-from typing import Dict
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from typing import Dict, Tuple
 
 import requests
 
+from server.utils.cache import TTLCache
+from server.utils.geohash import decode_geohash, encode_geohash
+from server.utils.http_client import http_get
 from server.utils.logger import log_exception
+from server.utils.single_flight import SingleFlight
 
 OPEN_WEATHER_API_URL = "https://api.openweathermap.org/data/2.5"
 
+# Number of seconds cached weather is served without contacting the api.
+# OpenWeather updates the current weather about every 10 minutes.
+__WEATHER_CACHE_TTL = 10 * 60
+
+# Number of seconds after the ttl during which outdated weather is still served
+# while it is refreshed in the background.
+__WEATHER_CACHE_STALE_TTL = 30 * 60
+
+# Number of seconds between background refreshes of recently asked for cells
+__REFRESH_INTERVAL = 60
+
+# Number of geohash characters of a cell. 5 characters make cells about 4.9km wide.
+__GEOHASH_PRECISION = int(os.environ.get("WEATHER_GEOHASH_PRECISION", 5))
+
+# Maximum number of cells whose weather is cached
+__MAX_CELLS = int(os.environ.get("WEATHER_CACHE_MAX_CELLS", 1000))
+
+__clock = time.monotonic
+
+# a map of geohash cells to their current weather, least recently used first
+__weather_cache = TTLCache(
+    ttl=__WEATHER_CACHE_TTL,
+    stale_ttl=__WEATHER_CACHE_STALE_TTL,
+    clock=__clock,
+    max_size=__MAX_CELLS,
+)
+
+# coalesces concurrent requests for the weather of the same cell
+__weather_flight = SingleFlight()
+
+# a map of geohash cells to the time they were last asked for, least recently first
+__cell_accesses: "OrderedDict[str, float]" = OrderedDict()
+__cell_accesses_lock = Lock()
+
+__refresh_executor = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="weather-refresh"
+)
+
+# the thread refreshing recently asked for cells, started by the first fetch_weather call
+__refresh_thread = None
+
+
+def weather_location() -> Tuple[float, float]:
+    """
+    Returns the (latitude, longitude) weather is shown for by default,
+    which can be configured with weather_lat and weather_long.
+    """
+    return (
+        float(os.environ.get("WEATHER_LAT", 50.718410)),
+        float(os.environ.get("WEATHER_LONG", -3.533899)),
+    )
+
 
 def fetch_weather(lat: float, long: float) -> Dict[str, any]:
     """
     Fetches the current weather from the OpenWeather api.
+    Locations in the same geohash cell share the weather of the center of the cell.
 
     :param lat: The latitude of user location
     :param long: The longitude of user location
     :returns: A dictionary of information of the current weather,
-    as described in the OpenWeather api doc
+    as described in the OpenWeather api doc. The dictionary is empty if the weather
+    can't be fetched and is not cached.
+    """
+    cell = encode_geohash(lat, long, __GEOHASH_PRECISION)
+    __record_access(cell)
+
+    try:
+        return __weather_cache.get(cell, lambda: __load_cell(cell))
+    except requests.RequestException as req_err:
+        log_exception("fetch_weather", req_err)
+        return {}
+
+
+def refresh_hot_weather_cells() -> int:
+    """
+    Refreshes the cached weather of the cells asked for within the cache ttl
+    that would expire before the next refresh. Cells not asked for in that time
+    are forgotten, and their weather expires from the cache.
+
+    :returns: The number of cells refreshed.
+    """
+    now = __clock()
+
+    with __cell_accesses_lock:
+        while (
+            __cell_accesses
+            and now - next(iter(__cell_accesses.values())) >= __WEATHER_CACHE_TTL
+        ):
+            __cell_accesses.popitem(last=False)
+
+        hot_cells = list(__cell_accesses)
+
+    due_cells = [cell for cell in hot_cells if __is_due_for_refresh(cell)]
+
+    return sum(__refresh_executor.map(__refresh_cell, due_cells))
+
+
+def __is_due_for_refresh(cell: str) -> bool:
+    """
+    Checks whether the cached weather of a cell is missing or expires before the next refresh.
+    """
+    age = __weather_cache.age(cell)
+
+    return age is None or age >= __WEATHER_CACHE_TTL - __REFRESH_INTERVAL
+
+
+def __record_access(cell: str):
+    """
+    Marks a cell as recently asked for, and starts the background refresh if needed.
+    """
+    global __refresh_thread
+
+    with __cell_accesses_lock:
+        __cell_accesses[cell] = __clock()
+        __cell_accesses.move_to_end(cell)
+
+        while len(__cell_accesses) > __MAX_CELLS:
+            __cell_accesses.popitem(last=False)
+
+        if __refresh_thread is None:
+            __refresh_thread = Thread(
+                target=__refresh_forever, name="weather-refresh", daemon=True
+            )
+            __refresh_thread.start()
+
+
+def __refresh_forever():
+    """
+    Refreshes recently asked for cells every __REFRESH_INTERVAL seconds.
+    """
+    while True:
+        time.sleep(__REFRESH_INTERVAL)
+
+        try:
+            refresh_hot_weather_cells()
+        except Exception as refresh_exception:  # pylint: disable=broad-except
+            log_exception("weather > __refresh_forever", refresh_exception)
+
+
+def __refresh_cell(cell: str) -> bool:
+    """
+    Fetches the weather of a cell and caches it.
+
+    :returns: Whether the weather is fetched.
+    """
+    try:
+        __weather_cache.put(cell, __load_cell(cell))
+        return True
+    except requests.RequestException as req_err:
+        log_exception("weather > __refresh_cell", req_err)
+        return False
+
+
+def __load_cell(cell: str) -> Dict[str, any]:
+    """
+    Requests the current weather of the center of a cell.
+    Concurrent requests for the same cell share one api call.
+    """
+    return __weather_flight.do(cell, lambda: __request_weather(*decode_geohash(cell)))
+
+
+def __request_weather(lat: float, long: float) -> Dict[str, any]:
+    """
+    Requests the current weather of the given location from the OpenWeather api.
+    See fetch_weather.
+
+    :raises requests.RequestException: The request failed.
     """
 
     # the request parameters required for the api call
@@ -31,9 +202,7 @@ def fetch_weather(lat: float, long: float) -> Dict[str, any]:
         "units": "metric",
     }
 
-    try:
-        response = requests.get(f"{OPEN_WEATHER_API_URL}/weather", params=req_params)
-        return response.json()
-    except requests.ConnectionError as req_err:
-        log_exception("fetch_weather", req_err)
-        return {}
+    response = http_get(f"{OPEN_WEATHER_API_URL}/weather", params=req_params)
+    response.raise_for_status()
+
+    return response.json()
@@ -0,0 +1,27 @@
+"""
+Fixtures shared by every test of the server.
+"""
+
+import pytest
+from pytest_mock import MockerFixture
+
+from server.api.covid_store import CovidStore
+from server.routes.alarms.alarm_store import AlarmStore
+from server.routes.alarms.speech import NullBackend, Speaker
+
+
+@pytest.fixture(autouse=True)
+def __isolated_state(mocker: MockerFixture, tmp_path):
+    """
+    Keeps the stored alarms and covid data in a temporary folder, and discards spoken briefs,
+    so tests never read or change the state of a server running from the same folder.
+    """
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.__alarm_store",
+        AlarmStore(str(tmp_path / "alarms.db")),
+    )
+    mocker.patch(
+        "server.api.covid.__covid_store", CovidStore(str(tmp_path / "covid.db"))
+    )
+    mocker.patch("server.api.covid.__covid_series_path", str(tmp_path / "series"))
+    mocker.patch("server.routes.alarms.daily_brief.__speaker", Speaker(NullBackend()))
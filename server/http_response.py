@@ -4,12 +4,27 @@ This module handles http response formatting
 
 from typing import Dict
 
+# Represent HTTP status code 201 Created
+HTTP_CREATED = 201
+
 # Represent HTTP status code 400 Bad Request
 HTTP_BAD_REQUEST = 400
 
+# Represent HTTP status code 404 Not Found
+HTTP_NOT_FOUND = 404
+
+# Represent HTTP status code 409 Conflict
+HTTP_CONFLICT = 409
+
 # Indicates that the request contains invalid parameters
 ERRCODE_INVALID_PARAMETERS = "INVALID_PARAMETERS"
 
+# Indicates that the requested item doesn't exist
+ERRCODE_NOT_FOUND = "NOT_FOUND"
+
+# Indicates that an item with the same identity already exists
+ERRCODE_ALREADY_EXISTS = "ALREADY_EXISTS"
+
 
 def http_response(status: str, data: Dict[str, str]) -> Dict[str, any]:
     """
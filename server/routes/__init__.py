@@ -3,3 +3,4 @@ Initializes server routes
 """
 
 import server.routes.alarms.route
+import server.routes.alarms.api_route
@@ -0,0 +1,132 @@
+import datetime
+
+import pytest
+
+from server.routes.alarms.alarm_registry import AlarmRegistry
+
+__MOCK_TIME = datetime.datetime(2020, 12, 1, 7, 30)
+
+
+def __alarm(title: str, minutes: int):
+    return {
+        "title": title,
+        "scheduled_time": __MOCK_TIME + datetime.timedelta(minutes=minutes),
+    }
+
+
+def test_ordered():
+    registry = AlarmRegistry()
+
+    registry.add(__alarm("c", 30))
+    registry.add(__alarm("a", 10))
+    registry.add(__alarm("b", 10))
+
+    assert [alarm["title"] for alarm in registry.ordered()] == ["a", "b", "c"]
+    assert registry.next_due()["title"] == "a"
+    assert len(registry) == 3
+    assert "c" in registry
+
+    with pytest.raises(ValueError):
+        registry.add(__alarm("c", 40))
+
+
+def test_add_many():
+    registry = AlarmRegistry()
+    registry.add(__alarm("b", 20))
+    generation = registry.generation
+
+    registry.add_many([__alarm("c", 30), __alarm("a", 10)])
+
+    assert [alarm["title"] for alarm in registry.ordered()] == ["a", "b", "c"]
+    assert registry.changes_since(generation) == (
+        [__alarm("c", 30), __alarm("a", 10)],
+        [],
+    )
+
+    # no alarm is added when one of them exists
+    with pytest.raises(ValueError):
+        registry.add_many([__alarm("d", 40), __alarm("a", 50)])
+
+    with pytest.raises(ValueError):
+        registry.add_many([__alarm("d", 40), __alarm("d", 50)])
+
+    assert len(registry) == 3
+    assert "d" not in registry
+
+
+def test_remove():
+    registry = AlarmRegistry()
+    registry.add(__alarm("a", 10))
+    registry.add(__alarm("b", 20))
+
+    removed = registry.remove("a")
+
+    assert removed["title"] == "a"
+    assert registry.get("a") is None
+    assert registry.next_due()["title"] == "b"
+
+    registry.remove("b")
+
+    assert registry.next_due() is None
+
+    with pytest.raises(KeyError):
+        registry.remove("b")
+
+
+def test_between():
+    registry = AlarmRegistry()
+    for minutes in range(0, 60, 10):
+        registry.add(__alarm(f"alarm {minutes}", minutes))
+
+    alarms = registry.between(
+        __MOCK_TIME + datetime.timedelta(minutes=10),
+        __MOCK_TIME + datetime.timedelta(minutes=30),
+    )
+
+    assert [alarm["title"] for alarm in alarms] == ["alarm 10", "alarm 20", "alarm 30"]
+
+
+def test_generation_changes_with_alarms():
+    registry = AlarmRegistry()
+    initial = registry.generation
+
+    registry.add(__alarm("a", 10))
+    added = registry.generation
+
+    with pytest.raises(ValueError):
+        registry.add(__alarm("a", 20))
+
+    assert registry.generation == added
+
+    registry.remove("a")
+
+    assert len({initial, added, registry.generation}) == 3
+
+
+def test_page_and_changes():
+    registry = AlarmRegistry()
+    for minutes in range(0, 50, 10):
+        registry.add(__alarm(f"alarm {minutes}", minutes))
+
+    first_page = registry.page(None, 2)
+    last = first_page[-1]
+
+    assert [alarm["title"] for alarm in first_page] == ["alarm 0", "alarm 10"]
+    assert [
+        alarm["title"]
+        for alarm in registry.page((last["scheduled_time"], last["title"]), 2)
+    ] == ["alarm 20", "alarm 30"]
+
+    generation = registry.generation
+    registry.remove("alarm 10")
+    registry.add(__alarm("alarm 5", 5))
+
+    # the page goes on after the removed alarm
+    assert [
+        alarm["title"]
+        for alarm in registry.page((last["scheduled_time"], last["title"]), 1)
+    ] == ["alarm 20"]
+    assert registry.changes_since(generation) == (
+        [__alarm("alarm 5", 5)],
+        ["alarm 10"],
+    )
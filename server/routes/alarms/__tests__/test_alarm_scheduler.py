@@ -0,0 +1,313 @@
+import datetime
+import threading
+
+import pytest
+from pytest_mock import MockerFixture
+
+from server.routes.alarms.alarm_registry import AlarmRegistry
+from server.routes.alarms.alarm_store import AlarmStore
+from server.routes.alarms.speech import Utterance
+from server.utils.change_log import VersionMarks
+from server.utils.timer_queue import TimerQueue
+from server.routes.alarms.alarm_scheduler import (
+    AlarmExistsError,
+    __on_scheduler_change,
+    __prefetches,
+    __restore_alarms,
+    __run_prefetch,
+    cancel_alarm,
+    get_alarm_changes,
+    get_alarm_metrics,
+    get_alarms,
+    get_alarms_between,
+    get_alarms_version,
+    schedule_alarm,
+    start_alarm_scheduler,
+)
+
+
+def test_schedule_and_cancel_alarm():
+    at_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+    schedule_alarm(title="test cancel", at_time=at_time)
+
+    assert "test cancel" in [alarm["title"] for alarm in get_alarms()]
+    assert (
+        f"Scheduled at: <strong>{at_time}</strong>"
+        in [
+            alarm["content"]
+            for alarm in get_alarms()
+            if alarm["title"] == "test cancel"
+        ][0]
+    )
+    assert [
+        alarm["title"]
+        for alarm in get_alarms_between(
+            at_time, at_time + datetime.timedelta(seconds=1)
+        )
+    ] == ["test cancel"]
+
+    with pytest.raises(AlarmExistsError):
+        schedule_alarm(title="test cancel", at_time=at_time, fail_if_exists=True)
+
+    cancel_alarm("test cancel")
+
+    assert "test cancel" not in [alarm["title"] for alarm in get_alarms()]
+
+
+def test_alarms_fire_concurrently(mocker: MockerFixture):
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def blocking_daily_brief(alarm_info):
+        started.release()
+        release.wait(timeout=5)
+        utterance = Utterance([], 0, 0, None)
+        utterance.finish("spoken")
+        return utterance
+
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.daily_brief",
+        blocking_daily_brief,
+    )
+    mocker.patch("server.routes.alarms.alarm_scheduler.prefetch_brief_data")
+    start_alarm_scheduler()
+    fired_before = get_alarm_metrics()["fired"]
+    at_time = datetime.datetime.now() + datetime.timedelta(milliseconds=50)
+
+    schedule_alarm(title="test concurrent 1", at_time=at_time)
+    schedule_alarm(title="test concurrent 2", at_time=at_time)
+
+    # the second brief starts while the first one is still running
+    assert started.acquire(timeout=5)
+    assert started.acquire(timeout=5)
+    assert get_alarm_metrics()["running"] == 2
+
+    release.set()
+
+    metrics = get_alarm_metrics()
+    assert metrics["fired"] == fired_before + 2
+    assert metrics["last_firing_lag"] >= 0
+
+
+def test_alarm_runs_until_brief_is_done(mocker: MockerFixture):
+    utterance = mocker.Mock(state="failed")
+    queued = threading.Event()
+    utterance.add_done_callback.side_effect = lambda callback: queued.set()
+
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.daily_brief", return_value=utterance
+    )
+    mocker.patch("server.routes.alarms.alarm_scheduler.prefetch_brief_data")
+    start_alarm_scheduler()
+    metrics_before = get_alarm_metrics()
+
+    schedule_alarm(
+        title="test running",
+        at_time=datetime.datetime.now() + datetime.timedelta(milliseconds=50),
+    )
+
+    assert queued.wait(timeout=5)
+    # the brief is queued to be spoken, but not spoken yet
+    assert get_alarm_metrics()["running"] == metrics_before["running"] + 1
+
+    done_callback = utterance.add_done_callback.call_args.args[0]
+    done_callback(utterance)
+
+    assert get_alarm_metrics()["running"] == metrics_before["running"]
+    assert get_alarm_metrics()["failed"] == metrics_before["failed"] + 1
+
+
+def test_close_alarms_share_prefetch(mocker: MockerFixture):
+    mocker.patch.dict("os.environ", {"BRIEF_PREFETCH_LEAD": "60"})
+    prefetch_count = len(__prefetches)
+    at_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+    schedule_alarm(title="test prefetch 1", at_time=at_time)
+    schedule_alarm(
+        title="test prefetch 2", at_time=at_time + datetime.timedelta(seconds=30)
+    )
+
+    assert len(__prefetches) == prefetch_count + 1
+
+    # the prefetched data is no longer fresh when this alarm fires
+    schedule_alarm(
+        title="test prefetch 3", at_time=at_time + datetime.timedelta(minutes=5)
+    )
+
+    assert len(__prefetches) == prefetch_count + 2
+
+    cancel_alarm("test prefetch 1")
+    cancel_alarm("test prefetch 2")
+    cancel_alarm("test prefetch 3")
+
+    assert len(__prefetches) == prefetch_count
+
+
+def test_prefetch_canceled_while_firing(mocker: MockerFixture):
+    mocker.patch.dict("os.environ", {"BRIEF_PREFETCH_LEAD": "60"})
+    prefetch_data = mocker.patch(
+        "server.routes.alarms.alarm_scheduler.prefetch_brief_data"
+    )
+    at_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+    schedule_alarm(title="test canceled prefetch", at_time=at_time)
+    schedule_alarm(
+        title="test kept prefetch", at_time=at_time + datetime.timedelta(hours=1)
+    )
+    canceled_prefetch_time = at_time.timestamp() - 60
+    prefetch_times = set(__prefetches)
+
+    # the timer fires just as the only alarm sharing the prefetch is canceled
+    cancel_alarm("test canceled prefetch")
+    __run_prefetch(canceled_prefetch_time)
+
+    assert set(__prefetches) == prefetch_times - {canceled_prefetch_time}
+    prefetch_data.assert_not_called()
+
+    cancel_alarm("test kept prefetch")
+
+
+def test_restore_alarms(mocker: MockerFixture, tmp_path):
+    mocker.patch.dict(
+        "os.environ", {"BRIEF_PREFETCH_LEAD": "60", "MISSED_ALARM_GRACE": "60"}
+    )
+    store = AlarmStore(str(tmp_path / "restored.db"))
+    schedules = {}
+    prefetch_times = []
+    prefetches = {}
+    now = datetime.datetime.now()
+
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarm_store", store)
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarms", AlarmRegistry())
+    mocker.patch("server.routes.alarms.alarm_scheduler.__schedules", schedules)
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.__prefetch_times", prefetch_times
+    )
+    mocker.patch("server.routes.alarms.alarm_scheduler.__prefetches", prefetches)
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarm_prefetch_times", {})
+    # the timers are not started, so restored alarms don't fire
+    mocker.patch("server.routes.alarms.alarm_scheduler.__timer_queue", TimerQueue())
+
+    store.save_many(
+        {
+            "title": title,
+            "scheduled_time": now + datetime.timedelta(seconds=seconds),
+            "include_news": False,
+            "include_weather": False,
+        }
+        for title, seconds in [
+            ("missed", -120),
+            ("late", -30),
+            ("late too", -10),
+            ("soon", 3600),
+            ("soon too", 3630),
+            ("later", 7200),
+        ]
+    )
+
+    __restore_alarms()
+
+    assert [alarm["title"] for alarm in get_alarms()] == [
+        "late",
+        "late too",
+        "soon",
+        "soon too",
+        "later",
+    ]
+    assert set(schedules) == {"late", "late too", "soon", "soon too", "later"}
+    assert [alarm["title"] for alarm in store.load_all()] == [
+        "late",
+        "late too",
+        "soon",
+        "soon too",
+        "later",
+    ]
+    # late alarms share a prefetch running right away, and close alarms share one
+    assert prefetch_times == sorted(prefetches)
+    assert [len(prefetches[time]["alarm_titles"]) for time in prefetch_times] == [
+        2,
+        2,
+        1,
+    ]
+
+
+def test_alarms_are_synced_between_processes(mocker: MockerFixture, tmp_path):
+    path = str(tmp_path / "alarms.db")
+    other_process_store = AlarmStore(path)
+    schedules = {}
+    at_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.is_multi_process", return_value=True
+    )
+    is_scheduler = mocker.patch(
+        "server.routes.alarms.alarm_scheduler.is_scheduler", return_value=False
+    )
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarm_store", AlarmStore(path))
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarms", AlarmRegistry())
+    mocker.patch("server.routes.alarms.alarm_scheduler.__schedules", schedules)
+    mocker.patch("server.routes.alarms.alarm_scheduler.__synced_version", None)
+
+    other_process_store.save(title="theirs", scheduled_time=at_time)
+    schedule_alarm(title="mine", at_time=at_time + datetime.timedelta(minutes=1))
+
+    assert [alarm["title"] for alarm in get_alarms()] == ["theirs", "mine"]
+    assert [alarm["title"] for alarm in other_process_store.load_all()] == [
+        "theirs",
+        "mine",
+    ]
+    # only the scheduler process has timers
+    assert schedules == {}
+
+    is_scheduler.return_value = True
+    __on_scheduler_change(True)
+
+    assert set(schedules) == {"theirs", "mine"}
+
+    cancel_alarm("theirs")
+    other_process_store.delete("mine")
+
+    assert get_alarms() == []
+    assert schedules == {}
+
+
+def test_alarm_changes_since_store_version(mocker: MockerFixture, tmp_path):
+    path = str(tmp_path / "alarms.db")
+    other_process_store = AlarmStore(path)
+    at_time = datetime.datetime.now() + datetime.timedelta(hours=1)
+
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.is_multi_process", return_value=True
+    )
+    mocker.patch(
+        "server.routes.alarms.alarm_scheduler.is_scheduler", return_value=False
+    )
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarm_store", AlarmStore(path))
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarms", AlarmRegistry())
+    mocker.patch("server.routes.alarms.alarm_scheduler.__schedules", {})
+    mocker.patch("server.routes.alarms.alarm_scheduler.__synced_version", None)
+    mocker.patch("server.routes.alarms.alarm_scheduler.__alarms_version", 0)
+    mocker.patch("server.routes.alarms.alarm_scheduler.__version_marks", VersionMarks())
+
+    assert get_alarms_version() == "0"
+
+    schedule_alarm(title="mine", at_time=at_time)
+
+    assert get_alarms_version() == "1"
+
+    other_process_store.save(title="theirs", scheduled_time=at_time)
+
+    # the version is the version of the store, which every process shares
+    assert get_alarms_version() == "2"
+
+    added, removed = get_alarm_changes(1)
+
+    assert [alarm["title"] for alarm in added] == ["theirs"]
+    assert removed == []
+
+    other_process_store.delete("mine")
+
+    assert get_alarm_changes(2) == ([], ["mine"])
+    # versions this process didn't show, e.g. from before a restart, can't be listed
+    assert get_alarm_changes(50) is None
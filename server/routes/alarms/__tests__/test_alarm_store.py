@@ -0,0 +1,97 @@
+import datetime
+
+from server.routes.alarms.alarm_store import AlarmStore
+
+__MOCK_TIME = datetime.datetime(2020, 12, 1, 7, 30)
+
+
+def test_save_and_load_all(tmp_path):
+    store = AlarmStore(str(tmp_path / "alarms.db"))
+
+    store.save(
+        title="later",
+        scheduled_time=__MOCK_TIME + datetime.timedelta(hours=1),
+        include_news=True,
+    )
+    store.save(title="sooner", scheduled_time=__MOCK_TIME, include_weather="on")
+
+    alarms = store.load_all()
+
+    assert [alarm["title"] for alarm in alarms] == ["sooner", "later"]
+    assert alarms[0] == {
+        "title": "sooner",
+        "scheduled_time": __MOCK_TIME,
+        "include_news": False,
+        "include_weather": True,
+    }
+    assert alarms[1]["include_news"]
+
+
+def test_alarms_survive_reopening(tmp_path):
+    path = str(tmp_path / "alarms.db")
+    store = AlarmStore(path)
+    store.save(title="test", scheduled_time=__MOCK_TIME)
+    store.close()
+
+    reopened_store = AlarmStore(path)
+
+    assert [alarm["title"] for alarm in reopened_store.load_all()] == ["test"]
+
+
+def test_delete(tmp_path):
+    store = AlarmStore(str(tmp_path / "alarms.db"))
+    store.save_many(
+        [
+            {
+                "title": f"test {i}",
+                "scheduled_time": __MOCK_TIME,
+                "include_news": False,
+                "include_weather": False,
+            }
+            for i in range(4)
+        ]
+    )
+
+    store.delete("test 0")
+    store.delete_many(["test 1", "test 2"])
+
+    assert [alarm["title"] for alarm in store.load_all()] == ["test 3"]
+
+
+def test_processes_claim_alarms_once(tmp_path):
+    path = str(tmp_path / "alarms.db")
+    store = AlarmStore(path)
+    other_process_store = AlarmStore(path)
+    store.save(title="test", scheduled_time=__MOCK_TIME)
+    version = store.data_version()
+
+    # the alarm was rescheduled, so the claim for the old time fails
+    assert not other_process_store.delete(
+        "test", __MOCK_TIME - datetime.timedelta(minutes=1)
+    )
+    assert other_process_store.delete("test", __MOCK_TIME)
+    assert not store.delete("test", __MOCK_TIME)
+    assert store.data_version() != version
+
+
+def test_version_is_shared_by_processes(tmp_path):
+    path = str(tmp_path / "alarms.db")
+    store = AlarmStore(path)
+    other_process_store = AlarmStore(path)
+
+    assert store.version() == 0
+
+    store.save(title="test", scheduled_time=__MOCK_TIME)
+    other_process_store.save(title="other", scheduled_time=__MOCK_TIME)
+    # only changes count
+    store.delete("missing")
+    store.delete_many([])
+
+    assert store.version() == other_process_store.version() == 2
+
+    other_process_store.delete_many(["test", "other"])
+    version, alarms = store.snapshot()
+
+    assert version == 3
+    assert alarms == []
+    assert AlarmStore(path).version() == 3
@@ -0,0 +1,227 @@
+import datetime
+
+import pytest
+from pytest_mock import MockerFixture
+
+from server import app
+from server.routes.alarms.alarm_scheduler import AlarmExistsError
+from server.utils.event_hub import EventHub
+
+__MOCK_TIME = datetime.datetime(2020, 12, 1, 7, 30)
+
+
+@pytest.fixture(autouse=True)
+def __no_background_refresh(mocker: MockerFixture):
+    mocker.patch("server.routes.alarms.route.start_notification_refresh")
+
+
+def __alarm(title: str, minutes: int):
+    return {
+        "title": title,
+        "scheduled_time": __MOCK_TIME + datetime.timedelta(minutes=minutes),
+        "include_news": True,
+        "include_weather": False,
+    }
+
+
+def __notification(notification_id: str):
+    return {"id": notification_id, "title": notification_id, "content": "content"}
+
+
+def test_list_alarms_pages(mocker: MockerFixture):
+    get_alarms_page = mocker.patch(
+        "server.routes.alarms.api_route.get_alarms_page",
+        side_effect=[[__alarm("a", 0), __alarm("b", 10)], [__alarm("c", 20)]],
+    )
+    mocker.patch("server.routes.alarms.api_route.get_alarms_generation", return_value=3)
+    client = app.test_client()
+
+    first_page = client.get("/api/alarms?limit=2").get_json()["data"]
+
+    assert [alarm["title"] for alarm in first_page["alarms"]] == ["a", "b"]
+    assert first_page["alarms"][0]["scheduled_time"] == "2020-12-01T07:30:00"
+    assert first_page["generation"] == 3
+
+    last_page = client.get(
+        f"/api/alarms?limit=2&cursor={first_page['next_cursor']}"
+    ).get_json()["data"]
+
+    assert [alarm["title"] for alarm in last_page["alarms"]] == ["c"]
+    assert last_page["next_cursor"] is None
+    get_alarms_page.assert_called_with((__MOCK_TIME.replace(minute=40), "b"), 2)
+
+
+def test_list_alarm_changes(mocker: MockerFixture):
+    mocker.patch("server.routes.alarms.api_route.get_alarms_generation", return_value=5)
+    get_alarm_changes = mocker.patch(
+        "server.routes.alarms.api_route.get_alarm_changes",
+        side_effect=[([__alarm("a", 0)], ["b"]), None],
+    )
+    client = app.test_client()
+
+    changes = client.get("/api/alarms?since=3").get_json()["data"]
+
+    assert [alarm["title"] for alarm in changes["alarms"]] == ["a"]
+    assert changes["removed"] == ["b"]
+    assert not changes["reset"]
+    assert changes["generation"] == 5
+    get_alarm_changes.assert_called_with(3)
+
+    assert client.get("/api/alarms?since=0").get_json()["data"]["reset"]
+
+
+def test_list_alarms_invalid_parameters():
+    client = app.test_client()
+
+    for query in ["limit=0", "limit=201", "limit=a", "cursor=abc", "since=-1"]:
+        response = client.get(f"/api/alarms?{query}")
+
+        assert response.status_code == 400
+        assert response.get_json()["data"]["error"] == "INVALID_PARAMETERS"
+
+
+def test_create_alarm(mocker: MockerFixture):
+    schedule_alarm = mocker.patch(
+        "server.routes.alarms.api_route.schedule_alarm",
+        side_effect=[None, AlarmExistsError("An alarm titled a already exists.")],
+    )
+    client = app.test_client()
+    body = {"title": "a", "time": "2020-12-01T07:30", "include_news": True}
+
+    created = client.post("/api/alarms", json=body)
+
+    assert created.status_code == 201
+    # the response doesn't depend on the alarm still being scheduled
+    assert created.get_json()["data"]["alarm"] == {
+        "title": "a",
+        "scheduled_time": "2020-12-01T07:30:00",
+        "include_news": True,
+        "include_weather": False,
+    }
+    schedule_alarm.assert_called_with(
+        title="a",
+        at_time=__MOCK_TIME,
+        should_include_news=True,
+        should_include_weather=False,
+        fail_if_exists=True,
+    )
+
+    duplicate = client.post("/api/alarms", json=body)
+
+    assert duplicate.status_code == 409
+    assert duplicate.get_json()["data"]["error"] == "ALREADY_EXISTS"
+
+
+def test_create_alarm_with_time_zone(mocker: MockerFixture):
+    schedule_alarm = mocker.patch("server.routes.alarms.api_route.schedule_alarm")
+    client = app.test_client()
+    aware_time = datetime.datetime(2030, 1, 1, 7, 30, tzinfo=datetime.timezone.utc)
+
+    created = client.post(
+        "/api/alarms", json={"title": "a", "time": aware_time.isoformat()}
+    )
+
+    assert created.status_code == 201
+    at_time = schedule_alarm.call_args.kwargs["at_time"]
+    # the alarm is scheduled at the same instant, in the local time of the server
+    assert at_time.tzinfo is None
+    assert at_time == aware_time.astimezone().replace(tzinfo=None)
+
+
+def test_create_alarm_invalid(mocker: MockerFixture):
+    mocker.patch(
+        "server.routes.alarms.api_route.schedule_alarm",
+        side_effect=ValueError("The alarm time is in the past."),
+    )
+    client = app.test_client()
+
+    for body in [
+        [],
+        "2020-12-01T07:30",
+        {"time": "2020-12-01T07:30"},
+        {"title": "a", "time": "tomorrow"},
+        {"title": "a", "time": "2020-12-01T07:30"},
+    ]:
+        assert client.post("/api/alarms", json=body).status_code == 400
+
+
+def test_delete_alarm(mocker: MockerFixture):
+    cancel_alarm = mocker.patch(
+        "server.routes.alarms.api_route.cancel_alarm",
+        side_effect=[None, ValueError("No alarm is titled a.")],
+    )
+    client = app.test_client()
+
+    assert client.delete("/api/alarms/wake up/now").status_code == 200
+    cancel_alarm.assert_called_with("wake up/now")
+    assert client.delete("/api/alarms/a").status_code == 404
+
+
+def test_list_notifications(mocker: MockerFixture):
+    get_notifications_page = mocker.patch(
+        "server.routes.alarms.api_route.get_notifications_page",
+        side_effect=[[(1, __notification("1")), (4, __notification("2"))], []],
+    )
+    mocker.patch(
+        "server.routes.alarms.api_route.get_notifications_generation",
+        return_value=4,
+    )
+    client = app.test_client()
+
+    first_page = client.get("/api/notifications?limit=2").get_json()["data"]
+
+    assert first_page["notifications"] == [__notification("1"), __notification("2")]
+
+    last_page = client.get(
+        f"/api/notifications?limit=2&cursor={first_page['next_cursor']}"
+    ).get_json()["data"]
+
+    assert last_page["notifications"] == []
+    assert last_page["next_cursor"] is None
+    get_notifications_page.assert_called_with(4, 2)
+
+
+def test_delete_notification(mocker: MockerFixture):
+    mocker.patch(
+        "server.routes.alarms.api_route.remove_notification",
+        side_effect=[True, False],
+    )
+    client = app.test_client()
+
+    assert client.delete("/api/notifications/1").status_code == 200
+    assert client.delete("/api/notifications/1").status_code == 404
+
+
+def test_get_metrics(mocker: MockerFixture):
+    mocker.patch(
+        "server.routes.alarms.api_route.get_alarm_metrics",
+        return_value={"queue_depth": 0, "running": 1, "fired": 2},
+    )
+    client = app.test_client()
+
+    metrics = client.get("/api/metrics").get_json()["data"]
+
+    assert metrics["alarms"] == {"queue_depth": 0, "running": 1, "fired": 2}
+
+
+def test_stream_events(mocker: MockerFixture):
+    subscription = EventHub(max_pending=1, reset_event="event: reset\n\n").subscribe()
+    subscription.put("event: alarm_fired\n\n")
+    # the client falls behind
+    subscription.put("event: notification_added\n\n")
+    mocker.patch(
+        "server.routes.alarms.api_route.subscribe_events", return_value=subscription
+    )
+    unsubscribe_events = mocker.patch(
+        "server.routes.alarms.api_route.unsubscribe_events"
+    )
+    watch_notification_changes = mocker.patch(
+        "server.routes.alarms.api_route.watch_notification_changes"
+    )
+
+    response = app.test_client().get("/api/events")
+
+    assert response.mimetype == "text/event-stream"
+    assert response.data.decode().endswith("event: reset\n\n")
+    watch_notification_changes.assert_called_once()
+    unsubscribe_events.assert_called_once_with(subscription)
@@ -0,0 +1,71 @@
+from pytest_mock import MockerFixture
+
+from server.routes.alarms.cluster import (
+    __renew_lease,
+    is_scheduler,
+    shared_state,
+    start_cluster,
+)
+from server.utils.shared_state import SharedState
+
+
+class __MockClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_renew_lease(mocker: MockerFixture, tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    clock = __MockClock()
+    other_process_state = SharedState(path, clock=clock)
+    listener = mocker.Mock()
+
+    mocker.patch(
+        "server.routes.alarms.cluster.__shared_state", SharedState(path, clock=clock)
+    )
+    mocker.patch("server.routes.alarms.cluster.__is_scheduler", False)
+    mocker.patch("server.routes.alarms.cluster.__scheduler_listeners", [listener])
+
+    __renew_lease()
+    clock.now = 5
+    __renew_lease()
+
+    assert is_scheduler()
+    assert not other_process_state.acquire_lease("scheduler", "other", ttl=10)
+    listener.assert_called_once_with(True)
+
+    # another process takes over when this one is paused for longer than the lease
+    clock.now = 20
+    other_process_state.acquire_lease("scheduler", "other", ttl=10)
+    __renew_lease()
+
+    assert not is_scheduler()
+    listener.assert_called_with(False)
+
+
+def test_start_cluster(mocker: MockerFixture, tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    sync_task = mocker.Mock()
+
+    mocker.patch.dict("os.environ", {"SHARED_STATE_PATH": path})
+    mocker.patch("server.routes.alarms.cluster.__MULTI_PROCESS", True)
+    mocker.patch("server.routes.alarms.cluster.__shared_state", None)
+    mocker.patch("server.routes.alarms.cluster.__is_scheduler", False)
+    mocker.patch("server.routes.alarms.cluster.__heartbeat_thread", None)
+    mocker.patch("server.routes.alarms.cluster.__sync_tasks", [sync_task])
+    mocker.patch("server.routes.alarms.cluster.__scheduler_listeners", [])
+    thread = mocker.patch("server.routes.alarms.cluster.Thread")
+
+    # the shared state is only opened when the cluster starts
+    assert shared_state() is None
+
+    start_cluster()
+
+    assert shared_state() is not None
+    assert is_scheduler()
+    # the shared state is mirrored before the heartbeat starts
+    sync_task.assert_called_once_with()
+    thread.return_value.start.assert_called_once_with()
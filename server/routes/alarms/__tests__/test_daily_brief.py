@@ -1,12 +1,15 @@
 import logging
+import threading
 from pytest_mock import mock, MockerFixture
 
 from server.routes.alarms.daily_brief import (
-    __speech_engine,
+    __brief_data_cache,
     __covid_brief,
+    __covid_trend_brief,
     __weather_brief,
     __news_brief,
     daily_brief,
+    prefetch_brief_data,
 )
 
 __MOCK_NOW_TIME = "now"
@@ -33,27 +36,146 @@ def test_daily_brief(mocker: MockerFixture):
         "server.routes.alarms.daily_brief.__news_brief",
         lambda: "news brief",
     )
-    mocker.patch.object(
-        __speech_engine,
-        'say',
-        autospec=True
+    speaker = mocker.patch("server.routes.alarms.daily_brief.__speaker")
+
+    assert daily_brief(__MOCK_ALARM_ALL_ENABLED) is speaker.say.return_value
+
+    (sections,), options = speaker.say.call_args
+
+    assert list(sections) == [
+        "Hello! This is a scheduled daily brief titled: test alarm.",
+        "covid brief",
+        "weather brief",
+        "news brief",
+        "This is the end of your briefing. Have a nice day.",
+    ]
+    assert options == {"stale_after": 120}
+
+
+def test_daily_brief_streams_sections(mocker: MockerFixture):
+    weather_ready = threading.Event()
+
+    def weather_brief():
+        weather_ready.wait(timeout=5)
+        return "weather brief"
+
+    def news_brief():
+        raise ConnectionError()
+
+    mocker.patch(
+        "server.routes.alarms.daily_brief.__covid_brief",
+        lambda: "covid brief",
     )
-    mocker.patch.object(
-        __speech_engine,
-        'runAndWait',
-        autospec=True
+    mocker.patch("server.routes.alarms.daily_brief.__weather_brief", weather_brief)
+    mocker.patch("server.routes.alarms.daily_brief.__news_brief", news_brief)
+    speaker = mocker.patch("server.routes.alarms.daily_brief.__speaker")
+
+    daily_brief(__MOCK_ALARM_ALL_ENABLED)
+    sections = speaker.say.call_args[0][0]
+
+    # the greeting and the covid brief don't wait for the weather
+    assert (
+        next(sections) == "Hello! This is a scheduled daily brief titled: test alarm."
     )
+    assert next(sections) == "covid brief"
+    assert not weather_ready.is_set()
+
+    weather_ready.set()
+
+    # the failing news brief is replaced by a fallback line
+    assert list(sections) == [
+        "weather brief",
+        "Unfortunately the news update is not available right now.",
+        "This is the end of your briefing. Have a nice day.",
+    ]
+
+
+def test_daily_brief_section_deadlines(mocker: MockerFixture):
+    weather_ready = threading.Event()
 
-    expected_brief_message = f"""
-    Hello! This is a scheduled daily brief titled: {__MOCK_ALARM_ALL_ENABLED["title"]}.
-    covid brief
-    weather brief
-    news brief
-    This is the end of your briefing. Have a nice day.
-    """
+    def weather_brief():
+        weather_ready.wait(timeout=5)
+        return "weather brief"
+
+    mocker.patch.dict(
+        "server.routes.alarms.daily_brief.__SECTION_DEADLINES",
+        {"covid": 5, "weather": 0.05, "news": 5},
+    )
+    mocker.patch(
+        "server.routes.alarms.daily_brief.__covid_brief",
+        lambda: "covid brief",
+    )
+    mocker.patch("server.routes.alarms.daily_brief.__weather_brief", weather_brief)
+    mocker.patch(
+        "server.routes.alarms.daily_brief.__news_brief",
+        lambda: "news brief",
+    )
+    speaker = mocker.patch("server.routes.alarms.daily_brief.__speaker")
 
     daily_brief(__MOCK_ALARM_ALL_ENABLED)
 
-    # pylint: disable=no-member
-    __speech_engine.say.assert_called_once_with(expected_brief_message)
-    __speech_engine.runAndWait.assert_called_once()
+    # the weather brief misses its deadline, and the rest of the brief doesn't wait for it
+    assert list(speaker.say.call_args[0][0]) == [
+        "Hello! This is a scheduled daily brief titled: test alarm.",
+        "covid brief",
+        "Unfortunately the weather update is not available right now.",
+        "news brief",
+        "This is the end of your briefing. Have a nice day.",
+    ]
+    assert not weather_ready.is_set()
+
+    weather_ready.set()
+
+
+def test_prefetch_brief_data(mocker: MockerFixture):
+    __brief_data_cache.clear()
+    fetch_weather = mocker.patch(
+        "server.routes.alarms.daily_brief.fetch_weather",
+        return_value={
+            "weather": [{"description": "clear sky"}],
+            "main": {"temp": 12},
+        },
+    )
+    fetch_news_headlines = mocker.patch(
+        "server.routes.alarms.daily_brief.fetch_news_headlines",
+        return_value=[{"title": "news title"}],
+    )
+    fetch_covid_data = mocker.patch(
+        "server.routes.alarms.daily_brief.fetch_covid_data",
+        return_value=(True, None, 1, 2, 3, 4),
+    )
+    mocker.patch(
+        "server.routes.alarms.daily_brief.fetch_covid_trends", return_value=None
+    )
+
+    prefetch_brief_data()
+
+    # the briefs use prefetched data instead of calling the apis again
+    assert "clear sky" in __weather_brief()
+    assert "news title" in __news_brief()
+    assert "3 people" in __covid_brief()
+    fetch_weather.assert_called_once()
+    fetch_news_headlines.assert_called_once()
+    fetch_covid_data.assert_called_once()
+
+    __brief_data_cache.clear()
+
+
+def test_covid_trend_brief(mocker: MockerFixture):
+    trends = {"new_cases_average": 149.6, "new_cases_growth": -0.25}
+    mocker.patch("server.routes.alarms.daily_brief.fetch_covid_trends", lambda: trends)
+
+    assert __covid_trend_brief() == (
+        "Over the past week, there were 150 new cases a day on average,"
+        " down 25% from the week before."
+    )
+
+    trends["new_cases_growth"] = None
+
+    assert __covid_trend_brief() == (
+        "Over the past week, there were 150 new cases a day on average."
+    )
+
+    trends["new_cases_average"] = None
+
+    assert __covid_trend_brief() == ""
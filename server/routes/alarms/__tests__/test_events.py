@@ -0,0 +1,26 @@
+from server.routes.alarms.events import (
+    RESET_EVENT,
+    event_stream_count,
+    publish_event,
+    subscribe_events,
+    unsubscribe_events,
+)
+
+
+def test_publish_event():
+    assert publish_event("alarm_fired", {"title": "a"}) == 0
+
+    subscription = subscribe_events()
+
+    try:
+        assert event_stream_count() == 1
+        assert publish_event("alarm_fired", {"title": "a"}) == 1
+        assert (
+            subscription.next_event(timeout=0)
+            == 'event: alarm_fired\ndata: {"title": "a"}\n\n'
+        )
+    finally:
+        unsubscribe_events(subscription)
+
+    assert event_stream_count() == 0
+    assert RESET_EVENT.startswith("event: reset\n")
@@ -0,0 +1,147 @@
+from server.routes.alarms.notification_store import (
+    NotificationStore,
+    RemovedNotifications,
+)
+
+
+class __MockClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def __notification(title: str):
+    return {"title": title, "content": title}
+
+
+def test_store_is_capped():
+    store = NotificationStore(max_size=2, max_age=100)
+
+    store["1"] = __notification("1")
+    store["2"] = __notification("2")
+    store["3"] = __notification("3")
+
+    assert store.keys() == ["2", "3"]
+    assert "1" not in store
+    assert store.memory_usage()["evicted"] == 1
+
+
+def test_notifications_expire():
+    clock = __MockClock()
+    store = NotificationStore(max_size=10, max_age=100, clock=clock)
+
+    store["old"] = __notification("old")
+    clock.now = 50
+    store["new"] = __notification("new")
+    clock.now = 120
+
+    assert [notification["title"] for notification in store.values()] == ["new"]
+
+    # storing a notification again resets its age
+    store["new"] = __notification("new")
+    clock.now = 200
+
+    assert len(store) == 1
+
+
+def test_pop():
+    store = NotificationStore(max_size=10, max_age=100)
+    store["1"] = __notification("1")
+
+    assert store.pop("1")["title"] == "1"
+    assert store.pop("1", None) is None
+    assert len(store) == 0
+
+
+def test_memory_usage_is_flat():
+    store = NotificationStore(max_size=10, max_age=100)
+
+    for i in range(10):
+        store[str(i)] = __notification(str(i))
+    full_usage = store.memory_usage()["bytes"]
+
+    for i in range(10, 1000):
+        store[str(i)] = __notification(str(i))
+
+    assert store.memory_usage()["count"] == 10
+    assert store.memory_usage()["bytes"] <= full_usage * 1.5
+
+
+def test_removed_notifications_forget_least_recently_seen():
+    removed = RemovedNotifications(max_size=2)
+
+    removed.add("1")
+    removed.add("2")
+    # "1" is seen again, so "2" is the least recently seen one
+    assert "1" in removed
+    removed.add("3")
+
+    assert "1" in removed
+    assert "2" not in removed
+    assert "3" in removed
+    assert removed.memory_usage()["count"] == 2
+
+
+def test_ids_with_title():
+    store = NotificationStore(max_size=3, max_age=100)
+
+    store["a"] = __notification("same")
+    store["b"] = __notification("same")
+    store["c"] = __notification("other")
+
+    assert store.ids_with_title("same") == ["a", "b"]
+
+    # the title index is kept up to date when notifications are replaced or evicted
+    store["b"] = __notification("renamed")
+    store["d"] = __notification("other")
+
+    assert store.ids_with_title("same") == []
+    assert store.ids_with_title("renamed") == ["b"]
+    assert store.ids_with_title("other") == ["c", "d"]
+
+
+def test_generation_changes_with_notifications():
+    clock = __MockClock()
+    store = NotificationStore(max_size=10, max_age=100, clock=clock)
+    generations = [store.generation]
+
+    store["1"] = __notification("1")
+    generations.append(store.generation)
+
+    assert store.get("1") == __notification("1")
+    assert store.get("2") is None
+    assert store.generation == generations[-1]
+
+    store.pop("1")
+    generations.append(store.generation)
+    store["2"] = __notification("2")
+    generations.append(store.generation)
+    clock.now = 100
+    # expiry changes the generation too
+    generations.append(store.generation)
+
+    assert len(set(generations)) == len(generations)
+
+
+def test_page_and_changes():
+    clock = __MockClock()
+    store = NotificationStore(max_size=10, max_age=100, clock=clock)
+    store["1"] = __notification("1")
+    store["2"] = __notification("2")
+    store["3"] = __notification("3")
+
+    first_page = store.page(0, 2)
+
+    assert [notification["title"] for _, notification in first_page] == ["1", "2"]
+    assert [
+        notification["title"] for _, notification in store.page(first_page[-1][0], 2)
+    ] == ["3"]
+
+    generation = store.generation
+    store.pop("1")
+    store["4"] = __notification("4")
+
+    assert store.changes_since(generation) == ([__notification("4")], ["1"])
+    assert store.changes_since(store.generation) == ([], [])
@@ -1,9 +1,24 @@
+import threading
+from collections import OrderedDict
+
+import pytest
 from pytest_mock import mock, MockerFixture
 
+from server.utils.change_log import VersionMarks
+from server.utils.fingerprint import DedupIndex
+from server.utils.shared_state import SharedState
+from server.routes.alarms.notification_store import NotificationStore
 from server.routes.alarms.notification import (
     __create_notification,
+    __sync_shared_notifications,
+    get_notification_changes,
     get_notifications,
+    get_notifications_generation,
+    get_notifications_page,
+    get_notifications_version,
+    refresh_notifications,
     remove_notification,
+    watch_notification_changes,
 )
 
 __MOCK_NOTIFICATIONS = {
@@ -44,17 +59,17 @@ __MOCK_NOTIFICATIONS_REFRESHED = {
 
 def test_get_notifications(mocker: MockerFixture):
     mocker.patch(
-        "server.routes.alarms.notification.__notifications",
-        __MOCK_NOTIFICATIONS,
+        "server.routes.alarms.notification.__snapshot",
+        (1, tuple(__MOCK_NOTIFICATIONS.values())),
     )
 
-    notifications = get_notifications(refresh=False)
+    notifications = get_notifications()
 
     assert len(notifications) == len(__MOCK_NOTIFICATIONS.values())
 
 
 def test_get_refreshed_notifications(mocker: MockerFixture):
-    mock_notifications = __MOCK_NOTIFICATIONS.copy()
+    mock_notifications = __mock_notification_store()
 
     mock_weather_notification = {
         "title": "weather",
@@ -70,6 +85,10 @@ def test_get_refreshed_notifications(mocker: MockerFixture):
         "server.routes.alarms.notification.__notifications",
         mock_notifications,
     )
+    mocker.patch(
+        "server.routes.alarms.notification.__headline_index",
+        DedupIndex(),
+    )
 
     mocker.patch(
         "server.routes.alarms.notification.fetch_news_headlines",
@@ -96,15 +115,107 @@ def test_get_refreshed_notifications(mocker: MockerFixture):
         lambda lat, long: __MOCK_WEATHER,
     )
 
-    refreshed_notifications = get_notifications(refresh=True)
+    refreshed_notifications = refresh_notifications()
 
     assert len(refreshed_notifications) == 5
     assert mock_notifications["covid"] == mock_covid_notification
     assert mock_notifications["weather"] == mock_weather_notification
 
 
+def test_get_refreshed_notifications_partial(mocker: MockerFixture):
+    mock_notifications = NotificationStore(max_size=10, max_age=60)
+    release = threading.Event()
+
+    def slow_weather_notification():
+        release.wait(timeout=5)
+        return ("weather", {"title": "weather", "content": "test"})
+
+    def failing_covid_notification():
+        raise ConnectionError()
+
+    mocker.patch(
+        "server.routes.alarms.notification.__notifications",
+        mock_notifications,
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.__headline_index",
+        DedupIndex(),
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.__FETCH_DEADLINES",
+        {"covid": 1, "weather": 0.05, "news": 1},
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.fetch_news_headlines",
+        lambda country: __MOCK_FETCHED_NEWS,
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.calculate_news_id",
+        lambda title, description: f"id{title}",
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.__create_covid_notification",
+        failing_covid_notification,
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.__create_weather_notification",
+        slow_weather_notification,
+    )
+
+    refreshed_notifications = refresh_notifications()
+    release.set()
+
+    # news is still shown when covid fails and weather is too slow
+    assert len(refreshed_notifications) == 2
+    assert "weather" not in mock_notifications
+    assert "covid" not in mock_notifications
+
+
+def test_reworded_headlines_are_not_shown(mocker: MockerFixture):
+    mock_notifications = NotificationStore(max_size=10, max_age=60)
+    mocker.patch(
+        "server.routes.alarms.notification.__notifications",
+        mock_notifications,
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.__headline_index",
+        DedupIndex(),
+    )
+    mocker.patch(
+        "server.routes.alarms.notification.__fetch_sources",
+        lambda sources: {
+            "news": [
+                {
+                    "title": "Prime Minister announces new lockdown rules for England",
+                    "description": "The new rules come into force on Thursday "
+                    "and last until the second of December, the government said.",
+                },
+                {
+                    "title": "Prime Minister announces new lockdown rules for England - BBC",
+                    "description": "The new rules come into force on Thursday "
+                    "and last until the second of December, the government said.",
+                },
+            ]
+        },
+    )
+
+    notifications = refresh_notifications()
+
+    assert len(notifications) == 1
+
+
+def __mock_notification_store():
+    store = NotificationStore(max_size=10, max_age=60)
+
+    for notification_id, notification in __MOCK_NOTIFICATIONS.items():
+        store[notification_id] = notification
+
+    return store
+
+
 def test_remove_notifications(mocker: MockerFixture):
     removed = set()
+    notifications = __mock_notification_store()
 
     mocker.patch(
         "server.routes.alarms.notification.__removed_notifications",
@@ -113,21 +224,169 @@ def test_remove_notifications(mocker: MockerFixture):
 
     mocker.patch(
         "server.routes.alarms.notification.__notifications",
-        __MOCK_NOTIFICATIONS,
+        notifications,
+    )
+
+    remove_notification("id1")
+
+    assert "id1" not in notifications
+    assert "id2" in notifications
+    assert removed == {"id1"}
+
+
+def test_snapshot_is_published(mocker: MockerFixture):
+    notifications = __mock_notification_store()
+
+    mocker.patch("server.routes.alarms.notification.__removed_notifications", set())
+    mocker.patch("server.routes.alarms.notification.__notifications", notifications)
+    mocker.patch("server.routes.alarms.notification.__snapshot", (0, ()))
+
+    remove_notification("id1")
+    notifications["id3"] = {"title": "3", "content": "3"}
+
+    # changes show up once a snapshot is published
+    assert [notification["title"] for notification in get_notifications()] == ["2"]
+    assert get_notifications_generation() == 3
+
+    remove_notification("id2")
+
+    assert [notification["title"] for notification in get_notifications()] == ["3"]
+
+
+def test_notifications_are_shared_by_version(mocker: MockerFixture, tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    scheduler_state = SharedState(path)
+
+    mocker.patch(
+        "server.routes.alarms.notification.is_multi_process", return_value=True
     )
+    mocker.patch("server.routes.alarms.notification.is_scheduler", return_value=False)
+    mocker.patch(
+        "server.routes.alarms.notification.shared_state",
+        return_value=SharedState(path),
+    )
+    mocker.patch("server.routes.alarms.notification.__removed_notifications", set())
+    mocker.patch(
+        "server.routes.alarms.notification.__notifications", __mock_notification_store()
+    )
+    mocker.patch("server.routes.alarms.notification.__synced_version", None)
+    mocker.patch("server.routes.alarms.notification.__mirrored_version", None)
+    mocker.patch("server.routes.alarms.notification.__pending_removal_id", None)
+    mocker.patch("server.routes.alarms.notification.__version_marks", VersionMarks())
+    mocker.patch("server.routes.alarms.notification.__shared_snapshots", OrderedDict())
+
+    def share_snapshot(notification_ids):
+        version = scheduler_state.increment("notifications_version")
+        scheduler_state.put(
+            "notifications",
+            {
+                "version": version,
+                "notifications": [
+                    {"id": id, "title": id, "content": id, "markup": False}
+                    for id in notification_ids
+                ],
+            },
+        )
+
+    share_snapshot(["id1", "id2", "id3"])
+    __sync_shared_notifications()
+
+    assert get_notifications_generation() == 1
+    assert get_notifications_version() == "1"
+
+    first_page = get_notifications_page(limit=2)
+
+    assert [notification["id"] for _, notification in first_page] == ["id1", "id2"]
+
+    # the removal is sent to the scheduler, and only shows here until then
+    remove_notification("id1")
+
+    assert get_notifications_version().startswith("1.")
+
+    share_snapshot(["id2", "id3", "id4"])
+    __sync_shared_notifications()
+
+    assert get_notifications_version() == "2"
+    assert [notification["title"] for notification in get_notifications()] == [
+        "id2",
+        "id3",
+        "id4",
+    ]
+    # pages continue in the snapshot they started in
+    assert [
+        notification["id"]
+        for _, notification in get_notifications_page(first_page[-1][0], 2)
+    ] == ["id3"]
+
+    added, removed = get_notification_changes(1)
+
+    assert [notification["id"] for notification in added] == ["id4"]
+    assert removed == ["id1"]
+    # versions this process didn't show can't be listed or paged through
+    assert get_notification_changes(5) is None
+
+    with pytest.raises(ValueError):
+        get_notifications_page([5, 2], 2)
+
+
+def test_remove_notifications_by_title(mocker: MockerFixture):
+    removed = set()
+    notifications = __mock_notification_store()
+    notifications["id1 again"] = {"title": "1", "content": "1 again"}
 
     mocker.patch(
-        "server.api.news.calculate_news_id", lambda title, description: f"id{title}"
+        "server.routes.alarms.notification.__removed_notifications",
+        removed,
+    )
+
+    mocker.patch(
+        "server.routes.alarms.notification.__notifications",
+        notifications,
     )
 
     title = "1"
 
     remove_notification(title)
 
-    assert f"id{title}" not in __MOCK_NOTIFICATIONS
+    # only the oldest notification with the title is removed
+    assert "id1" not in notifications
+    assert notifications.ids_with_title(title) == ["id1 again"]
+    assert removed == {"id1"}
+
+    remove_notification("unknown")
+
     assert len(removed) == 1
 
 
+def test_changes_are_published(mocker: MockerFixture):
+    notifications = __mock_notification_store()
+
+    mocker.patch("server.routes.alarms.notification.__removed_notifications", set())
+    mocker.patch("server.routes.alarms.notification.__notifications", notifications)
+    mocker.patch("server.routes.alarms.notification.__published_generation", None)
+    event_stream_count = mocker.patch(
+        "server.routes.alarms.notification.event_stream_count", return_value=1
+    )
+    publish_event = mocker.patch("server.routes.alarms.notification.publish_event")
+
+    watch_notification_changes()
+    notifications["id3"] = {"title": "3", "content": "3"}
+    remove_notification("id1")
+
+    assert publish_event.call_args_list == [
+        mock.call("notification_added", {"title": "3", "content": "3"}),
+        mock.call("notification_removed", {"id": "id1"}),
+    ]
+
+    # nothing is published once every stream is closed
+    event_stream_count.return_value = 0
+    remove_notification("id2")
+    event_stream_count.return_value = 1
+    remove_notification("id3")
+
+    assert publish_event.call_count == 2
+
+
 def test_create_notification():
     test_title = "test title"
     test_content = "test content"
@@ -0,0 +1,114 @@
+import os
+import subprocess
+import sys
+
+from pytest_mock import MockerFixture
+
+from server import app
+
+
+def __patch_state(mocker: MockerFixture, alarms_version: str):
+    mocker.patch("server.routes.alarms.route.start_notification_refresh")
+    mocker.patch("server.routes.alarms.route.get_notifications", return_value=[])
+    mocker.patch("server.routes.alarms.route.get_alarms", return_value=[])
+    mocker.patch(
+        "server.routes.alarms.route.get_alarms_version",
+        return_value=alarms_version,
+    )
+    mocker.patch(
+        "server.routes.alarms.route.get_notifications_version", return_value="0"
+    )
+    return mocker.patch(
+        "server.routes.alarms.route.render_template", return_value="interface"
+    )
+
+
+def test_render_interface_etag(mocker: MockerFixture):
+    render_template = __patch_state(mocker, alarms_version="1")
+    mocker.patch("server.routes.alarms.route.is_multi_process", return_value=True)
+    client = app.test_client()
+
+    first = client.get("/index")
+    etag = first.headers["ETag"]
+
+    assert first.status_code == 200
+    assert first.data == b"interface"
+    # every server process showing the same state gives the same etag
+    assert etag == '"1-0"'
+
+    unchanged = client.get("/index", headers={"If-None-Match": etag})
+
+    assert unchanged.status_code == 304
+    assert unchanged.data == b""
+    assert unchanged.headers["ETag"] == etag
+
+    # another client without the page gets the cached rendering
+    assert client.get("/index").data == b"interface"
+    render_template.assert_called_once()
+
+
+def test_render_interface_changed(mocker: MockerFixture):
+    __patch_state(mocker, alarms_version="1")
+    client = app.test_client()
+    etag = client.get("/index").headers["ETag"]
+
+    render_template = __patch_state(mocker, alarms_version="2")
+    changed = client.get("/index", headers={"If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    render_template.assert_called_once()
+
+
+def test_render_interface_etag_after_restart(mocker: MockerFixture):
+    __patch_state(mocker, alarms_version="1")
+    mocker.patch("server.routes.alarms.route.is_multi_process", return_value=False)
+    mocker.patch("server.routes.alarms.route.__BOOT_ID", "boot1")
+    client = app.test_client()
+    etag = client.get("/index").headers["ETag"]
+
+    assert etag == '"boot1-1-0"'
+
+    # a restarted single-process server counts from 0 again
+    mocker.patch("server.routes.alarms.route.__BOOT_ID", "boot2")
+    restarted = client.get("/index", headers={"If-None-Match": etag})
+
+    assert restarted.status_code == 200
+    assert restarted.headers["ETag"] == '"boot2-1-0"'
+
+
+def test_import_is_lazy(tmp_path):
+    # the speech engine, numpy, the covid api client and their files are created
+    # on first use, while the alarm scheduler starts with the server
+    (tmp_path / "state").mkdir()
+    state_paths = {
+        name: str(tmp_path / "state" / name.lower())
+        for name in (
+            "ALARM_STORE_PATH",
+            "COVID_STORE_PATH",
+            "COVID_SERIES_PATH",
+            "SPEECH_CACHE_PATH",
+            "SPEECH_OUTPUT_PATH",
+        )
+    }
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, threading, server;"
+            "print(*[name for name in ('numpy', 'pyttsx3', 'uk_covid19')"
+            " if name in sys.modules],"
+            " threading.active_count())",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, **state_paths},
+    )
+
+    # the main thread and the timer thread of the scheduler
+    assert result.stdout.split() == ["2"]
+    assert all(
+        path.name.startswith("alarm_store_path")
+        for path in (tmp_path / "state").iterdir()
+    )
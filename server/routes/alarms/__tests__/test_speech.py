@@ -0,0 +1,261 @@
+import sys
+import threading
+import time
+import wave
+
+import pytest
+from pytest_mock import MockerFixture
+
+from server.routes.alarms.speech import (
+    NullBackend,
+    Pyttsx3Backend,
+    Speaker,
+    SpeechBackend,
+    WavFileBackend,
+    create_speech_backend,
+)
+from server.routes.alarms.speech_cache import SpeechCache
+
+
+class __RecordingBackend(SpeechBackend):
+    """
+    Records what it speaks. Texts in blocking are spoken until they are interrupted.
+    """
+
+    def __init__(self, blocking=()):
+        self.blocking = set(blocking)
+        self.spoken = []
+        self.started = threading.Semaphore(0)
+        self.stop_count = 0
+
+    def speak(self, texts, interrupted):
+        for text in texts:
+            self.spoken.append(text)
+            self.started.release()
+
+            while text in self.blocking and not interrupted.is_set():
+                time.sleep(0.001)
+
+            if interrupted.is_set():
+                return
+
+    def stop(self):
+        self.stop_count += 1
+
+
+def __save_to_file(text, path):
+    with wave.open(path, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(8000)
+        clip.writeframes(b"\x00\x00" * len(text))
+
+
+def test_utterances_are_spoken_by_priority():
+    backend = __RecordingBackend(blocking=["first"])
+    speaker = Speaker(backend)
+
+    first = speaker.say(["first"], priority=1)
+    assert backend.started.acquire(timeout=5)
+
+    low = speaker.say(["low"])
+    high = speaker.say(["high"], priority=1)
+
+    # utterances of the same priority don't interrupt each other
+    assert first.state == "speaking"
+    assert speaker.pending_count() == 2
+
+    backend.blocking.clear()
+
+    assert low.wait(timeout=5)
+    assert backend.spoken == ["first", "high", "low"]
+    assert [first.state, high.state, low.state] == ["spoken"] * 3
+    assert backend.stop_count == 0
+
+
+def test_higher_priority_interrupts():
+    backend = __RecordingBackend(blocking=["brief"])
+    speaker = Speaker(backend)
+
+    brief = speaker.say(["brief"])
+    assert backend.started.acquire(timeout=5)
+
+    urgent = speaker.say(["urgent"], priority=1)
+
+    assert urgent.wait(timeout=5)
+    assert brief.state == "canceled"
+    assert urgent.state == "spoken"
+    assert backend.spoken == ["brief", "urgent"]
+    assert backend.stop_count == 1
+
+
+def test_stale_utterances_are_interrupted_and_dropped():
+    now = [0]
+    backend = __RecordingBackend(blocking=["old"])
+    speaker = Speaker(backend, clock=lambda: now[0])
+
+    old = speaker.say(["old"], stale_after=10)
+    assert backend.started.acquire(timeout=5)
+
+    now[0] = 5
+    waiting = speaker.say(["waiting"], stale_after=10)
+
+    assert old.state == "speaking"
+
+    now[0] = 20
+    new = speaker.say(["new"], stale_after=10)
+
+    assert new.wait(timeout=5)
+    assert old.state == "canceled"
+    assert waiting.state == "stale"
+    assert new.state == "spoken"
+    assert backend.spoken == ["old", "new"]
+
+
+def test_cancel():
+    backend = __RecordingBackend(blocking=["speaking"])
+    speaker = Speaker(backend)
+
+    speaking = speaker.say(["speaking"])
+    assert backend.started.acquire(timeout=5)
+    queued = speaker.say(["queued"])
+
+    speaker.cancel(queued)
+
+    assert queued.wait(timeout=0)
+    assert queued.state == "canceled"
+
+    speaker.cancel(speaking)
+
+    assert speaking.wait(timeout=5)
+    assert speaking.state == "canceled"
+    assert backend.stop_count == 1
+
+    assert speaker.say(["next"]).wait(timeout=5)
+    assert backend.spoken == ["speaking", "next"]
+
+
+def test_utterance_done_callbacks():
+    backend = __RecordingBackend(blocking=["speaking"])
+    speaker = Speaker(backend)
+    done_states = []
+
+    speaking = speaker.say(["speaking"])
+    speaking.add_done_callback(lambda utterance: done_states.append(utterance.state))
+    assert backend.started.acquire(timeout=5)
+
+    assert done_states == []
+
+    speaker.cancel(speaking)
+
+    assert speaking.wait(timeout=5)
+    assert done_states == ["canceled"]
+
+    # a callback added to a done utterance is called right away
+    speaking.add_done_callback(lambda utterance: done_states.append(utterance.state))
+
+    assert done_states == ["canceled", "canceled"]
+
+
+def test_texts_are_spoken_as_they_are_generated():
+    backend = __RecordingBackend()
+    speaker = Speaker(backend)
+    second_ready = threading.Event()
+
+    def generate_texts():
+        yield "first"
+        second_ready.wait(timeout=5)
+        yield "second"
+
+    utterance = speaker.say(generate_texts())
+
+    assert backend.started.acquire(timeout=5)
+    assert backend.spoken == ["first"]
+
+    second_ready.set()
+
+    assert utterance.wait(timeout=5)
+    assert backend.spoken == ["first", "second"]
+
+
+def test_pyttsx3_backend_cached_speech(mocker: MockerFixture, tmp_path):
+    init = mocker.patch("pyttsx3.init")
+    engine = init.return_value
+    engine.getProperty.side_effect = lambda name: name
+    engine.save_to_file.side_effect = __save_to_file
+    speech_cache = SpeechCache(directory=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    plays = tmp_path / "plays"
+    audio_player = [
+        sys.executable,
+        "-c",
+        f"open({str(plays)!r}, 'a').write('played\\n')",
+    ]
+    backend = Pyttsx3Backend(speech_cache, audio_player)
+    texts = ["greeting", "covid brief", "sign-off"]
+
+    backend.speak(texts, threading.Event())
+    backend.speak(texts, threading.Event())
+
+    # the engine is created once, and every text is only synthesized by the first brief
+    init.assert_called_once()
+    assert engine.save_to_file.call_count == 3
+    assert speech_cache.stats()["hits"] == 3
+    assert plays.read_text() == "played\n" * 6
+    engine.say.assert_not_called()
+
+
+def test_pyttsx3_backend_direct_speech(mocker: MockerFixture):
+    engine = mocker.patch("pyttsx3.init").return_value
+    backend = Pyttsx3Backend()
+
+    backend.speak(["greeting", "sign-off"], threading.Event())
+
+    assert engine.say.call_args_list == [
+        mocker.call("greeting"),
+        mocker.call("sign-off"),
+    ]
+    assert engine.runAndWait.call_count == 2
+
+
+def test_pyttsx3_backend_is_stopped_by_its_own_thread(mocker: MockerFixture):
+    engine = mocker.patch("pyttsx3.init").return_value
+    backend = Pyttsx3Backend()
+    interrupted = threading.Event()
+    stopped_by = []
+    engine.stop.side_effect = lambda: stopped_by.append(threading.current_thread())
+
+    def run_and_wait():
+        # another thread interrupts the speech while the first word is spoken
+        interrupter = threading.Thread(
+            target=lambda: (interrupted.set(), backend.stop())
+        )
+        interrupter.start()
+        interrupter.join()
+
+        event, on_word = engine.connect.call_args[0]
+        assert event == "started-word"
+        on_word("greeting", 0, 5)
+
+    engine.runAndWait.side_effect = run_and_wait
+
+    backend.speak(["greeting", "sign-off"], interrupted)
+
+    assert stopped_by == [threading.current_thread()]
+    engine.say.assert_called_once_with("greeting")
+
+
+def test_create_speech_backend(mocker: MockerFixture, tmp_path):
+    mocker.patch.dict("os.environ", {"SPEECH_BACKEND": "null"})
+    assert isinstance(create_speech_backend(), NullBackend)
+
+    mocker.patch.dict(
+        "os.environ",
+        {"SPEECH_BACKEND": "wav", "SPEECH_OUTPUT_PATH": str(tmp_path / "briefs")},
+    )
+    backend = create_speech_backend()
+    assert isinstance(backend, WavFileBackend)
+    assert backend.directory == str(tmp_path / "briefs")
+
+    mocker.patch.dict("os.environ", {"SPEECH_BACKEND": "espeak"})
+    with pytest.raises(ValueError):
+        create_speech_backend()
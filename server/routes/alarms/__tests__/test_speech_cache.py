@@ -0,0 +1,71 @@
+import os
+import wave
+
+from pytest_mock import mock
+
+from server.routes.alarms.speech_cache import SpeechCache
+
+
+def __write_clip(path: str, frame_count: int):
+    with wave.open(path, "wb") as clip:
+        clip.setnchannels(1)
+        clip.setsampwidth(2)
+        clip.setframerate(8000)
+        clip.writeframes(b"\x00\x00" * frame_count)
+
+
+def __mock_engine():
+    return mock.Mock(
+        getProperty=lambda name: name,
+        save_to_file=mock.Mock(side_effect=lambda text, path: __write_clip(path, 100)),
+    )
+
+
+def test_clip_is_synthesized_once(tmp_path):
+    cache = SpeechCache(directory=str(tmp_path), max_bytes=1024 * 1024)
+    engine = __mock_engine()
+
+    first = cache.clip(engine, "hello")
+    second = cache.clip(engine, "hello")
+
+    assert first == second
+    assert os.path.exists(first)
+    engine.save_to_file.assert_called_once_with("hello", first)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_clips_are_keyed_by_voice(tmp_path):
+    cache = SpeechCache(directory=str(tmp_path), max_bytes=1024 * 1024)
+    engine = __mock_engine()
+    other_engine = __mock_engine()
+    other_engine.getProperty = lambda name: f"other {name}"
+
+    assert cache.clip(engine, "hello") != cache.clip(other_engine, "hello")
+
+
+def test_least_recently_used_clips_are_evicted(tmp_path):
+    cache = SpeechCache(directory=str(tmp_path), max_bytes=1024 * 1024, max_clips=2)
+    engine = __mock_engine()
+
+    first = cache.clip(engine, "first")
+    second = cache.clip(engine, "second")
+    cache.clip(engine, "first")
+    cache.clip(engine, "third")
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["clips"] == 2
+
+
+def test_clips_are_reused_after_restart(tmp_path):
+    engine = __mock_engine()
+    path = SpeechCache(directory=str(tmp_path), max_bytes=1024 * 1024).clip(
+        engine, "hello"
+    )
+
+    restarted_cache = SpeechCache(directory=str(tmp_path), max_bytes=1024 * 1024)
+
+    assert restarted_cache.clip(engine, "hello") == path
+    engine.save_to_file.assert_called_once()
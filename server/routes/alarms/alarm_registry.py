@@ -0,0 +1,168 @@
+"""
+This module indexes scheduled alarms by title and by scheduled time.
+"""
+
+import itertools
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from server.utils.change_log import ChangeLog
+from server.utils.sorted_list import SortedList
+
+
+class AlarmRegistry:
+    """
+    Holds the scheduled alarms, indexed by title and ordered by scheduled time.
+    Inserting and removing an alarm takes O(log n), the next due alarm is found in O(1),
+    and alarms between two times are found in O(log n + number of results).
+    Every change bumps the generation of the registry, and the changes made after
+    a generation can be listed.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        # A map of alarm titles to the alarm
+        self.__alarms: Dict[str, Dict[str, Any]] = {}
+        # (scheduled time, title) of every alarm, in order
+        self.__time_index = SortedList()
+        self.__change_log = ChangeLog()
+
+    def __len__(self) -> int:
+        return len(self.__alarms)
+
+    def __contains__(self, title: str) -> bool:
+        return title in self.__alarms
+
+    @property
+    def generation(self) -> int:
+        """
+        A number that grows whenever an alarm is added or removed.
+        """
+        return self.__change_log.generation
+
+    def get(self, title: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the alarm with the given title, or None if there is no such alarm.
+        """
+        return self.__alarms.get(title)
+
+    def add(self, alarm: Dict[str, Any]):
+        """
+        Adds an alarm to the registry.
+
+        :params alarm: The alarm, which must have a title and a scheduled_time.
+        :raises ValueError: An alarm with the same title is already registered.
+        """
+        with self.__lock:
+            if alarm["title"] in self.__alarms:
+                raise ValueError(f"An alarm titled {alarm['title']} already exists.")
+
+            self.__alarms[alarm["title"]] = alarm
+            self.__time_index.add((alarm["scheduled_time"], alarm["title"]))
+            self.__change_log.record(alarm["title"])
+
+    def add_many(self, alarms: List[Dict[str, Any]]):
+        """
+        Adds many alarms at once, e.g. when restoring stored alarms.
+        The time index is rebuilt once instead of being updated for every alarm.
+
+        :params alarms: The alarms, which must have a title and a scheduled_time.
+        :raises ValueError: Two alarms have the same title, or an alarm with the same title
+        is already registered. No alarm is added then.
+        """
+        with self.__lock:
+            titles = {alarm["title"] for alarm in alarms}
+
+            if len(titles) != len(alarms) or not titles.isdisjoint(self.__alarms):
+                raise ValueError("Some of the alarms already exist.")
+
+            self.__alarms.update((alarm["title"], alarm) for alarm in alarms)
+            self.__change_log.record_many([alarm["title"] for alarm in alarms])
+
+            self.__time_index.update(
+                (alarm["scheduled_time"], alarm["title"]) for alarm in alarms
+            )
+
+    def remove(self, title: str) -> Dict[str, Any]:
+        """
+        Removes the alarm with the given title from the registry.
+
+        :returns: The removed alarm.
+        :raises KeyError: No alarm has the given title.
+        """
+        with self.__lock:
+            alarm = self.__alarms.pop(title)
+            self.__time_index.remove((alarm["scheduled_time"], title))
+            self.__change_log.record(title, removed=True)
+
+            return alarm
+
+    def next_due(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the alarm that fires next, or None if there is no alarm.
+        """
+        with self.__lock:
+            first = self.__time_index.first()
+
+            return self.__alarms[first[1]] if first else None
+
+    def between(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """
+        Returns the alarms scheduled between start and end (both inclusive),
+        ordered by scheduled time.
+        """
+        with self.__lock:
+            # (start,) sorts before every (start, title)
+            keys = itertools.takewhile(
+                lambda key: key[0] <= end, self.__time_index.iter_from((start,))
+            )
+
+            return [self.__alarms[title] for _, title in keys]
+
+    def page(
+        self, after: Optional[Tuple[datetime, str]], limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns at most limit alarms ordered by scheduled time,
+        starting after the alarm with the given (scheduled time, title).
+
+        :params after: The (scheduled time, title) of the last alarm of the previous page,
+        or None for the first page. The alarm doesn't have to exist anymore.
+        :params limit: The maximum number of alarms returned.
+        """
+        with self.__lock:
+            keys = (
+                self.__time_index
+                if after is None
+                else self.__time_index.iter_from(after)
+            )
+            keys = (key for key in keys if key != after)
+
+            return [self.__alarms[title] for _, title in itertools.islice(keys, limit)]
+
+    def changes_since(
+        self, generation: int
+    ) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+        """
+        Returns the changes made after the given generation.
+
+        :returns: A tuple of (alarms added, titles of alarms removed), or None if
+        the changes are too old to be listed. Alarms added then removed are only listed as removed.
+        """
+        with self.__lock:
+            changes = self.__change_log.changes_since(generation)
+
+            if changes is None:
+                return None
+
+            added, removed = changes
+
+            return [self.__alarms[title] for title in added], removed
+
+    def ordered(self) -> List[Dict[str, Any]]:
+        """
+        Returns every alarm ordered by scheduled time.
+        """
+        with self.__lock:
+            return [self.__alarms[title] for _, title in self.__time_index]
@@ -1,33 +1,237 @@
 """
 This module handles alarm scheduling
+
+When the server runs in several processes, alarms are shared through the alarm store.
+Every process mirrors the alarms scheduled and canceled by the others,
+and only the scheduler process (see cluster.py) has timers firing them.
 """
 
+import bisect
 import logging
-import sched
+import operator
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock, RLock
+from typing import List, Dict, Set, Any, Iterable, Optional, Tuple
+
 from flask import Markup
-from datetime import datetime
-from threading import Thread
-from typing import List, Dict, Any
 
-from .daily_brief import daily_brief
+from server.utils.change_log import VersionMarks
+from server.utils.logger import log_exception
+from server.utils.timer_queue import Timer, TimerQueue
+from .alarm_registry import AlarmRegistry
+from .alarm_store import AlarmStore
+from .cluster import (
+    is_multi_process,
+    is_scheduler,
+    on_scheduler_change,
+    on_sync,
+    start_cluster,
+)
+from .daily_brief import (
+    brief_data_ttl,
+    brief_prefetch_lead,
+    daily_brief,
+    prefetch_brief_data,
+)
+from .events import broadcast_event
+
+__timer_queue = TimerQueue()
+
+# Persists scheduled alarms. The path can be configured with alarm_store_path in config.json.
+# Opened by __get_alarm_store on first use, so importing the server doesn't touch the database.
+__alarm_store: Optional[AlarmStore] = None
+__alarm_store_lock = Lock()
+
+# Runs daily briefs of fired alarms, so alarms firing at the same time don't wait for each other.
+# The number of workers can be configured with alarm_workers in config.json.
+__brief_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ALARM_WORKERS", 4)),
+    thread_name_prefix="daily-brief",
+)
+
+# Metrics of fired alarms. Firing lag is the number of seconds between
+# the scheduled time of an alarm and the start of its daily brief.
+__metrics = {
+    "queued": 0,
+    "running": 0,
+    "fired": 0,
+    "failed": 0,
+    "total_firing_lag": 0.0,
+    "max_firing_lag": 0.0,
+    "last_firing_lag": 0.0,
+}
+
+__metrics_lock = Lock()
+
+# The scheduled alarms, indexed by title and by scheduled time
+__alarms = AlarmRegistry()
+
+# A map of alarm titles to the scheduled timer of the alarm
+__schedules: Dict[str, Timer] = {}
+
+# Sorted timestamps of scheduled prefetches of daily brief data.
+# A prefetch is shared by every alarm firing while the prefetched data is still fresh.
+__prefetch_times: List[float] = []
+
+# A map of prefetch timestamps to the prefetch timer and the titles of alarms sharing it
+__prefetches: Dict[float, Dict[str, Any]] = {}
+
+# A map of alarm titles to the timestamp of the prefetch the alarm shares
+__alarm_prefetch_times: Dict[str, float] = {}
+
+__prefetch_lock = Lock()
+
+# guards changes of __alarms and __schedules made by request threads,
+# the timer thread and syncs with other server processes
+__alarms_lock = RLock()
+
+# the data version of the alarm store the alarms were last synced at
+__synced_version = None
 
-__scheduler = sched.scheduler(timefunc=time.time, delayfunc=time.sleep)
+# the version of the alarm store (see AlarmStore.version) __alarms shows
+__alarms_version = 0
 
-# A map of alarm titles to the cooresponding alarm info in the shape of
-__alarm_info: Dict[str, Dict[str, Any]] = {}
+# the generations of __alarms at which versions of the alarm store were shown,
+# so clients can ask any server process for the changes since a version
+__version_marks = VersionMarks()
 
-# A map of alarm titles to the scheduled event of the alarm
-__schedules: Dict[str, sched.Event] = {}
+# whether start_alarm_scheduler restored the stored alarms and started the timer thread
+__scheduler_started = False
+__scheduler_start_lock = Lock()
+
+
+class AlarmExistsError(Exception):
+    """
+    Raised when an alarm is scheduled with the title of an existing alarm.
+    """
+
+
+def start_alarm_scheduler():
+    """
+    Restores the stored alarms and starts the timer thread, which sleeps
+    until the next alarm is due. Called when the server starts.
+    Does nothing if the scheduler is already started.
+    """
+    global __scheduler_started
+
+    if __scheduler_started:
+        return
+
+    with __scheduler_start_lock:
+        if __scheduler_started:
+            return
+
+        __restore_alarms()
+        start_cluster()
+        __timer_queue.start()
+        __scheduler_started = True
 
 
 def get_alarms() -> List[Dict[str, Any]]:
     """
-    Gets the current list of alarms.
+    Gets the current list of alarms, with the html describing them as their "content".
 
-    :returns: The current list of alarms
+    :returns: The current list of alarms, ordered by scheduled time
     """
-    return __alarm_info.values()
+    __sync_alarms()
+    # the content is only formatted for the interface, so restoring the alarm store
+    # does not create an extra object for every stored alarm
+    return [
+        {**alarm, "content": __alarm_content(alarm)} for alarm in __alarms.ordered()
+    ]
+
+
+def get_alarms_generation() -> int:
+    """
+    Returns a number that changes whenever an alarm is scheduled, canceled or fired.
+    When the server runs in several processes, it is the version of the alarm store,
+    which is the same in every process showing the same alarms.
+    """
+    __sync_alarms()
+
+    if is_multi_process():
+        return __alarms_version
+
+    return __alarms.generation
+
+
+def get_alarms_version() -> str:
+    """
+    Returns a string that changes whenever an alarm is scheduled, canceled or fired,
+    for the etag of the interface.
+    """
+    return str(get_alarms_generation())
+
+
+def get_alarm(title: str) -> Optional[Dict[str, Any]]:
+    """
+    Gets the alarm with the given title.
+
+    :returns: The alarm, or None if no alarm has the title
+    """
+    __sync_alarms()
+    return __alarms.get(title)
+
+
+def get_alarms_page(
+    after: Optional[Tuple[datetime, str]] = None, limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Gets a page of the list of alarms, ordered by scheduled time.
+
+    :params after: The (scheduled time, title) of the last alarm of the previous page,
+    or None for the first page.
+    :params limit: The maximum number of alarms returned.
+    """
+    __sync_alarms()
+    return __alarms.page(after, limit)
+
+
+def get_alarm_changes(
+    since: int,
+) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+    """
+    Gets the alarms scheduled and the titles of the alarms canceled or fired
+    after the given generation (see get_alarms_generation).
+
+    :returns: A tuple of (alarms scheduled, titles of alarms removed),
+    or None if the changes are too old to be listed.
+    """
+    __sync_alarms()
+
+    if not is_multi_process():
+        return __alarms.changes_since(since)
+
+    with __alarms_lock:
+        generation = __version_marks.generation(since)
+
+        # the version is not shown by this process, e.g. it is too old
+        return None if generation is None else __alarms.changes_since(generation)
+
+
+def get_alarms_between(start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """
+    Gets the alarms scheduled between the given times.
+
+    :params start: The earliest scheduled time, inclusive.
+    :params end: The latest scheduled time, inclusive.
+    :returns: The alarms scheduled between start and end, ordered by scheduled time
+    """
+    __sync_alarms()
+    return __alarms.between(start, end)
+
+
+def get_next_alarm() -> Dict[str, Any]:
+    """
+    Gets the alarm that fires next.
+
+    :returns: The alarm that fires next, or None if no alarm is scheduled
+    """
+    __sync_alarms()
+    return __alarms.next_due()
 
 
 def schedule_alarm(
@@ -35,6 +239,7 @@ def schedule_alarm(
     at_time: datetime,
     should_include_weather: bool = False,
     should_include_news: bool = False,
+    fail_if_exists: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Schedule an alarm to run at specified time
@@ -42,8 +247,11 @@ def schedule_alarm(
     :params title: The title of the alarm
     :params at_time: The time when the alarm will fire
     :params callback: The function the scheduler should run when the alarm fires
+    :params fail_if_exists: Whether to raise AlarmExistsError if an alarm has the same title.
+    Otherwise the existing alarm is kept, and the error is only logged.
     :returns: The new list of alarms after this alarm is scheduled.
     :raises ValueError: The given alarm time (at_time) is in the past.
+    :raises AlarmExistsError: An alarm has the same title, and fail_if_exists is set.
     """
 
     time_delay = at_time - datetime.now()
@@ -51,19 +259,29 @@ def schedule_alarm(
     if time_delay.total_seconds() < 0:
         raise ValueError(f"Invalid alarm time given. Received: {at_time}")
 
-    if title not in __alarm_info:
-        new_alarm = __alarm(
-            title=title,
-            scheduled_time=at_time,
-            include_news=should_include_news,
-            include_weather=should_include_weather,
-        )
-        __alarm_info[title] = new_alarm
-        __schedules[title] = __scheduler.enterabs(
-            at_time.timestamp(), 1, lambda: __trigger_alarm(new_alarm)
-        )
-    else:
-        existing_alarm = __alarm_info[title]
+    __sync_alarms()
+
+    with __alarms_lock:
+        existing_alarm = __alarms.get(title)
+
+        if existing_alarm is None:
+            __add_alarm(
+                title=title,
+                scheduled_time=at_time,
+                include_news=should_include_news,
+                include_weather=should_include_weather,
+            )
+            __get_alarm_store().save(
+                title=title,
+                scheduled_time=at_time,
+                include_news=should_include_news,
+                include_weather=should_include_weather,
+            )
+            __record_change()
+
+    if existing_alarm is not None:
+        if fail_if_exists:
+            raise AlarmExistsError(f"An alarm titled {title} already exists.")
 
         logging.error(
             """
@@ -75,12 +293,349 @@ def schedule_alarm(
             existing_alarm["scheduled_time"],
         )
 
-    return __alarm_info.values()
+    return __alarms.ordered()
+
+
+def __get_alarm_store() -> AlarmStore:
+    """
+    Returns the alarm store, opening it on first use.
+    """
+    global __alarm_store
+
+    with __alarm_store_lock:
+        if __alarm_store is None:
+            __alarm_store = AlarmStore(os.environ.get("ALARM_STORE_PATH", "alarms.db"))
+
+        return __alarm_store
+
+
+def __add_alarm(
+    title: str,
+    scheduled_time: datetime,
+    include_news: bool = False,
+    include_weather: bool = False,
+):
+    """
+    Adds an alarm to the scheduler, without storing it.
+    Alarms scheduled in the past fire right away.
+    """
+    __add_alarms(
+        [
+            {
+                "title": title,
+                "scheduled_time": scheduled_time,
+                "include_news": include_news,
+                "include_weather": include_weather,
+            }
+        ]
+    )
+
+
+def __add_alarms(stored_alarms: List[Dict[str, Any]]):
+    """
+    Adds alarms to the scheduler at once, without storing them.
+    Alarms scheduled in the past fire right away.
+
+    :params stored_alarms: The alarms, in the shape returned by AlarmStore.load_all.
+    """
+    # stored alarms already have the shape of the alarms of the scheduler
+    with __alarms_lock:
+        __alarms.add_many(stored_alarms)
+
+        if is_scheduler():
+            __schedule_timers(stored_alarms)
+
+
+def __schedule_timers(alarms: List[Dict[str, Any]]):
+    """
+    Schedules the timers firing the given alarms, and the prefetches of their daily brief data.
+    Must be called with __alarms_lock held.
+    """
+    # scheduled by time, so prefetches can be shared in a single pass
+    alarms = sorted(alarms, key=operator.itemgetter("scheduled_time"))
+    titles = [alarm["title"] for alarm in alarms]
+    timestamps = [alarm["scheduled_time"].timestamp() for alarm in alarms]
+    timers = __timer_queue.schedule_many(
+        # timers are given the title instead of the alarm, as a tuple of strings
+        # is not tracked by the garbage collector
+        (timestamp, __trigger_alarm, (title,))
+        for timestamp, title in zip(timestamps, titles)
+    )
+
+    __schedules.update(zip(titles, timers))
+    __schedule_prefetches(zip(titles, timestamps))
+
+
+def __remove_alarm(title: str) -> Dict[str, Any]:
+    """
+    Removes an alarm from the scheduler, without removing it from the store.
+
+    :returns: The removed alarm.
+    """
+    with __alarms_lock:
+        removed_alarm = __alarms.remove(title)
+        timer = __schedules.pop(title, None)
+
+        if timer is not None:
+            __timer_queue.cancel(timer)
+            __release_prefetch(title)
+
+        return removed_alarm
+
+
+def __sync_alarms():
+    """
+    Mirrors the alarms scheduled and canceled by other server processes.
+    The alarm store is only read when another process changed it since the last sync.
+    Does nothing when the server runs in a single process.
+    """
+    global __synced_version
+
+    if not is_multi_process():
+        return
+
+    alarm_store = __get_alarm_store()
+
+    with __alarms_lock:
+        data_version = alarm_store.data_version()
+
+        if data_version == __synced_version:
+            return
+
+        __synced_version = data_version
+        version, stored_alarms = alarm_store.snapshot()
+        stored_alarms = {alarm["title"]: alarm for alarm in stored_alarms}
 
+        for alarm in __alarms.ordered():
+            stored_alarm = stored_alarms.get(alarm["title"])
 
-def __trigger_alarm(alarm_info: Dict[str, Any]):
-    __alarm_info.pop(alarm_info["title"])
-    daily_brief(alarm_info)
+            if stored_alarm is not None and __is_same_alarm(stored_alarm, alarm):
+                # the alarm is unchanged
+                del stored_alarms[alarm["title"]]
+            else:
+                __remove_alarm(alarm["title"])
+
+        __add_alarms(list(stored_alarms.values()))
+        __show_version(version)
+
+
+def __show_version(version: int):
+    """
+    Records that the alarms are the alarms stored at the given version of the alarm store.
+    Must be called with __alarms_lock held.
+    """
+    global __alarms_version
+
+    __alarms_version = version
+    __version_marks.mark(version, __alarms.generation)
+
+
+def __record_change():
+    """
+    Records the version of the alarm store after this process changed it,
+    if no other process changed the store since the alarms were synced.
+    Otherwise the next sync records it, as the data version of the store changed too.
+    Must be called with __alarms_lock held.
+    Does nothing when the server runs in a single process.
+    """
+    if not is_multi_process():
+        return
+
+    version = __get_alarm_store().version()
+
+    if version == __alarms_version + 1:
+        __show_version(version)
+
+
+def __is_same_alarm(stored_alarm: Dict[str, Any], alarm: Dict[str, Any]) -> bool:
+    """
+    Checks whether a stored alarm is the same as a scheduled alarm.
+    """
+    return (
+        # stored times are rounded to the microsecond
+        abs((stored_alarm["scheduled_time"] - alarm["scheduled_time"]).total_seconds())
+        < 0.001
+        # the flags given by the interface are strings
+        and stored_alarm["include_news"] == bool(alarm["include_news"])
+        and stored_alarm["include_weather"] == bool(alarm["include_weather"])
+    )
+
+
+def __on_scheduler_change(became_scheduler: bool):
+    """
+    Schedules the timers of every alarm when this process becomes the scheduler,
+    and cancels them when it stops being the scheduler.
+    """
+    with __alarms_lock:
+        if became_scheduler:
+            __schedule_timers(
+                [
+                    alarm
+                    for alarm in __alarms.ordered()
+                    if alarm["title"] not in __schedules
+                ]
+            )
+        else:
+            for title in list(__schedules):
+                __timer_queue.cancel(__schedules.pop(title))
+                __release_prefetch(title)
+
+
+def __restore_alarms():
+    """
+    Schedules the alarms persisted in the alarm store, e.g. after a server restart.
+    Alarms missed by at most missed_alarm_grace seconds (config.json, defaults to 60)
+    fire right away, and alarms missed by longer are dropped.
+    """
+    global __synced_version
+
+    missed_alarm_grace = float(os.environ.get("MISSED_ALARM_GRACE", 60))
+    # alarms scheduled before this time are dropped
+    drop_before = datetime.now() - timedelta(seconds=missed_alarm_grace)
+    restored_alarms = []
+    dropped_alarm_titles = []
+    alarm_store = __get_alarm_store()
+    # read before the alarms, so changes made by other processes meanwhile are synced
+    synced_version = alarm_store.data_version()
+    stored_version, stored_alarms = alarm_store.snapshot()
+
+    for stored_alarm in stored_alarms:
+        if stored_alarm["scheduled_time"] < drop_before:
+            dropped_alarm_titles.append(stored_alarm["title"])
+        else:
+            restored_alarms.append(stored_alarm)
+
+    # added at once, so the alarms are indexed and their timers scheduled in bulk
+    __add_alarms(restored_alarms)
+
+    with __alarms_lock:
+        __show_version(stored_version)
+        alarm_store.delete_many(dropped_alarm_titles)
+
+        if dropped_alarm_titles:
+            __record_change()
+
+    __synced_version = synced_version
+
+    logging.info(
+        "Restored %s alarms. Dropped %s missed alarms.",
+        len(__alarms),
+        len(dropped_alarm_titles),
+    )
+
+
+def get_alarm_metrics() -> Dict[str, float]:
+    """
+    Gets metrics of fired alarms in the shape of:
+    {
+        "queue_depth": number of fired alarms waiting for a free worker,
+        "running": number of daily briefs being prepared or waiting to be spoken or spoken,
+        "fired": number of alarms fired so far,
+        "failed": number of daily briefs that raised an exception or could not be spoken,
+        "average_firing_lag": average seconds between the scheduled time and the brief,
+        "max_firing_lag": the longest firing lag so far,
+        "last_firing_lag": the firing lag of the latest alarm,
+    }
+    """
+    with __metrics_lock:
+        return {
+            "queue_depth": __metrics["queued"],
+            "running": __metrics["running"],
+            "fired": __metrics["fired"],
+            "failed": __metrics["failed"],
+            "average_firing_lag": (
+                __metrics["total_firing_lag"] / __metrics["fired"]
+                if __metrics["fired"]
+                else 0.0
+            ),
+            "max_firing_lag": __metrics["max_firing_lag"],
+            "last_firing_lag": __metrics["last_firing_lag"],
+        }
+
+
+def __trigger_alarm(alarm_title: str):
+    """
+    Hands a due alarm over to the daily brief workers, so the timer thread is free
+    to fire the next alarm right away.
+    When the server runs in several processes, the alarm is claimed by removing it
+    from the store first, so it never fires twice, even while two processes
+    believe they are the scheduler.
+
+    :params alarm_title: The title of the alarm.
+    """
+    with __alarms_lock:
+        if __schedules.get(alarm_title) is None:
+            # the alarm is canceled, or another process became the scheduler
+            return
+
+        alarm_info = __alarms.remove(alarm_title)
+        __schedules.pop(alarm_title)
+        __release_prefetch(alarm_title)
+        claimed = __get_alarm_store().delete(alarm_title, alarm_info["scheduled_time"])
+
+        if claimed:
+            __record_change()
+
+    if not claimed and is_multi_process():
+        logging.info(
+            "Alarm titled %s is fired or canceled by another process.",
+            alarm_info["title"],
+        )
+        return
+
+    with __metrics_lock:
+        __metrics["queued"] += 1
+
+    __brief_executor.submit(__run_daily_brief, alarm_info)
+    broadcast_event(
+        "alarm_fired",
+        {
+            "title": alarm_info["title"],
+            "scheduled_time": alarm_info["scheduled_time"].isoformat(),
+        },
+    )
+
+
+def __run_daily_brief(alarm_info: Dict[str, Any]):
+    """
+    Gives the daily brief of a fired alarm. Runs on a daily brief worker.
+    """
+    firing_lag = (datetime.now() - alarm_info["scheduled_time"]).total_seconds()
+
+    with __metrics_lock:
+        __metrics["queued"] -= 1
+        __metrics["running"] += 1
+        __metrics["fired"] += 1
+        __metrics["total_firing_lag"] += firing_lag
+        __metrics["max_firing_lag"] = max(__metrics["max_firing_lag"], firing_lag)
+        __metrics["last_firing_lag"] = firing_lag
+
+    try:
+        utterance = daily_brief(alarm_info)
+    except Exception as brief_exception:  # pylint: disable=broad-except
+        __finish_daily_brief(failed=True)
+        log_exception(
+            method="alarm_scheduler > __run_daily_brief", exception=brief_exception
+        )
+        return
+
+    # the brief is spoken later, on the thread of the speaker
+    utterance.add_done_callback(
+        lambda utterance: __finish_daily_brief(failed=utterance.state == "failed")
+    )
+
+
+def __finish_daily_brief(failed: bool):
+    """
+    Records that the daily brief of a fired alarm is done.
+
+    :params failed: Whether the brief raised an exception or could not be spoken.
+    """
+    with __metrics_lock:
+        __metrics["running"] -= 1
+
+        if failed:
+            __metrics["failed"] += 1
 
 
 def cancel_alarm(alarm_title: str):
@@ -91,14 +646,19 @@ def cancel_alarm(alarm_title: str):
     :raises ValueError: The alarm title is not associated with any alarm,
     or the alarm is not scheduled.
     """
-    if alarm_title not in __schedules:
-        raise ValueError(
-            f"The given id: {alarm_title} is not associated with any alarm."
-        )
+    __sync_alarms()
+
+    with __alarms_lock:
+        if alarm_title not in __alarms:
+            raise ValueError(
+                f"The given id: {alarm_title} is not associated with any alarm."
+            )
+
+        canceled_alarm = __remove_alarm(alarm_title)
 
-    canceled_alarm = __alarm_info.pop(alarm_title)
+        if __get_alarm_store().delete(alarm_title):
+            __record_change()
 
-    __scheduler.cancel(__schedules.pop(alarm_title))
     logging.info(
         "Alarm titled %s scheduled on %s canceled.",
         alarm_title,
@@ -106,46 +666,140 @@ def cancel_alarm(alarm_title: str):
     )
 
 
-def __run_schedules():
+def __schedule_prefetches(alarms: Iterable[Tuple[str, float]]):
     """
-    Keep polling the scheduler queue to see if there are any events queueing.
+    Makes sure the data of the daily briefs of the given alarms is fetched
+    ahead of the alarms. An already scheduled prefetch is shared if its data
+    will still be fresh when an alarm fires.
+
+    :params alarms: The (title, timestamp when it fires) of every alarm, ordered by timestamp.
     """
-    while True:
-        __scheduler.run()
+    # read once, as restoring the alarm store schedules every stored alarm at once
+    prefetch_lead = brief_prefetch_lead()
+    data_ttl = brief_data_ttl()
+    now = time.time()
+    new_prefetch_times = []
+    # the latest of new_prefetch_times. New prefetches are only merged
+    # into __prefetch_times at the end, and are due in the order they are created
+    latest_new_prefetch_time = None
 
+    with __prefetch_lock:
+        for alarm_title, alarm_timestamp in alarms:
+            if (
+                latest_new_prefetch_time is not None
+                and alarm_timestamp - data_ttl
+                <= latest_new_prefetch_time
+                <= alarm_timestamp
+            ):
+                prefetch_time = latest_new_prefetch_time
+            else:
+                # alarms due sooner than the lead time are prefetched right away
+                prefetch_time = max(alarm_timestamp - prefetch_lead, now)
 
-def __alarm(
-    title: str,
-    scheduled_time: datetime,
-    include_news: bool = False,
-    include_weather: bool = False,
-) -> Dict[str, Any]:
+                # e.g. alarms that are already due share the prefetch running now
+                if prefetch_time not in __prefetches:
+                    # the latest prefetch due before the alarm
+                    index = bisect.bisect_right(__prefetch_times, alarm_timestamp) - 1
+
+                    if (
+                        index >= 0
+                        and __prefetch_times[index] >= alarm_timestamp - data_ttl
+                    ):
+                        prefetch_time = __prefetch_times[index]
+                    else:
+                        __prefetches[prefetch_time] = {
+                            "timer": None,
+                            "alarm_titles": set(),
+                        }
+                        new_prefetch_times.append(prefetch_time)
+                        latest_new_prefetch_time = prefetch_time
+
+            __prefetches[prefetch_time]["alarm_titles"].add(alarm_title)
+            __alarm_prefetch_times[alarm_title] = prefetch_time
+
+        timers = __timer_queue.schedule_many(
+            (prefetch_time, __run_prefetch, (prefetch_time,))
+            for prefetch_time in new_prefetch_times
+        )
+
+        for prefetch_time, timer in zip(new_prefetch_times, timers):
+            __prefetches[prefetch_time]["timer"] = timer
+
+        # both lists are sorted, so sorting them together is linear
+        __prefetch_times.extend(new_prefetch_times)
+        __prefetch_times.sort()
+
+
+def __release_prefetch(alarm_title: str):
     """
-    Creates a dictionary holding alarm information in the shape of:
-    {
-        "title": "Title of the alarm",
-        "content": the time when the alarm fires
-        "include_news": whether to include news briefing when the alarm fires.
-        "include_weather": whether to include weather briefing when the alarm fires.
-    }
+    Removes the given alarm from the prefetch it shares.
+    The prefetch is cancelled when no alarm shares it anymore.
 
-    :params title: The title of the alarm
-    :params content: The time when the alarm will fire
-    :returns: A dictionary holding an alarm
-    """
-
-    return {
-        "title": title,
-        "scheduled_time": scheduled_time,
-        "content": Markup(
-            f"""Scheduled at: <strong>{scheduled_time}</strong> <br>
-News briefing: <strong>{'enabled' if include_news else 'disabled'}</strong> <br>
-Weather briefing: <strong>{'enabled' if include_weather else 'disabled'}</strong>"""
-        ),
-        "include_news": include_news,
-        "include_weather": include_weather,
-    }
+    :params alarm_title: The title of the alarm.
+    """
+    with __prefetch_lock:
+        prefetch_time = __alarm_prefetch_times.pop(alarm_title, None)
+        prefetch = __prefetches.get(prefetch_time)
+
+        if not prefetch:
+            # the prefetch has already run
+            return
+
+        alarm_titles: Set[str] = prefetch["alarm_titles"]
+        alarm_titles.discard(alarm_title)
+
+        if not alarm_titles:
+            __timer_queue.cancel(prefetch["timer"])
+            __remove_prefetch(prefetch_time)
+
+
+def __run_prefetch(prefetch_time: float):
+    """
+    Prefetches daily brief data on a daily brief worker. Runs when a prefetch timer is due.
+
+    :params prefetch_time: The timestamp the prefetch is scheduled at.
+    """
+    with __prefetch_lock:
+        if prefetch_time not in __prefetches:
+            # the last alarm sharing the prefetch was canceled while the timer fired
+            return
+
+        prefetch = __remove_prefetch(prefetch_time)
+
+        for alarm_title in prefetch["alarm_titles"]:
+            __alarm_prefetch_times.pop(alarm_title, None)
+
+    __brief_executor.submit(prefetch_brief_data)
+
+
+def __remove_prefetch(prefetch_time: float) -> Dict[str, Any]:
+    """
+    Removes a prefetch from the prefetch indices. Must be called with __prefetch_lock held.
+
+    :params prefetch_time: The timestamp the prefetch is scheduled at.
+    :returns: The removed prefetch.
+    """
+    __prefetch_times.pop(bisect.bisect_left(__prefetch_times, prefetch_time))
+
+    return __prefetches.pop(prefetch_time)
+
+
+def __alarm_content(alarm: Dict[str, Any]) -> Markup:
+    """
+    Formats the html describing an alarm in the interface.
+
+    :params alarm: The alarm
+    :returns: The html describing the alarm
+    """
+
+    return Markup(
+        f"""Scheduled at: <strong>{alarm['scheduled_time']}</strong> <br>
+News briefing: <strong>{'enabled' if alarm['include_news'] else 'disabled'}</strong> <br>
+Weather briefing: <strong>{'enabled' if alarm['include_weather'] else 'disabled'}</strong>"""
+    )
 
 
-# start a scheduler polling thread
-Thread(target=__run_schedules).start()
+# when the server runs in several processes, alarms are synced with the other processes,
+# and the timers only run in the scheduler process.
+on_sync(__sync_alarms)
+on_scheduler_change(__on_scheduler_change)
@@ -0,0 +1,214 @@
+"""
+This module persists scheduled alarms, so they survive server restarts.
+
+Alarms are stored in a SQLite database in WAL mode: every change is committed in its own
+transaction, so a crash loses at most the change being made and never corrupts the store.
+SQLite reuses the pages of deleted alarms, and WAL checkpoints run automatically,
+so the database file stays proportional to the number of pending alarms.
+
+The store also counts the transactions that changed it. The count is its version,
+which is the same for every server process sharing the store, and survives restarts.
+"""
+
+import sqlite3
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class AlarmStore:
+    """
+    A durable store of scheduled alarms, backed by a SQLite database.
+    """
+
+    def __init__(self, path: str):
+        """
+        :params path: Path to the database file. ":memory:" keeps the store in memory.
+        """
+        # the store is shared by request threads and the alarm threads
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__lock = Lock()
+
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS alarms (
+                    title TEXT PRIMARY KEY,
+                    scheduled_time REAL NOT NULL,
+                    include_news INTEGER NOT NULL,
+                    include_weather INTEGER NOT NULL
+                )
+                """)
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS store_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    version INTEGER NOT NULL
+                )
+                """)
+            self.__connection.execute(
+                "INSERT OR IGNORE INTO store_version VALUES (0, 0)"
+            )
+
+    def save(
+        self,
+        title: str,
+        scheduled_time: datetime,
+        include_news: bool = False,
+        include_weather: bool = False,
+    ):
+        """
+        Stores an alarm, replacing the stored alarm with the same title.
+
+        :params title: The title of the alarm
+        :params scheduled_time: The time when the alarm fires
+        :params include_news: Whether to include news briefing when the alarm fires.
+        :params include_weather: Whether to include weather briefing when the alarm fires.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO alarms VALUES (?, ?, ?, ?)",
+                (
+                    title,
+                    scheduled_time.timestamp(),
+                    int(bool(include_news)),
+                    int(bool(include_weather)),
+                ),
+            )
+            self.__bump_version()
+
+    def save_many(self, alarms: Iterable[Dict[str, Any]]):
+        """
+        Stores many alarms in a single transaction.
+
+        :params alarms: Alarms in the shape returned by load_all.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO alarms VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        alarm["title"],
+                        alarm["scheduled_time"].timestamp(),
+                        int(bool(alarm["include_news"])),
+                        int(bool(alarm["include_weather"])),
+                    )
+                    for alarm in alarms
+                ),
+            )
+            self.__bump_version()
+
+    def delete(self, title: str, scheduled_time: datetime = None) -> bool:
+        """
+        Removes the alarm with the given title from the store, if it is stored.
+        Server processes sharing the store can claim an alarm this way,
+        since only one of them gets to delete it.
+
+        :params title: The title of the alarm
+        :params scheduled_time: If given, the alarm is only removed if it is scheduled at that time.
+        :returns: Whether the alarm is removed.
+        """
+        with self.__lock, self.__connection:
+            if scheduled_time is None:
+                cursor = self.__connection.execute(
+                    "DELETE FROM alarms WHERE title = ?", (title,)
+                )
+            else:
+                # timestamps are compared to the millisecond, since they go through
+                # datetime and back, which rounds them to the microsecond
+                cursor = self.__connection.execute(
+                    "DELETE FROM alarms WHERE title = ? AND ABS(scheduled_time - ?) < 0.001",
+                    (title, scheduled_time.timestamp()),
+                )
+
+            if cursor.rowcount > 0:
+                self.__bump_version()
+
+            return cursor.rowcount > 0
+
+    def delete_many(self, titles: Iterable[str]):
+        """
+        Removes the alarms with the given titles from the store in a single transaction.
+
+        :params titles: The titles of the alarms
+        """
+        with self.__lock, self.__connection:
+            cursor = self.__connection.executemany(
+                "DELETE FROM alarms WHERE title = ?", ((title,) for title in titles)
+            )
+
+            if cursor.rowcount > 0:
+                self.__bump_version()
+
+    def data_version(self) -> int:
+        """
+        Returns a number that changes whenever another connection,
+        e.g. in another server process, changes the store.
+        """
+        with self.__lock:
+            return self.__connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def version(self) -> int:
+        """
+        Returns the number of transactions that changed the store, in any server process.
+        """
+        with self.__lock:
+            return self.__connection.execute(
+                "SELECT version FROM store_version"
+            ).fetchone()[0]
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """
+        Loads every stored alarm, ordered by scheduled time.
+
+        :returns: A list of alarms in the shape of:
+        {
+            "title": "Title of the alarm",
+            "scheduled_time": the time when the alarm fires,
+            "include_news": whether to include news briefing when the alarm fires,
+            "include_weather": whether to include weather briefing when the alarm fires,
+        }
+        """
+        return self.snapshot()[1]
+
+    def snapshot(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Returns the version of the store and every stored alarm in the shape
+        returned by load_all, read in a single transaction.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute("BEGIN")
+            version = self.__connection.execute(
+                "SELECT version FROM store_version"
+            ).fetchone()[0]
+            # the rows are converted as they are read, instead of being fetched
+            # all at once, so they don't pile up for the garbage collector
+            alarms = [
+                {
+                    "title": title,
+                    "scheduled_time": datetime.fromtimestamp(scheduled_time),
+                    "include_news": bool(include_news),
+                    "include_weather": bool(include_weather),
+                }
+                for title, scheduled_time, include_news, include_weather in (
+                    self.__connection.execute(
+                        "SELECT title, scheduled_time, include_news, include_weather "
+                        "FROM alarms ORDER BY scheduled_time"
+                    )
+                )
+            ]
+
+        return version, alarms
+
+    def __bump_version(self):
+        """
+        Adds one to the version of the store. Must be called in the transaction changing it.
+        """
+        self.__connection.execute("UPDATE store_version SET version = version + 1")
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self.__lock:
+            self.__connection.close()
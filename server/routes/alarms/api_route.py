@@ -0,0 +1,382 @@
+"""
+This module defines the JSON api of alarms and notifications.
+
+Lists are paginated: a response has at most `limit` items, and a `next_cursor`
+to pass as `cursor` to get the next page, which is null on the last page.
+Responses also carry the current `generation` of the list. Passing it back as `since`
+returns only the items added and removed after it. When those changes are too old
+to be listed, `reset` is true, and the client has to fetch the whole list again.
+When the server runs in several processes, generations and cursors are versions
+of the state shared by the processes, so any process can answer the next request.
+
+Instead of polling, clients can listen to /api/events, a stream of server-sent events
+of notifications added and removed and of alarms fired.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from flask import Response, jsonify, request
+
+from server import app
+from server.http_response import (
+    ERRCODE_ALREADY_EXISTS,
+    ERRCODE_INVALID_PARAMETERS,
+    ERRCODE_NOT_FOUND,
+    HTTP_BAD_REQUEST,
+    HTTP_CONFLICT,
+    HTTP_CREATED,
+    HTTP_NOT_FOUND,
+    http_error_response,
+    http_success_response,
+)
+from server.utils.cursor import decode_cursor, encode_cursor
+from .events import subscribe_events, unsubscribe_events
+from .alarm_scheduler import (
+    AlarmExistsError,
+    cancel_alarm,
+    get_alarm_changes,
+    get_alarm_metrics,
+    get_alarms_generation,
+    get_alarms_page,
+    schedule_alarm,
+)
+from .notification import (
+    get_notification_changes,
+    get_notifications_generation,
+    get_notifications_page,
+    remove_notification,
+    watch_notification_changes,
+)
+
+# Number of items in a page when no limit is given
+__DEFAULT_PAGE_SIZE = 50
+
+# Maximum number of items in a page
+__MAX_PAGE_SIZE = 200
+
+# Number of seconds after which an idle event stream gets a comment,
+# so proxies don't close it and closed connections are noticed.
+__KEEP_ALIVE_INTERVAL = 15
+
+# Number of milliseconds clients wait before reconnecting to a closed event stream
+__RECONNECT_DELAY = 5000
+
+
+class __InvalidParameters(Exception):
+    """
+    Raised when the parameters of a request are invalid.
+    """
+
+
+@app.route("/api/alarms", methods=["GET"])
+def list_alarms():
+    """
+    Lists the scheduled alarms, ordered by scheduled time.
+    Accepts the query parameters limit, cursor and since.
+    """
+    generation = get_alarms_generation()
+
+    try:
+        since = __since()
+
+        if since is not None:
+            return jsonify(
+                __changes_response(
+                    generation,
+                    get_alarm_changes(since),
+                    "alarms",
+                    __alarm_json,
+                )
+            )
+
+        limit = __limit()
+        cursor = request.args.get("cursor")
+        after = None
+
+        if cursor:
+            scheduled_time, title = decode_cursor(cursor)
+            after = (datetime.fromisoformat(scheduled_time), title)
+    except (__InvalidParameters, ValueError, TypeError) as invalid_parameters:
+        return __invalid_parameters_response(invalid_parameters)
+
+    alarms = get_alarms_page(after, limit)
+    next_cursor = (
+        encode_cursor([alarms[-1]["scheduled_time"].isoformat(), alarms[-1]["title"]])
+        if len(alarms) == limit
+        else None
+    )
+
+    return jsonify(
+        http_success_response(
+            {
+                "alarms": [__alarm_json(alarm) for alarm in alarms],
+                "next_cursor": next_cursor,
+                "generation": generation,
+            }
+        )
+    )
+
+
+@app.route("/api/alarms", methods=["POST"])
+def create_alarm():
+    """
+    Schedules an alarm. The request body is a json object in the shape of:
+    {
+        "title": "Title of the alarm",
+        "time": "2020-12-01T07:30", // the time when the alarm fires, in ISO 8601 format
+        "include_news": true, // optional, whether to include news briefing
+        "include_weather": true, // optional, whether to include weather briefing
+    }
+    """
+    body = request.get_json(silent=True)
+
+    try:
+        if not isinstance(body, dict):
+            raise __InvalidParameters("The request body must be a json object.")
+
+        title = body.get("title")
+
+        if not isinstance(title, str) or not title:
+            raise __InvalidParameters("title must be a non-empty string.")
+
+        scheduled_time = datetime.fromisoformat(body.get("time", ""))
+    except (__InvalidParameters, ValueError, TypeError) as invalid_parameters:
+        return __invalid_parameters_response(invalid_parameters)
+
+    if scheduled_time.tzinfo is not None:
+        # alarms are scheduled in the local time of the server
+        scheduled_time = scheduled_time.astimezone().replace(tzinfo=None)
+
+    alarm = {
+        "title": title,
+        "scheduled_time": scheduled_time,
+        "include_news": bool(body.get("include_news")),
+        "include_weather": bool(body.get("include_weather")),
+    }
+
+    try:
+        # the title is checked while the alarm is added, so concurrent requests can't both add it
+        schedule_alarm(
+            title=title,
+            at_time=scheduled_time,
+            should_include_news=alarm["include_news"],
+            should_include_weather=alarm["include_weather"],
+            fail_if_exists=True,
+        )
+    except AlarmExistsError as alarm_exists:
+        return (
+            jsonify(http_error_response(ERRCODE_ALREADY_EXISTS, str(alarm_exists))),
+            HTTP_CONFLICT,
+        )
+    except ValueError as invalid_time:
+        return __invalid_parameters_response(invalid_time)
+
+    # the alarm may already have fired or been canceled, so it is not read back
+    return (
+        jsonify(http_success_response({"alarm": __alarm_json(alarm)})),
+        HTTP_CREATED,
+    )
+
+
+@app.route("/api/alarms/<path:title>", methods=["DELETE"])
+def delete_alarm(title: str):
+    """
+    Cancels the alarm with the given title.
+    """
+    try:
+        cancel_alarm(title)
+    except ValueError as not_found:
+        return (
+            jsonify(http_error_response(ERRCODE_NOT_FOUND, str(not_found))),
+            HTTP_NOT_FOUND,
+        )
+
+    return jsonify(http_success_response({"title": title}))
+
+
+@app.route("/api/notifications", methods=["GET"])
+def list_notifications():
+    """
+    Lists the notifications, oldest first. New notifications are not fetched.
+    Accepts the query parameters limit, cursor and since.
+    """
+    generation = get_notifications_generation()
+
+    try:
+        since = __since()
+
+        if since is not None:
+            return jsonify(
+                __changes_response(
+                    generation,
+                    get_notification_changes(since),
+                    "notifications",
+                    __notification_json,
+                )
+            )
+
+        limit = __limit()
+        cursor = request.args.get("cursor")
+        page = get_notifications_page(decode_cursor(cursor) if cursor else None, limit)
+    except (__InvalidParameters, ValueError, TypeError) as invalid_parameters:
+        return __invalid_parameters_response(invalid_parameters)
+
+    next_cursor = encode_cursor(page[-1][0]) if len(page) == limit else None
+
+    return jsonify(
+        http_success_response(
+            {
+                "notifications": [
+                    __notification_json(notification) for _, notification in page
+                ],
+                "next_cursor": next_cursor,
+                "generation": generation,
+            }
+        )
+    )
+
+
+@app.route("/api/notifications/<notification_id>", methods=["DELETE"])
+def delete_notification(notification_id: str):
+    """
+    Removes the notification with the given ID. It won't be shown again.
+    """
+    if not remove_notification(notification_id):
+        return (
+            jsonify(
+                http_error_response(
+                    ERRCODE_NOT_FOUND, f"No notification has the ID {notification_id}."
+                )
+            ),
+            HTTP_NOT_FOUND,
+        )
+
+    return jsonify(http_success_response({"id": notification_id}))
+
+
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Returns metrics of fired alarms, in the shape returned by get_alarm_metrics.
+    They are counted by every server process for the alarms it fires.
+    """
+    return jsonify(http_success_response({"alarms": get_alarm_metrics()}))
+
+
+@app.route("/api/events", methods=["GET"])
+def stream_events():
+    """
+    Streams server-sent events of:
+    - notification_added: a notification is added or updated. The data is the notification.
+    - notification_removed: a notification is removed. The data is {"id": "..."}.
+    - alarm_fired: an alarm fired. The data is {"title": "...", "scheduled_time": "..."}.
+    - reset: events are missed, because the client fell behind or the changes are
+      too old to be listed. The client has to fetch the alarms and notifications again.
+      The stream ends after a reset event if the client fell behind.
+
+    Notifications are refreshed in the background once for every stream.
+    """
+    subscription = subscribe_events()
+    watch_notification_changes()
+
+    def stream():
+        try:
+            yield f"retry: {__RECONNECT_DELAY}\n\n"
+
+            while not subscription.closed:
+                event = subscription.next_event(timeout=__KEEP_ALIVE_INTERVAL)
+                yield event if event is not None else ": keep-alive\n\n"
+        finally:
+            unsubscribe_events(subscription)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def __limit() -> int:
+    """
+    Returns the page size given in the query parameters.
+
+    :raises __InvalidParameters: The limit is not between 1 and __MAX_PAGE_SIZE.
+    """
+    limit = int(request.args.get("limit", __DEFAULT_PAGE_SIZE))
+
+    if not 1 <= limit <= __MAX_PAGE_SIZE:
+        raise __InvalidParameters(f"limit must be between 1 and {__MAX_PAGE_SIZE}.")
+
+    return limit
+
+
+def __since() -> int:
+    """
+    Returns the generation given in the since query parameter, or None if it is not given.
+
+    :raises __InvalidParameters: The generation is negative.
+    """
+    since = request.args.get("since")
+
+    if since is None:
+        return None
+
+    if int(since) < 0:
+        raise __InvalidParameters("since must not be negative.")
+
+    return int(since)
+
+
+def __changes_response(
+    generation: int, changes: Any, name: str, to_json
+) -> Dict[str, Any]:
+    """
+    Creates the response of a request for the changes of a list.
+
+    :params generation: The generation of the list, read before the changes.
+    :params changes: A tuple of (items added, keys of items removed), or None if
+    the changes are too old to be listed.
+    :params name: The name of the list.
+    :params to_json: The function converting an item to json.
+    """
+    if changes is None:
+        return http_success_response(
+            {name: [], "removed": [], "reset": True, "generation": generation}
+        )
+
+    added, removed = changes
+
+    return http_success_response(
+        {
+            name: [to_json(item) for item in added],
+            "removed": removed,
+            "reset": False,
+            "generation": generation,
+        }
+    )
+
+
+def __invalid_parameters_response(exception: Exception) -> Tuple[Any, int]:
+    return (
+        jsonify(http_error_response(ERRCODE_INVALID_PARAMETERS, str(exception))),
+        HTTP_BAD_REQUEST,
+    )
+
+
+def __alarm_json(alarm: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": alarm["title"],
+        "scheduled_time": alarm["scheduled_time"].isoformat(),
+        "include_news": bool(alarm["include_news"]),
+        "include_weather": bool(alarm["include_weather"]),
+    }
+
+
+def __notification_json(notification: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": notification["id"],
+        "title": notification["title"],
+        # the content of a notification is html
+        "content": str(notification["content"]),
+    }
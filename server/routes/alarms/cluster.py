@@ -0,0 +1,175 @@
+"""
+This module coordinates server processes running side by side, like gunicorn workers.
+
+By default the server runs in a single process, which is always the scheduler.
+With multi_process set to true in config.json, processes share state through
+a SQLite database at shared_state_path (defaults to "shared_state.db"), and elect
+one of them as the scheduler with a lease. The scheduler fires alarms and refreshes
+notifications, and every process mirrors alarms and notifications from the shared state.
+If the scheduler dies, another process takes over once its lease expires.
+"""
+
+import logging
+import os
+import socket
+import time
+import uuid
+from threading import Lock, Thread
+from typing import Callable, List, Optional
+
+from server.utils.logger import log_exception
+from server.utils.shared_state import SharedState
+
+# Whether the server runs in several processes sharing state
+__MULTI_PROCESS = os.environ.get("MULTI_PROCESS", "false").lower() == "true"
+
+# Number of seconds the scheduler holds its lease for without renewing it,
+# which can be configured with scheduler_lease_ttl in config.json
+__LEASE_TTL = float(os.environ.get("SCHEDULER_LEASE_TTL", 10))
+
+# Number of seconds between renewals of the lease and syncs with the shared state
+__SYNC_INTERVAL = 1
+
+__LEASE_NAME = "scheduler"
+
+# Identifies this process in the lease
+__PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# the state shared by server processes, opened by start_cluster
+__shared_state: Optional[SharedState] = None
+
+# a single process is always the scheduler
+__is_scheduler = not __MULTI_PROCESS
+
+# functions run every __SYNC_INTERVAL seconds to mirror the shared state
+__sync_tasks: List[Callable[[], None]] = []
+
+# functions called with whether this process is the scheduler, whenever that changes
+__scheduler_listeners: List[Callable[[bool], None]] = []
+
+# the thread renewing the lease and syncing, started by start_cluster
+__heartbeat_thread = None
+__heartbeat_lock = Lock()
+
+
+def is_multi_process() -> bool:
+    """
+    Returns whether the server runs in several processes sharing state.
+    """
+    return __MULTI_PROCESS
+
+
+def is_scheduler() -> bool:
+    """
+    Returns whether this process fires alarms and refreshes notifications.
+    """
+    return __is_scheduler
+
+
+def process_id() -> str:
+    """
+    Returns a string identifying this server process.
+    """
+    return __PROCESS_ID
+
+
+def shared_state() -> Optional[SharedState]:
+    """
+    Returns the state shared by server processes, or None if the server runs in a single process
+    or start_cluster is not called yet.
+    """
+    return __shared_state
+
+
+def on_sync(task: Callable[[], None]):
+    """
+    Registers a function run every __SYNC_INTERVAL seconds to mirror the shared state.
+    It is never run when the server runs in a single process.
+    """
+    __sync_tasks.append(task)
+
+
+def on_scheduler_change(listener: Callable[[bool], None]):
+    """
+    Registers a function called with whether this process is the scheduler,
+    whenever this process becomes or stops being the scheduler.
+    """
+    __scheduler_listeners.append(listener)
+
+
+def start_cluster():
+    """
+    Opens the shared state, takes part in the election of the scheduler,
+    and starts syncing with the shared state.
+    Does nothing if the server runs in a single process or it is already started.
+    """
+    global __heartbeat_thread, __shared_state
+
+    if not __MULTI_PROCESS:
+        return
+
+    with __heartbeat_lock:
+        if __heartbeat_thread is not None:
+            return
+
+        __shared_state = SharedState(
+            os.environ.get("SHARED_STATE_PATH", "shared_state.db")
+        )
+        # a process started alone becomes the scheduler before it handles requests,
+        # and every process mirrors the shared state before it handles requests
+        __renew_lease()
+        __run_sync_tasks()
+
+        __heartbeat_thread = Thread(
+            target=__heartbeat_forever, name="cluster-heartbeat", daemon=True
+        )
+        __heartbeat_thread.start()
+
+
+def __heartbeat_forever():
+    """
+    Renews the lease and runs the sync tasks every __SYNC_INTERVAL seconds.
+    """
+    while True:
+        time.sleep(__SYNC_INTERVAL)
+
+        try:
+            __renew_lease()
+        except Exception as lease_exception:  # pylint: disable=broad-except
+            log_exception("cluster > __renew_lease", lease_exception)
+
+        __run_sync_tasks()
+
+
+def __run_sync_tasks():
+    """
+    Runs the sync tasks. A failing task doesn't stop the others.
+    """
+    for task in __sync_tasks:
+        try:
+            task()
+        except Exception as sync_exception:  # pylint: disable=broad-except
+            log_exception("cluster > __run_sync_tasks", sync_exception)
+
+
+def __renew_lease():
+    """
+    Acquires or renews the scheduler lease, and lets the listeners know
+    when this process becomes or stops being the scheduler.
+    """
+    global __is_scheduler
+
+    holds_lease = __shared_state.acquire_lease(__LEASE_NAME, __PROCESS_ID, __LEASE_TTL)
+
+    if holds_lease == __is_scheduler:
+        return
+
+    __is_scheduler = holds_lease
+    logging.info(
+        "Process %s %s the scheduler.",
+        __PROCESS_ID,
+        "became" if holds_lease else "is no longer",
+    )
+
+    for listener in __scheduler_listeners:
+        listener(holds_lease)
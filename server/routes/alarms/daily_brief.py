@@ -4,37 +4,206 @@ This module handles daily brief processing.
 
 import logging
 import datetime
-from typing import Dict, Any
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import Lock
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-import pyttsx3
-
-from server.api.weather import fetch_weather
+from server.api.weather import fetch_weather, weather_location
 from server.api.news import fetch_news_headlines
-from server.api.covid import fetch_covid_data
+from server.api.covid import covid_area, fetch_covid_data, fetch_covid_trends
+from server.utils.cache import TTLCache
+from server.utils.logger import log_exception
+from .speech import Speaker, Utterance, create_speech_backend
+
+# The data sources a daily brief is made of
+__BRIEF_SOURCES = ("covid", "weather", "news")
 
-__speech_engine = pyttsx3.init()
+# Number of seconds to wait for each section of a daily brief, counted from when the alarm fired.
+# A section that misses its deadline or fails is replaced by a fallback line,
+# so a slow api never holds the speaker for the rest of the brief.
+__SECTION_DEADLINES = {
+    "covid": 10,
+    "weather": 10,
+    "news": 10,
+}
 
 
-def daily_brief(alarm_info: Dict[str, Any]):
+def brief_prefetch_lead() -> float:
+    """
+    Returns the number of seconds before an alarm fires when the data of its brief is fetched.
+    Can be configured with brief_prefetch_lead in config.json.
+    """
+    return float(os.environ.get("BRIEF_PREFETCH_LEAD", 60))
+
+
+def brief_data_ttl() -> float:
+    """
+    Returns the number of seconds prefetched brief data is used for.
+    This covers the lead time and leaves the same time again for alarms firing shortly after.
+    """
+    return 2 * brief_prefetch_lead()
+
+
+def brief_stale_after() -> float:
+    """
+    Returns the number of seconds after which a brief that is not spoken yet is dropped,
+    and a brief being spoken can be interrupted by the brief of a newly fired alarm.
+    Can be configured with brief_stale_after in config.json.
+    """
+    return float(os.environ.get("BRIEF_STALE_AFTER", 120))
+
+
+# Holds data fetched ahead of alarms by prefetch_brief_data.
+__brief_data_cache = TTLCache(ttl=brief_data_ttl())
+
+# Speaks briefs one at a time on its own thread, so alarms never wait for audio.
+# Created by __get_speaker when the first brief is spoken, because creating the speech backend
+# creates the folders of the speech cache and of WAV files.
+__speaker: Optional[Speaker] = None
+__speaker_lock = Lock()
+
+# Generates the sections of daily briefs, so the data of every section is fetched at the same time
+__section_executor = ThreadPoolExecutor(
+    max_workers=len(__BRIEF_SOURCES), thread_name_prefix="brief-section"
+)
+
+
+def daily_brief(alarm_info: Dict[str, Any]) -> Utterance:
     """
     Gives the user a brief of the current weather, the top news, and the local covid infection rate.
+    The brief is queued to be spoken, and this returns without waiting for it.
+    The greeting is spoken right away, and every other section as soon as its data arrives.
+
+    :returns: The queued brief.
     """
 
     logging.info("Daily brief initiated on %s.", datetime.datetime.now())
 
-    alarm_title = alarm_info["title"]
+    section_briefs = [("covid", __covid_brief)]
+
+    if alarm_info["include_weather"]:
+        section_briefs.append(("weather", __weather_brief))
+    if alarm_info["include_news"]:
+        section_briefs.append(("news", __news_brief))
+
+    # sections are generated concurrently, while the greeting is spoken
+    started_at = time.monotonic()
+    sections = [
+        (source, __section_executor.submit(brief)) for source, brief in section_briefs
+    ]
+
+    return __get_speaker().say(
+        __stream_brief(alarm_info["title"], sections, started_at),
+        stale_after=brief_stale_after(),
+    )
+
+
+def __get_speaker() -> Speaker:
+    """
+    Returns the speaker of daily briefs, creating it on first use.
+    """
+    global __speaker
+
+    with __speaker_lock:
+        if __speaker is None:
+            __speaker = Speaker(create_speech_backend())
+
+        return __speaker
+
+
+def __stream_brief(
+    alarm_title: str, sections: List[Tuple[str, Future]], started_at: float
+) -> Iterator[str]:
+    """
+    Generates the sections of a daily brief in order, each as soon as it is ready.
+    Each section is given until its deadline in __SECTION_DEADLINES.
+    A section that fails or misses its deadline is replaced by a fallback line,
+    so the rest of the brief is still spoken.
+
+    :params alarm_title: The title of the alarm the brief is for.
+    :params sections: The (source, section being generated) of the sections
+    between the greeting and the sign-off.
+    :params started_at: When the sections started being generated, from time.monotonic.
+    """
+    yield f"Hello! This is a scheduled daily brief titled: {alarm_title}."
+
+    for source, section in sections:
+        time_left = __SECTION_DEADLINES[source] - (time.monotonic() - started_at)
+
+        try:
+            brief_section = section.result(timeout=max(time_left, 0))
+        except FutureTimeoutError:
+            logging.warning(
+                "The %s brief took longer than %s seconds. It is skipped.",
+                source,
+                __SECTION_DEADLINES[source],
+            )
+            brief_section = __section_fallback(source)
+        except Exception as section_exception:  # pylint: disable=broad-except
+            log_exception(
+                method="daily_brief > __stream_brief", exception=section_exception
+            )
+            brief_section = __section_fallback(source)
+
+        logging.info("brief section: %s", brief_section)
+        yield brief_section
+
+    yield "This is the end of your briefing. Have a nice day."
 
-    brief_message = f"""
-    Hello! This is a scheduled daily brief titled: {alarm_title}.
-    {__covid_brief()}
-    {__weather_brief() if alarm_info["include_weather"] else ""}
-    {__news_brief() if alarm_info["include_news"] else ""}
-    This is the end of your briefing. Have a nice day.
+
+def __section_fallback(source: str) -> str:
+    """
+    Returns the line spoken instead of a section of a daily brief that is not ready.
+
+    :params source: One of __BRIEF_SOURCES.
     """
+    return f"Unfortunately the {source} update is not available right now."
 
-    logging.info("brief message: %s", brief_message)
-    __speech_engine.say(brief_message)
-    __speech_engine.runAndWait()
+
+def prefetch_brief_data():
+    """
+    Fetches the data daily briefs are made of, so that briefs of alarms firing soon
+    can start speaking without waiting for the external apis.
+    """
+    for source in __BRIEF_SOURCES:
+        try:
+            data = __fetch_brief_data(source)
+        except Exception as fetch_exception:  # pylint: disable=broad-except
+            log_exception(method="prefetch_brief_data", exception=fetch_exception)
+            continue
+
+        # empty data means the api call failed, which should be retried when the alarm fires
+        if data:
+            __brief_data_cache.put(source, data)
+
+    logging.info("Daily brief data prefetched on %s.", datetime.datetime.now())
+
+
+def __brief_data(source: str) -> Any:
+    """
+    Returns the data of the given source for a daily brief,
+    using prefetched data if it is still fresh.
+
+    :params source: One of __BRIEF_SOURCES.
+    """
+    return __brief_data_cache.get(source, lambda: __fetch_brief_data(source))
+
+
+def __fetch_brief_data(source: str) -> Any:
+    """
+    Fetches the data of the given source for a daily brief from the external api.
+
+    :params source: One of __BRIEF_SOURCES.
+    """
+    if source == "covid":
+        return fetch_covid_data()
+    if source == "weather":
+        return fetch_weather(*weather_location())
+
+    return fetch_news_headlines(country="gb")
 
 
 def __covid_brief() -> str:
@@ -50,26 +219,53 @@ def __covid_brief() -> str:
             cumulative_cases,
             new_deaths,
             cumulative_deaths,
-        ) = fetch_covid_data()
+        ) = __brief_data("covid")
 
         return f"""
         First, some Covid-19 update.
         {'Today, ' if is_latest_covid_data_available else 'Latest data is not available, so previous data will be recapped.'}
-        In England, there are {new_cases} number of new cases,
+        In {covid_area()[1]}, there are {new_cases} number of new cases,
         and unfortunately {new_deaths} people lost their battle against Covid19.
         In total, there are {cumulative_cases} number of cases,
         and {cumulative_deaths} lives are lost in this pandemic.
+        {__covid_trend_brief()}
         """
     except:
         return "Unfortunately an error occurred when getting latest covid data."
 
 
+def __covid_trend_brief() -> str:
+    """
+    Generates a brief message about how the number of new cases changed in the past week,
+    or an empty string if there is not enough data.
+    """
+    try:
+        trends = fetch_covid_trends()
+    except Exception as trends_exception:  # pylint: disable=broad-except
+        log_exception(
+            method="daily_brief > __covid_trend_brief", exception=trends_exception
+        )
+        return ""
+
+    if not trends or trends["new_cases_average"] is None:
+        return ""
+
+    average = trends["new_cases_average"]
+    growth = trends["new_cases_growth"]
+    message = f"Over the past week, there were {average:.0f} new cases a day on average"
+
+    if growth is not None:
+        message += f", {'up' if growth >= 0 else 'down'} {abs(growth):.0%} from the week before"
+
+    return f"{message}."
+
+
 def __weather_brief() -> str:
     """
     Generates a brief message about the current weather.
     """
 
-    weather = fetch_weather(lat=50.718410, long=-3.533899)
+    weather = __brief_data("weather")
 
     return f"""
     Currently in your location, expect {weather['weather'][0]['description']}.
@@ -82,7 +278,7 @@ def __news_brief() -> str:
     Generates a brief message of latest news headlines.
     """
 
-    news = fetch_news_headlines(country="gb")
+    news = __brief_data("news")
 
     if len(news) == 0:
         return "There are no top news for you right now."
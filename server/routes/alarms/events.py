@@ -0,0 +1,102 @@
+"""
+This module publishes events of alarms and notifications to the open event streams.
+
+Events are encoded as server-sent events once, when they are published,
+so the cost of an event doesn't grow with the number of connected clients.
+When the server runs in several processes, events broadcast by one process
+are relayed to the streams of the others through the shared state.
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional
+
+from server.utils.event_hub import EventHub, Subscription
+from .cluster import is_multi_process, on_sync, process_id, shared_state
+
+# The event handed to a client that falls behind. Events it missed are dropped,
+# so it has to fetch the alarms and notifications again.
+RESET_EVENT = "event: reset\ndata: {}\n\n"
+
+# Every open event stream. A client can fall behind by
+# event_stream_max_pending (config.json, defaults to 100) events before it is dropped.
+__event_hub = EventHub(
+    max_pending=int(os.environ.get("EVENT_STREAM_MAX_PENDING", 100)),
+    reset_event=RESET_EVENT,
+)
+
+__EVENTS_CHANNEL = "events"
+
+# the ID of the last event relayed from other processes. Read from the shared state
+# by the first sync, so events broadcast before this process started are skipped
+__last_relayed_id: Optional[int] = None
+
+
+def subscribe_events() -> Subscription:
+    """
+    Opens an event stream. Each event is a string in the server-sent events format.
+    """
+    return __event_hub.subscribe()
+
+
+def unsubscribe_events(subscription: Subscription):
+    """
+    Closes an event stream opened by subscribe_events.
+    """
+    __event_hub.unsubscribe(subscription)
+
+
+def event_stream_count() -> int:
+    """
+    Returns the number of open event streams.
+    """
+    return len(__event_hub)
+
+
+def publish_event(name: str, data: Dict[str, Any]) -> int:
+    """
+    Publishes an event to every open event stream.
+
+    :params name: The name of the event, like "notification_added".
+    :params data: The json serializable data of the event.
+    :returns: The number of event streams the event is published to.
+    """
+    # nobody is listening, so the event is not even encoded
+    if not __event_hub:
+        return 0
+
+    return __event_hub.publish(f"event: {name}\ndata: {json.dumps(data)}\n\n")
+
+
+def broadcast_event(name: str, data: Dict[str, Any]):
+    """
+    Publishes an event to the open event streams of every server process.
+    See publish_event.
+    """
+    publish_event(name, data)
+
+    if is_multi_process():
+        shared_state().send(
+            __EVENTS_CHANNEL, {"sender": process_id(), "name": name, "data": data}
+        )
+
+
+def __relay_events():
+    """
+    Publishes the events broadcast by other processes to the event streams of this process.
+    """
+    global __last_relayed_id
+
+    if __last_relayed_id is None:
+        __last_relayed_id = shared_state().last_message_id(__EVENTS_CHANNEL)
+
+    for message_id, event in shared_state().receive(
+        __EVENTS_CHANNEL, __last_relayed_id
+    ):
+        __last_relayed_id = message_id
+
+        if event["sender"] != process_id():
+            publish_event(event["name"], event["data"])
+
+
+on_sync(__relay_events)
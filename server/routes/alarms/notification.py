@@ -1,80 +1,623 @@
 """
 This module handles notifications
+
+Notifications are refreshed in the background, each upstream source on its own cadence.
+After every change, an immutable snapshot of the notifications is published,
+so getting the notifications is a read of memory that never waits for upstream apis.
+
+When the server runs in several processes, only the scheduler process (see cluster.py)
+refreshes notifications. It shares its snapshots through the shared state,
+and the other processes mirror them, and send it the notifications removed by their users.
+Shared snapshots are numbered by versions, which clients of any process can page through
+and ask for the changes since.
 """
 
 import datetime
-from typing import List, Dict, Set, Any, Tuple
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+from types import MappingProxyType
+from typing import List, Dict, Any, Iterable, Mapping, Optional, Tuple
 
 from flask import Markup
 
 from server.api.news import fetch_news_headlines, calculate_news_id
-from server.api.weather import fetch_weather
-from server.api.covid import fetch_covid_data
+from server.api.weather import fetch_weather, weather_location
+from server.api.covid import fetch_covid_data, fetch_covid_trends
+from server.utils.change_log import VersionMarks
+from server.utils.fingerprint import DedupIndex, simhash
+from server.utils.logger import log_exception
+from server.utils.refresher import Refresher
+from .cluster import (
+    is_multi_process,
+    is_scheduler,
+    on_scheduler_change,
+    on_sync,
+    shared_state,
+)
+from .events import event_stream_count, publish_event
+from .notification_store import NotificationStore, RemovedNotifications
 
 # stores a list of notifications of news headlines in the shape of
 # {
 #     "title": "title of the notification",
 #     "content": "Content of the notification",
 # }
-__notifications: Dict[str, Dict[str, Any]] = {}
-
-# the set of removed notifications. they will never show up again.
-__removed_notifications: Set[str] = set()
+# at most notification_max_count (config.json, defaults to 100) notifications are kept,
+# each for at most notification_max_age seconds (config.json, defaults to a day).
+__notifications = NotificationStore(
+    max_size=int(os.environ.get("NOTIFICATION_MAX_COUNT", 100)),
+    max_age=float(os.environ.get("NOTIFICATION_MAX_AGE", 24 * 60 * 60)),
+)
+
+# the set of removed notifications. they will not show up again for as long as they are
+# remembered: the removed_notification_max_count (config.json, defaults to 10000)
+# most recently seen ones are.
+__removed_notifications = RemovedNotifications(
+    max_size=int(os.environ.get("REMOVED_NOTIFICATION_MAX_COUNT", 10000)),
+)
+
+# sketches of news headlines that are shown or removed,
+# so reworded copies of them from other sources are not shown again.
+__headline_index = DedupIndex()
 
 __WEATHER_NOTIFICATION_ID = "weather"
 
+# Number of seconds to wait for each upstream source, counted from the start of a refresh.
+# Sources that miss their deadline are left out of that refresh.
+__FETCH_DEADLINES = {
+    "covid": 5,
+    "weather": 5,
+    "news": 5,
+}
+
+# runs upstream fetches of a refresh concurrently
+__fetch_executor = ThreadPoolExecutor(thread_name_prefix="notification-fetch")
+
+# Number of seconds between background refreshes of each source, which can be configured
+# with covid_refresh_interval, weather_refresh_interval and news_refresh_interval in config.json.
+# Covid data is updated once a day, and OpenWeather updates the weather every 10 minutes.
+__REFRESH_INTERVALS = {
+    "covid": float(os.environ.get("COVID_REFRESH_INTERVAL", 30 * 60)),
+    "weather": float(os.environ.get("WEATHER_REFRESH_INTERVAL", 10 * 60)),
+    "news": float(os.environ.get("NEWS_REFRESH_INTERVAL", 15 * 60)),
+}
+
+# Number of seconds between snapshots taken only to drop expired notifications
+__EXPIRY_INTERVAL = 60
+
+# refreshes the sources in the background, started by start_notification_refresh
+__refresher = Refresher(max_workers=len(__REFRESH_INTERVALS))
+
+# the latest (generation, notifications) snapshot of __notifications, replaced as a whole
+__snapshot: Tuple[int, Tuple[Mapping[str, Any], ...]] = (0, ())
+
+# the generation of the notifications up to which changes are published to event streams,
+# or None if no event stream is open
+__published_generation = None
+__publish_lock = Lock()
+
+# the keys of the snapshot of the scheduler process in the shared state, and of its version
+__SHARED_SNAPSHOT_KEY = "notifications"
+__SHARED_VERSION_KEY = "notifications_version"
+
+# the channel notifications removed in other processes are sent to the scheduler in
+__REMOVED_CHANNEL = "removed_notifications"
+
+# the generation of the latest snapshot shared with other processes
+__shared_generation = None
+
+# the data version of the shared state notifications were last synced at
+__synced_version = None
+
+# the version of the shared snapshot shown by this process, shared or mirrored
+__mirrored_version = None
+
+# the generations of __notifications at which versions of the shared snapshot were shown,
+# so clients can ask any server process for the changes since a version
+__version_marks = VersionMarks()
+
+# Number of the latest shared snapshots kept for clients paging through them
+__KEPT_SNAPSHOT_COUNT = 10
+
+# a map of versions of the shared snapshot to its notifications, oldest version first
+__shared_snapshots: "OrderedDict[int, Tuple[Mapping[str, Any], ...]]" = OrderedDict()
+
+# the ID of the message sending the latest notification removed by this process
+# to the scheduler, until a snapshot without it is mirrored
+__pending_removal_id = None
+
+# the ID of the last removed notification received from other processes. Read from
+# the shared state by the first sync, so removals sent before this process started are skipped
+__last_removal_id: Optional[int] = None
+
+
+def get_notifications() -> Tuple[Mapping[str, Any], ...]:
+    """
+    Get the list of notifications, as of the latest snapshot. Nothing is fetched.
+
+    :returns: Read-only views of the notifications, oldest first
+    """
+    return __snapshot[1]
+
+
+def get_notifications_generation() -> int:
+    """
+    Returns a number that changes whenever the list of notifications changes,
+    as of the same snapshot as get_notifications.
+    When the server runs in several processes, it is the version of the shared snapshot
+    shown by this process, which is the same in every process.
+    """
+    if is_multi_process():
+        return __mirrored_version or 0
+
+    return __snapshot[0]
+
+
+def get_notifications_version() -> str:
+    """
+    Returns a string that changes whenever the list of notifications changes.
+    Unlike get_notifications_generation, it is the same in every server process
+    showing the same notifications.
+    """
+    if not is_multi_process():
+        return str(get_notifications_generation())
+
+    if __pending_removal_id is not None:
+        # this process doesn't show a notification the shared snapshot still has
+        return f"{__mirrored_version}.{__pending_removal_id}"
+
+    return str(__mirrored_version)
+
 
-def get_notifications(refresh: bool = True) -> List[Dict[str, str]]:
+def refresh_notifications(
+    sources: Iterable[str] = tuple(__FETCH_DEADLINES),
+) -> Tuple[Mapping[str, Any], ...]:
     """
-    Get a list of notifications.
+    Fetches the given sources right away, and stores the new notifications.
+    Sources are fetched concurrently, and each is given until its deadline
+    in __FETCH_DEADLINES.
 
-    :params refresh: Whether to get new news. If false, the existing notifications will be returned
-    :returns: The list of notifications
+    :params sources: The names of the sources to fetch: covid, weather and news.
+    :returns: The list of notifications after the refresh
     """
+    __store_fetched(__fetch_sources(sources))
 
-    if refresh:
-        covid_notification_id, covid_notification = __create_covid_notification()
-        weather_notification_id, weather_notification = __create_weather_notification()
+    return get_notifications()
 
-        __notifications[covid_notification_id] = covid_notification
-        __notifications[weather_notification_id] = weather_notification
 
-        news_headlines = fetch_news_headlines(country="gb")
+def start_notification_refresh():
+    """
+    Starts refreshing the sources in the background, each on its own cadence
+    in __REFRESH_INTERVALS. Does nothing if it is already started.
+    """
+    if __refresher.started:
+        return
+
+    with __publish_lock:
+        if __refresher.started:
+            return
+
+        for source, interval in __REFRESH_INTERVALS.items():
+            __refresher.add(
+                source, lambda source=source: __refresh_source(source), interval
+            )
+
+        __refresher.add("expiry", __publish, __EXPIRY_INTERVAL, jitter=0)
+        __refresher.start()
+
+
+def watch_notification_changes():
+    """
+    Publishes changes of the notifications to event streams from now on,
+    until every stream is closed. Called after an event stream is opened.
+    """
+    global __published_generation
+
+    with __publish_lock:
+        if __published_generation is None:
+            __published_generation = __notifications.generation
+
+
+def get_notifications_page(
+    after: Any = None, limit: int = 50
+) -> List[Tuple[Any, Mapping[str, Any]]]:
+    """
+    Gets a page of the list of notifications without fetching new ones, oldest first.
+    When the server runs in several processes, pages are taken from a shared snapshot,
+    so the next pages are the same in every process. They don't leave out notifications
+    removed by users of this process that the shared snapshot still has.
+
+    :params after: The position of the last notification of the previous page,
+    or None for the first page.
+    :params limit: The maximum number of notifications returned.
+    :returns: A list of (position of the notification, notification).
+    A position is the generation the notification was stored at, or when the server runs
+    in several processes, a [version of the shared snapshot, index in the snapshot] pair.
+    :raises ValueError: The snapshot of the position is not kept anymore.
+    :raises TypeError: The position is not a position returned by this function.
+    """
+    if not is_multi_process():
+        return __notifications.page(int(after or 0), limit)
+
+    version, index = after if after is not None else (__mirrored_version, 0)
+
+    with __publish_lock:
+        notifications = __shared_snapshots.get(version)
+
+    if notifications is None:
+        if after is None:
+            # no snapshot is shared yet
+            return []
 
-        for news_headline in news_headlines:
-            news_title = news_headline["title"]
-            news_description = news_headline["description"]
+        raise ValueError(f"The notifications of version {version} are not kept.")
 
-            news_id = calculate_news_id(title=news_title, description=news_description)
+    return [
+        ([version, position], notification)
+        for position, notification in enumerate(
+            notifications[index : index + limit], index + 1
+        )
+    ]
 
-            if (
-                not news_id
-                or news_id in __notifications
-                or news_id in __removed_notifications
-            ):
-                continue
 
-            __notifications[news_id] = __create_notification(
-                title=news_title, content=news_description
+def get_notification_changes(
+    since: int,
+) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+    """
+    Gets the notifications stored and the IDs of the notifications removed
+    after the given generation (see get_notifications_generation).
+
+    :returns: A tuple of (notifications stored, IDs of notifications removed),
+    or None if the changes are too old to be listed, or when the server runs
+    in several processes, if this process didn't show the given version.
+    """
+    if not is_multi_process():
+        return __notifications.changes_since(since)
+
+    with __publish_lock:
+        generation = __version_marks.generation(since)
+
+    return None if generation is None else __notifications.changes_since(generation)
+
+
+def get_notification_memory_usage() -> Dict[str, Dict[str, int]]:
+    """
+    Gets a gauge of the memory used by notifications in the shape of:
+    {
+        "notifications": {"count": ..., "evicted": ..., "bytes": ...},
+        "removed_notifications": {"count": ..., "bytes": ...},
+    }
+    """
+    return {
+        "notifications": __notifications.memory_usage(),
+        "removed_notifications": __removed_notifications.memory_usage(),
+    }
+
+
+def __fetch_sources(sources: Iterable[str]) -> Dict[str, Any]:
+    """
+    Fetches the given sources concurrently.
+    Each source is given until its deadline in __FETCH_DEADLINES,
+    so a refresh takes as long as the slowest source instead of the sum of all sources.
+
+    :returns: A dictionary mapping the name of each source that is fetched in time
+    to its result. Sources that fail or time out are left out.
+    """
+    started_at = time.monotonic()
+    futures = {
+        source: __fetch_executor.submit(__fetch_source, source) for source in sources
+    }
+    fetched = {}
+
+    for source, future in futures.items():
+        time_left = __FETCH_DEADLINES[source] - (time.monotonic() - started_at)
+
+        try:
+            fetched[source] = future.result(timeout=max(time_left, 0))
+        except FutureTimeoutError:
+            logging.warning(
+                "Fetching %s took longer than %s seconds. It is skipped in this refresh.",
+                source,
+                __FETCH_DEADLINES[source],
             )
+        except Exception as fetch_exception:  # pylint: disable=broad-except
+            log_exception(
+                method=f"notification > __fetch_sources ({source})",
+                exception=fetch_exception,
+            )
+
+    return fetched
+
+
+def __fetch_source(source: str) -> Any:
+    """
+    Fetches a source: a notification for covid and weather, and headlines for news.
+    """
+    if source == "covid":
+        return __create_covid_notification()
+
+    if source == "weather":
+        return __create_weather_notification()
+
+    return fetch_news_headlines(country="gb")
+
+
+def __refresh_source(source: str):
+    """
+    Fetches a source and stores its notifications. Runs on the background refresher,
+    which is not in a hurry, so the source is not given a deadline.
+    Only the scheduler process fetches sources.
+    """
+    if not is_scheduler():
+        return
+
+    __store_fetched({source: __fetch_source(source)})
+
+
+def __store_fetched(fetched: Dict[str, Any]):
+    """
+    Stores the notifications of fetched sources, then publishes the changes.
+
+    :params fetched: A dictionary mapping the name of each fetched source to its result.
+    """
+    if "covid" in fetched:
+        __store_notification(*fetched["covid"])
+
+    if "weather" in fetched:
+        __store_notification(*fetched["weather"])
+
+    for news_headline in fetched.get("news", []):
+        news_title = news_headline["title"]
+        news_description = news_headline["description"]
+
+        news_id = calculate_news_id(title=news_title, description=news_description)
+
+        if (
+            not news_id
+            or news_id in __notifications
+            or news_id in __removed_notifications
+        ):
+            continue
+
+        headline_sketch = simhash(f"{news_title} {news_description}")
+
+        if __headline_index.find_near_duplicate(headline_sketch) is not None:
+            continue
+
+        __headline_index.add(news_id, headline_sketch)
+
+        __store_notification(
+            news_id,
+            __create_notification(title=news_title, content=news_description),
+        )
+
+    __publish()
+
+
+def remove_notification(notification_id: str = "") -> bool:
+    """
+    Remove a notification from the list given the ID of the notification.
+    A title is accepted too, for links made before notifications had IDs,
+    in which case the oldest notification with that title is removed.
+
+    :params notification_id: The ID (or the title) of the notification to be deleted.
+    :returns: Whether a notification is removed.
+    """
+    global __pending_removal_id
+
+    if notification_id not in __notifications:
+        matching_ids = __notifications.ids_with_title(notification_id)
+
+        if not matching_ids:
+            return False
+
+        notification_id = matching_ids[0]
+
+    # changed with the lock held, so a mirrored snapshot is shown as it is shared
+    with __publish_lock:
+        __notifications.pop(notification_id, None)
+        __removed_notifications.add(notification_id)
+
+    __publish()
+
+    if not is_scheduler():
+        __pending_removal_id = shared_state().send(__REMOVED_CHANNEL, notification_id)
+
+    return True
+
 
-    return __notifications.values()
+def __publish():
+    """
+    Takes a new snapshot of the notifications, and publishes the notifications
+    stored and removed since the last call to event streams, as notification_added
+    and notification_removed events. Notifications that expired in the meantime
+    are published as removed too.
+    """
+    global __published_generation, __snapshot
+
+    with __publish_lock:
+        __snapshot = __notifications.snapshot()
+
+        if is_multi_process() and is_scheduler():
+            __share_snapshot()
+
+        if __published_generation is None:
+            return
+
+        if not event_stream_count():
+            # every stream is closed. changes are published again once a stream is opened.
+            __published_generation = None
+            return
+
+        generation = __snapshot[0]
+        changes = __notifications.changes_since(__published_generation)
+        __published_generation = generation
+
+        if changes is None:
+            publish_event("reset", {})
+            return
+
+        stored, removed_ids = changes
 
+        for notification in stored:
+            publish_event("notification_added", notification)
 
-def remove_notification(title: str = ""):
+        for notification_id in removed_ids:
+            publish_event("notification_removed", {"id": notification_id})
+
+
+def __share_snapshot():
+    """
+    Shares the latest snapshot with other processes, if it changed since it was last shared.
+    Must be called with __publish_lock held.
     """
-    Remove a notification from the list given the title of the notification.
+    global __shared_generation
+
+    generation, notifications = __snapshot
+
+    if generation == __shared_generation:
+        return
+
+    version = shared_state().increment(__SHARED_VERSION_KEY)
+    shared_state().put(
+        __SHARED_SNAPSHOT_KEY,
+        {
+            "version": version,
+            "notifications": [
+                {
+                    "id": notification["id"],
+                    "title": notification["title"],
+                    "content": str(notification["content"]),
+                    # html content is marked, so other processes don't escape it
+                    "markup": isinstance(notification["content"], Markup),
+                }
+                for notification in notifications
+            ],
+        },
+    )
+    __shared_generation = generation
+    __show_version(version, generation, notifications)
+
+
+def __show_version(
+    version: int, generation: int, notifications: Tuple[Mapping[str, Any], ...]
+):
+    """
+    Records that the notifications were the given version of the shared snapshot
+    at the given generation. Must be called with __publish_lock held.
+    """
+    global __mirrored_version
+
+    __mirrored_version = version
+    __version_marks.mark(version, generation)
+    __shared_snapshots[version] = notifications
 
-    :params title: The title of the notification to be deleted.
+    while len(__shared_snapshots) > __KEPT_SNAPSHOT_COUNT:
+        __shared_snapshots.popitem(last=False)
+
+
+def __sync_shared_notifications():
+    """
+    Syncs notifications with other processes, when they changed the shared state.
+    The scheduler removes the notifications removed in other processes,
+    and the other processes mirror the latest snapshot of the scheduler.
     """
+    global __last_removal_id, __pending_removal_id, __synced_version
+
+    if __last_removal_id is None:
+        __last_removal_id = shared_state().last_message_id(__REMOVED_CHANNEL)
+
+    version = shared_state().data_version()
 
-    for notification_id, notification in __notifications.items():
-        # find the notification dict with matching title
-        if notification["title"] == title:
-            __notifications.pop(notification_id)
+    if version == __synced_version:
+        return
+
+    __synced_version = version
+
+    if is_scheduler():
+        for message_id, notification_id in shared_state().receive(
+            __REMOVED_CHANNEL, __last_removal_id
+        ):
+            __last_removal_id = message_id
+            __notifications.pop(notification_id, None)
             __removed_notifications.add(notification_id)
 
-            break
+        __publish()
+        return
+
+    if shared_state().get(__SHARED_VERSION_KEY) == __mirrored_version:
+        return
+
+    shared_snapshot = shared_state().get(__SHARED_SNAPSHOT_KEY)
+
+    if shared_snapshot is None or shared_snapshot["version"] == __mirrored_version:
+        # the snapshot of the new version is not shared yet
+        return
+
+    shared_notifications = [
+        __create_notification(
+            title=notification["title"],
+            content=(
+                Markup(notification["content"])
+                if notification["markup"]
+                else notification["content"]
+            ),
+        )
+        for notification in shared_snapshot["notifications"]
+    ]
+
+    shared_ids = [
+        notification["id"] for notification in shared_snapshot["notifications"]
+    ]
+    kept_ids = set(shared_ids)
+
+    with __publish_lock:
+        for notification_id in __notifications.keys():
+            if notification_id not in kept_ids:
+                __notifications.pop(notification_id, None)
+
+        for notification_id, notification in zip(shared_ids, shared_notifications):
+            __store_notification(notification_id, notification)
+
+        # this process shows the shared snapshot as it is again
+        __pending_removal_id = None
+        __show_version(
+            shared_snapshot["version"],
+            __notifications.generation,
+            tuple(
+                MappingProxyType(notification) for notification in shared_notifications
+            ),
+        )
+
+    __publish()
+
+
+def __on_scheduler_change(became_scheduler: bool):
+    """
+    Starts refreshing notifications when this process becomes the scheduler.
+    Removals received since this process started are applied again at the next sync,
+    in case the previous scheduler didn't get to apply them.
+    """
+    global __synced_version
+
+    if became_scheduler:
+        __synced_version = None
+        start_notification_refresh()
+
+
+def __store_notification(notification_id: str, notification: Dict[str, Any]):
+    """
+    Stores a notification under the given ID, which is also recorded in the notification
+    so the interface can refer to it. A notification equal to the stored one is left as it is,
+    so refreshes that bring nothing new don't change the generation of the notifications.
+    """
+    notification["id"] = notification_id
+
+    if __notifications.get(notification_id) != notification:
+        __notifications[notification_id] = notification
 
 
 def __create_notification(title: str, content: str) -> Dict[str, Any]:
@@ -100,13 +643,20 @@ def __create_covid_notification() -> Tuple[str, Dict[str, Any]]:
     covid_notification_id = __covid_notification_id(
         last_updated_on, new_cases, total_cases
     )
+    trends = fetch_covid_trends()
+    weekly_average = (
+        f""" <br>
+7-day average: <strong>{trends["new_cases_average"]:.0f}</strong> new cases a day"""
+        if trends and trends["new_cases_average"] is not None
+        else ""
+    )
 
     return covid_notification_id, __create_notification(
         title="Covid19 Data",
         content=Markup(
             f"""Data last updated on: <strong>{last_updated_on}</strong> <br>
 New cases: <strong>{new_cases}</strong> <br>
-Total cases: <strong>{total_cases}</strong>"""
+Total cases: <strong>{total_cases}</strong>{weekly_average}"""
         ),
     )
 
@@ -118,7 +668,7 @@ def __create_weather_notification() -> Tuple[str, Dict[str, Any]]:
     :returns: A tuple, first item being the id of the notification,
     second being the notification itself.
     """
-    weather = fetch_weather(lat=50.718410, long=-3.533899)
+    weather = fetch_weather(*weather_location())
 
     return __WEATHER_NOTIFICATION_ID, __create_notification(
         title="Current weather",
@@ -144,3 +694,7 @@ def __covid_notification_id(
     :returns: A notification ID to identify the covid notification
     """
     return f"covid_{last_updated_on}_{new_case_number + total_case_number}"
+
+
+on_sync(__sync_shared_notifications)
+on_scheduler_change(__on_scheduler_change)
@@ -0,0 +1,336 @@
+"""
+This module holds notifications in bounded stores, so a long-running server
+keeps a flat memory profile no matter how many news refreshes it goes through.
+"""
+
+import itertools
+import sys
+import time
+from collections import OrderedDict
+from threading import RLock
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from server.utils.change_log import ChangeLog
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Approximates the number of bytes taken by a value made of dicts, lists, tuples and strings.
+    """
+    size = sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        size += sum(
+            approximate_size(key) + approximate_size(item)
+            for key, item in value.items()
+        )
+    elif isinstance(value, (list, tuple)):
+        size += sum(approximate_size(item) for item in value)
+
+    return size
+
+
+class NotificationStore:
+    """
+    A map of notification IDs to notifications with a size cap and age-based expiry.
+    When the store is full, the oldest notifications are evicted first.
+    It can be used like a dict, and notifications can also be looked up by title.
+    Every change, including evictions and expiry, bumps the generation of the store,
+    and the changes made after a generation can be listed.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        max_age: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :params max_size: The maximum number of notifications kept.
+        :params max_age: The number of seconds after which a notification expires.
+        :params clock: The function used to tell the current time, in seconds.
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self.__clock = clock
+        self.__lock = RLock()
+        # A map of notification IDs to (time when added, notification), oldest first
+        self.__notifications: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        # A map of titles to the IDs of notifications with that title, oldest first
+        self.__title_index: Dict[str, "OrderedDict[str, None]"] = {}
+        self.__evicted_count = 0
+        self.__change_log = ChangeLog()
+        # A map of notification IDs to the generation they were stored at,
+        # which grows along the order of the notifications
+        self.__versions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        with self.__lock:
+            self.__expire()
+            return len(self.__notifications)
+
+    @property
+    def generation(self) -> int:
+        """
+        A number that grows whenever a notification is stored, removed or expires.
+        """
+        with self.__lock:
+            self.__expire()
+            return self.__change_log.generation
+
+    def __contains__(self, notification_id: str) -> bool:
+        with self.__lock:
+            self.__expire()
+            return notification_id in self.__notifications
+
+    def __getitem__(self, notification_id: str) -> Dict[str, Any]:
+        with self.__lock:
+            self.__expire()
+            return self.__notifications[notification_id][1]
+
+    def __setitem__(self, notification_id: str, notification: Dict[str, Any]):
+        """
+        Stores a notification, replacing the one with the same ID and resetting its age.
+        """
+        with self.__lock:
+            if notification_id in self.__notifications:
+                self.__remove(notification_id)
+
+            self.__notifications[notification_id] = (self.__clock(), notification)
+            self.__versions[notification_id] = self.__change_log.record(notification_id)
+            self.__title_index.setdefault(notification["title"], OrderedDict())[
+                notification_id
+            ] = None
+            self.__expire()
+
+            while len(self.__notifications) > self.max_size:
+                self.__remove(next(iter(self.__notifications)))
+                self.__evicted_count += 1
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def pop(self, notification_id: str, *default: Any) -> Dict[str, Any]:
+        """
+        Removes a notification.
+
+        :returns: The removed notification, or default if given and there is no such notification.
+        :raises KeyError: There is no such notification and no default is given.
+        """
+        with self.__lock:
+            if notification_id not in self.__notifications and default:
+                return default[0]
+
+            return self.__remove(notification_id)
+
+    def get(self, notification_id: str, default: Any = None) -> Dict[str, Any]:
+        """
+        Returns the notification with the given ID, or default if there is no such notification.
+        """
+        with self.__lock:
+            self.__expire()
+            entry = self.__notifications.get(notification_id)
+
+            return entry[1] if entry else default
+
+    def page(self, after: int, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Returns at most limit notifications, oldest first,
+        starting after the notification stored at the given generation.
+
+        :params after: The generation the last notification of the previous page was stored at,
+        or 0 for the first page.
+        :params limit: The maximum number of notifications returned.
+        :returns: A list of (generation the notification was stored at, notification).
+        """
+        with self.__lock:
+            self.__expire()
+            notifications = (
+                (self.__versions[notification_id], notification)
+                for notification_id, (_, notification) in self.__notifications.items()
+            )
+
+            return list(
+                itertools.islice(
+                    itertools.dropwhile(lambda entry: entry[0] <= after, notifications),
+                    limit,
+                )
+            )
+
+    def changes_since(
+        self, generation: int
+    ) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+        """
+        Returns the changes made after the given generation.
+
+        :returns: A tuple of (notifications stored, IDs of notifications removed), or None if
+        the changes are too old to be listed.
+        """
+        with self.__lock:
+            self.__expire()
+            changes = self.__change_log.changes_since(generation)
+
+            if changes is None:
+                return None
+
+            stored, removed = changes
+
+            return [self.__notifications[key][1] for key in stored], removed
+
+    def ids_with_title(self, title: str) -> List[str]:
+        """
+        Returns the IDs of the notifications with the given title, oldest first.
+        """
+        with self.__lock:
+            self.__expire()
+            return list(self.__title_index.get(title, ()))
+
+    def keys(self) -> List[str]:
+        """
+        Returns the IDs of the notifications, oldest first.
+        """
+        with self.__lock:
+            self.__expire()
+            return list(self.__notifications.keys())
+
+    def values(self) -> List[Dict[str, Any]]:
+        """
+        Returns the notifications, oldest first.
+        """
+        with self.__lock:
+            self.__expire()
+            return [notification for _, notification in self.__notifications.values()]
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Returns (ID, notification) pairs, oldest first.
+        """
+        with self.__lock:
+            self.__expire()
+            return [
+                (notification_id, notification)
+                for notification_id, (_, notification) in self.__notifications.items()
+            ]
+
+    def snapshot(self) -> Tuple[int, Tuple[Mapping[str, Any], ...]]:
+        """
+        Returns the generation of the store and read-only views of the notifications,
+        oldest first, taken at the same time.
+        """
+        with self.__lock:
+            self.__expire()
+            return self.__change_log.generation, tuple(
+                MappingProxyType(notification)
+                for _, notification in self.__notifications.values()
+            )
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Returns a gauge of the memory used by this store in the shape of:
+        {
+            "count": number of notifications,
+            "evicted": number of notifications evicted or expired so far,
+            "bytes": approximate number of bytes taken by the notifications,
+        }
+        """
+        with self.__lock:
+            self.__expire()
+            return {
+                "count": len(self.__notifications),
+                "evicted": self.__evicted_count,
+                "bytes": approximate_size(dict(self.__notifications)),
+            }
+
+    def __expire(self):
+        """
+        Removes expired notifications. Must be called with the lock held.
+        Notifications are ordered by age, so only the oldest ones are checked.
+        """
+        expired_before = self.__clock() - self.max_age
+
+        while self.__notifications:
+            added_at, _ = next(iter(self.__notifications.values()))
+
+            if added_at > expired_before:
+                break
+
+            self.__remove(next(iter(self.__notifications)))
+            self.__evicted_count += 1
+
+    def __remove(self, notification_id: str) -> Dict[str, Any]:
+        """
+        Removes a notification from the store and from the title index.
+        Must be called with the lock held.
+
+        :returns: The removed notification.
+        :raises KeyError: There is no such notification.
+        """
+        _, notification = self.__notifications.pop(notification_id)
+        del self.__versions[notification_id]
+        self.__change_log.record(notification_id, removed=True)
+        ids = self.__title_index[notification["title"]]
+        del ids[notification_id]
+
+        if not ids:
+            del self.__title_index[notification["title"]]
+
+        return notification
+
+
+class RemovedNotifications:
+    """
+    A bounded set of IDs of removed notifications.
+    When it is full, the least recently seen IDs are forgotten first.
+    It can be used like a set.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        :params max_size: The maximum number of IDs remembered.
+        """
+        self.max_size = max_size
+        self.__lock = RLock()
+        self.__ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __contains__(self, notification_id: str) -> bool:
+        """
+        Checks whether the notification is removed. A removed notification that is seen again
+        is marked as recently seen, so it is remembered for as long as the news api returns it.
+        """
+        with self.__lock:
+            if notification_id not in self.__ids:
+                return False
+
+            self.__ids.move_to_end(notification_id)
+            return True
+
+    def add(self, notification_id: str):
+        """
+        Marks a notification as removed, forgetting the least recently seen ID if full.
+        """
+        with self.__lock:
+            self.__ids[notification_id] = None
+            self.__ids.move_to_end(notification_id)
+
+            while len(self.__ids) > self.max_size:
+                self.__ids.popitem(last=False)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Returns a gauge of the memory used by this set in the shape of:
+        {
+            "count": number of remembered IDs,
+            "bytes": approximate number of bytes taken by the IDs,
+        }
+        """
+        with self.__lock:
+            return {
+                "count": len(self.__ids),
+                "bytes": approximate_size(dict(self.__ids)),
+            }
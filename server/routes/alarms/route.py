@@ -3,29 +3,64 @@ This module handles all the api routing for this server.
 """
 import os
 import datetime
+import math
+import uuid
 
-from flask import request, render_template
+from flask import Response, request, render_template
 
 from server import app
-from .alarm_scheduler import cancel_alarm, schedule_alarm, get_alarms
-from .notification import get_notifications, remove_notification
-
+from server.utils.cache import TTLCache
+from .alarm_scheduler import (
+    cancel_alarm,
+    schedule_alarm,
+    get_alarms,
+    get_alarms_version,
+)
+from .cluster import is_multi_process
+from .notification import (
+    get_notifications,
+    get_notifications_version,
+    remove_notification,
+    start_notification_refresh,
+)
 
 # The format the date string from input[type="datetime-local"] is in
 __DATE_FORMAT = "%Y-%m-%dT%H:%M"
 
+# Identifies this run of a single-process server in etags, because its generations
+# are counted in memory and start from 0 again when the server restarts
+__BOOT_ID = uuid.uuid4().hex[:8]
+
+# maps the etag of a rendered interface to its html.
+# a rendered interface never goes stale, because its etag changes with any change it shows.
+__rendered_pages = TTLCache(ttl=math.inf, max_size=4)
+
+
+@app.before_request
+def start_background_refresh():
+    """
+    Starts refreshing notifications in the background when the first request comes in,
+    so request handlers only ever read them.
+    The alarm scheduler is started with the server instead, see server/__init__.py.
+    """
+    start_notification_refresh()
+
 
 @app.route("/")
 @app.route("/index")
 def render_interface():
     """
     Renders the main alarm interface using the template specified in config.interface_template
+
+    The interface is rendered once for every state of the alarms and notifications.
+    Responses carry an etag of that state, and requests whose If-None-Match header
+    has the etag of the current state get an empty 304 response.
     """
 
     # the title of the alarm to be removed
     deleted_alarm_title = request.args.get("alarm_item", default="")
-    # the title of the notification to be removed
-    notification_title = request.args.get("notif", default="")
+    # the id of the notification to be removed. titles are accepted too, for older links
+    notification_id = request.args.get("notif", default="")
     # the time when an alarm will be scheduled
     new_alarm_time = request.args.get("alarm", default="")
     # the title of the alarm
@@ -35,23 +70,16 @@ def render_interface():
     # whether to include weather briefing when the alarm fires
     include_weather = request.args.get("weather", default="")
 
-    if notification_title:
+    if notification_id:
         # the notif param is passed
         # delete the given notification
-        remove_notification(notification_title)
-        notifications = get_notifications(refresh=False)
-    else:
-        # refresh the list of notifications when the alarm title is not present
-        # because we dont want to fetch news when the user is trying to remove alarms
-        notifications = get_notifications(refresh=not deleted_alarm_title)
+        remove_notification(notification_id)
 
     if deleted_alarm_title:
         # the alarm_item param is passed
         # delete the given alarm
         cancel_alarm(deleted_alarm_title)
 
-    alarms = get_alarms()
-
     if new_alarm_time and new_alarm_title:
         # the user wants to schedule an alarm
         schedule_alarm(
@@ -61,9 +89,29 @@ def render_interface():
             should_include_weather=include_weather,
         )
 
-    return render_template(
-        os.environ["INTERFACE_TEMPLATE"],
-        notifications=notifications,
-        alarms=alarms,
-        image="logo.gif",
-    )
+    # the versions are shared by server processes, so any process can answer with a 304
+    etag = f"{get_alarms_version()}-{get_notifications_version()}"
+
+    if not is_multi_process():
+        etag = f"{__BOOT_ID}-{etag}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(
+            __rendered_pages.get(
+                etag,
+                lambda: render_template(
+                    os.environ["INTERFACE_TEMPLATE"],
+                    notifications=get_notifications(),
+                    alarms=get_alarms(),
+                    image="logo.gif",
+                ),
+            )
+        )
+
+    response.set_etag(etag)
+    # browsers have to check whether the interface changed before showing it again
+    response.headers["Cache-Control"] = "no-cache"
+
+    return response
@@ -0,0 +1,472 @@
+"""
+This module speaks daily briefs.
+
+Utterances are queued by priority and spoken one at a time by a single thread
+owning the speech backend, so firing an alarm never waits for audio,
+and pyttsx3 engines, which are not thread-safe, are only ever used by that thread.
+An utterance interrupts the one being spoken if it is more urgent, or if the one
+being spoken has gone stale, so a newly fired alarm doesn't wait for an old brief.
+The texts of an utterance can be a generator, and each text is spoken as soon as
+it is generated, so a brief starts speaking before all of its data has arrived.
+
+The backend is configured with speech_backend in config.json:
+- "pyttsx3" (default) speaks through the speakers,
+- "wav" writes every utterance to a WAV file in speech_output_path,
+- "null" discards utterances, for tests and servers without audio.
+"""
+
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import wave
+from threading import Condition, Event, Lock, Thread
+from typing import Any, Callable, Iterable, List, Optional
+
+from server.utils.logger import log_exception
+from .speech_cache import SpeechCache
+
+
+class SpeechBackend:
+    """
+    Turns text into sound. A backend is only used by the thread of its Speaker,
+    except for stop, which interrupts it from other threads,
+    so stop must not use anything that is not thread-safe.
+    """
+
+    def speak(self, texts: Iterable[str], interrupted: Event):
+        """
+        Speaks the given texts one after another, each as soon as it is generated,
+        blocking until they are spoken or stop is called.
+
+        :params interrupted: Set when the texts must not be spoken anymore.
+        It is set before stop is called, so a backend can check it between steps.
+        """
+        raise NotImplementedError
+
+    def stop(self):
+        """
+        Interrupts the texts being spoken, if any. Called from other threads
+        after interrupted is set.
+        """
+
+
+class NullBackend(SpeechBackend):
+    """
+    Discards what it is given to speak.
+    """
+
+    def speak(self, texts: Iterable[str], interrupted: Event):
+        logging.debug("Discarded an utterance of %s texts.", sum(1 for _ in texts))
+
+
+class Pyttsx3Backend(SpeechBackend):
+    """
+    Speaks through the speakers with pyttsx3. Texts are synthesized to WAV clips
+    and played with an audio player when a speech cache is given,
+    and spoken by pyttsx3 directly otherwise, or if a clip can't be played.
+
+    pyttsx3 engines are not thread-safe, so stop never touches the engine.
+    Clips are stopped by terminating the audio player, which is safe from any thread,
+    and direct speech is stopped by the speaker thread itself, which checks
+    whether it is interrupted before every word.
+    """
+
+    def __init__(
+        self,
+        speech_cache: Optional[SpeechCache] = None,
+        audio_player: Optional[List[str]] = None,
+    ):
+        """
+        :params speech_cache: The cache of synthesized clips, or None to speak directly.
+        :params audio_player: The command playing a WAV file given as its last argument.
+        Unused on Windows, where winsound is used.
+        """
+        self.__speech_cache = speech_cache
+        self.__audio_player = audio_player
+        self.__engine = None
+        self.__player: Optional[subprocess.Popen] = None
+        # set while texts are spoken directly, to the event interrupting them
+        self.__speaking_interrupted: Optional[Event] = None
+
+    @property
+    def engine(self) -> Any:
+        """
+        The pyttsx3 engine, created on first use, because loading the speech driver
+        is slow and fails on machines without one.
+        """
+        if self.__engine is None:
+            # pylint: disable=import-outside-toplevel
+            import pyttsx3
+
+            self.__engine = pyttsx3.init()
+            self.__engine.connect("started-word", self.__on_word)
+
+        return self.__engine
+
+    def speak(self, texts: Iterable[str], interrupted: Event):
+        for text in texts:
+            if interrupted.is_set():
+                return
+
+            if self.__speech_cache:
+                try:
+                    # only texts that are not cached are synthesized
+                    self.__play(
+                        self.__speech_cache.clip(self.engine, text), interrupted
+                    )
+                    continue
+                except (
+                    OSError,
+                    wave.Error,
+                    subprocess.SubprocessError,
+                ) as speech_exception:
+                    log_exception(
+                        method="Pyttsx3Backend > speak", exception=speech_exception
+                    )
+
+            self.__speaking_interrupted = interrupted
+
+            try:
+                self.engine.say(text)
+                self.engine.runAndWait()
+            finally:
+                self.__speaking_interrupted = None
+
+    def stop(self):
+        if sys.platform == "win32":
+            # pylint: disable=import-outside-toplevel
+            import winsound
+
+            winsound.PlaySound(None, 0)
+            return
+
+        player = self.__player
+
+        if player is not None and player.poll() is None:
+            player.terminate()
+
+    def __on_word(self, *_):
+        """
+        Called by the engine before every word, on the thread running runAndWait.
+        Stops the engine when the texts being spoken directly are interrupted.
+        Clips being synthesized are never stopped, so no truncated clip is cached.
+        """
+        interrupted = self.__speaking_interrupted
+
+        if interrupted is not None and interrupted.is_set():
+            self.__engine.stop()
+
+    def __play(self, path: str, interrupted: Event):
+        """
+        Plays a WAV file, blocking until it finishes or stop is called.
+        """
+        if sys.platform == "win32":
+            # pylint: disable=import-outside-toplevel
+            import winsound
+
+            winsound.PlaySound(path, winsound.SND_FILENAME)
+            return
+
+        self.__player = subprocess.Popen([*self.__audio_player, path])
+
+        try:
+            return_code = self.__player.wait()
+        finally:
+            self.__player = None
+
+        if return_code != 0 and not interrupted.is_set():
+            raise subprocess.CalledProcessError(return_code, self.__audio_player)
+
+
+class WavFileBackend(Pyttsx3Backend):
+    """
+    Writes every utterance to a WAV file instead of playing it,
+    for servers whose briefs are played elsewhere.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :params directory: The folder the WAV files are written to.
+        """
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def speak(self, texts: Iterable[str], interrupted: Event):
+        path = os.path.join(
+            self.directory,
+            f"brief-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}.wav",
+        )
+        self.engine.save_to_file(" ".join(texts), path)
+        self.engine.runAndWait()
+        logging.info("Brief written to %s.", path)
+
+
+class Utterance:
+    """
+    Texts queued to be spoken by a Speaker.
+    """
+
+    def __init__(
+        self,
+        texts: Iterable[str],
+        priority: int,
+        queued_at: float,
+        stale_after: Optional[float],
+    ):
+        self.texts = texts
+        self.priority = priority
+        self.queued_at = queued_at
+        self.stale_after = stale_after
+        # one of "queued", "speaking", "spoken", "canceled", "stale" and "failed"
+        self.state = "queued"
+        # set when the utterance is canceled or interrupted
+        self.interrupted = Event()
+        self.__done = Event()
+        self.__done_callbacks: List[Callable[["Utterance"], None]] = []
+        self.__done_callbacks_lock = Lock()
+
+    def is_stale(self, now: float) -> bool:
+        """
+        Returns whether the utterance is older than stale_after seconds.
+        """
+        return self.stale_after is not None and now - self.queued_at > self.stale_after
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until the utterance is spoken, canceled or dropped.
+
+        :returns: Whether the utterance is done, which is False if the timeout ran out.
+        """
+        return self.__done.wait(timeout)
+
+    def add_done_callback(self, callback: Callable[["Utterance"], None]):
+        """
+        Calls the given function with the utterance once it is spoken, canceled or dropped,
+        or right away if it is already done.
+        """
+        with self.__done_callbacks_lock:
+            if not self.__done.is_set():
+                self.__done_callbacks.append(callback)
+                return
+
+        callback(self)
+
+    def finish(self, state: str):
+        """
+        Records how the utterance ended, wakes up threads waiting for it
+        and calls its done callbacks.
+        """
+        self.state = state
+
+        with self.__done_callbacks_lock:
+            self.__done.set()
+            callbacks, self.__done_callbacks = self.__done_callbacks, []
+
+        for callback in callbacks:
+            callback(self)
+
+
+class Speaker:
+    """
+    Speaks queued utterances one at a time, most urgent first,
+    on a thread owning the speech backend.
+    """
+
+    def __init__(
+        self, backend: SpeechBackend, clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        :params backend: The backend utterances are spoken with.
+        :params clock: The function used to tell the current time, in seconds.
+        """
+        self.backend = backend
+        self.__clock = clock
+        self.__condition = Condition()
+        # heap of (-priority, sequence number, utterance), so that utterances
+        # of the same priority are spoken in the order they are queued
+        self.__queue = []
+        self.__sequence = itertools.count()
+        self.__current: Optional[Utterance] = None
+        self.__thread: Optional[Thread] = None
+
+    def say(
+        self, texts: Iterable[str], priority: int = 0, stale_after: float = None
+    ) -> Utterance:
+        """
+        Queues texts to be spoken one after another, and returns right away.
+        The utterance being spoken is interrupted if the new one has a higher priority,
+        or if the one being spoken is stale.
+
+        :params texts: The texts to be spoken. When it is a generator, each text is spoken
+        as soon as it is generated, on the thread of the speaker.
+        :params priority: Utterances of higher priority are spoken first.
+        :params stale_after: Seconds after which the utterance is dropped if it is not spoken yet,
+        and can be interrupted by any new utterance. None means it never goes stale.
+        :returns: The queued utterance.
+        """
+        now = self.__clock()
+        utterance = Utterance(texts, priority, now, stale_after)
+
+        with self.__condition:
+            heapq.heappush(self.__queue, (-priority, next(self.__sequence), utterance))
+            current = self.__current
+
+            if current is not None and (
+                priority > current.priority or current.is_stale(now)
+            ):
+                logging.info("Interrupted an utterance for a new one.")
+                self.__interrupt(current)
+
+            self.__start()
+            self.__condition.notify()
+
+        return utterance
+
+    def cancel(self, utterance: Utterance):
+        """
+        Cancels an utterance, stopping it if it is being spoken.
+        Does nothing if the utterance is already done.
+        """
+        with self.__condition:
+            if utterance.state == "queued":
+                # the utterance is dropped when it comes out of the queue
+                utterance.finish("canceled")
+                return
+
+            if utterance is self.__current and utterance.state == "speaking":
+                self.__interrupt(utterance)
+
+    def pending_count(self) -> int:
+        """
+        Returns the number of utterances waiting to be spoken.
+        """
+        with self.__condition:
+            return sum(
+                1 for _, _, utterance in self.__queue if utterance.state == "queued"
+            )
+
+    def __interrupt(self, utterance: Utterance):
+        """
+        Stops the utterance being spoken. Must be called with the condition held,
+        so the backend is never stopped after it moved on to the next utterance.
+        The backend is stopped from the calling thread, see SpeechBackend.stop.
+        """
+        utterance.state = "canceled"
+        utterance.interrupted.set()
+        self.backend.stop()
+
+    def __start(self):
+        """
+        Starts the thread speaking utterances, if it is not started yet.
+        Must be called with the condition held.
+        """
+        if self.__thread is None:
+            self.__thread = Thread(
+                target=self.__speak_forever, name="speaker", daemon=True
+            )
+            self.__thread.start()
+
+    def __next_utterance(self) -> Utterance:
+        """
+        Blocks until an utterance is due, and marks it as being spoken.
+        Canceled and stale utterances are dropped on the way.
+        """
+        with self.__condition:
+            while True:
+                while not self.__queue:
+                    self.__condition.wait()
+
+                _, _, utterance = heapq.heappop(self.__queue)
+
+                if utterance.state != "queued":
+                    continue
+
+                if utterance.is_stale(self.__clock()):
+                    logging.info("Dropped a stale utterance.")
+                    utterance.finish("stale")
+                    continue
+
+                utterance.state = "speaking"
+                self.__current = utterance
+
+                return utterance
+
+    def __speak_forever(self):
+        """
+        Speaks queued utterances until the process exits.
+        """
+        while True:
+            utterance = self.__next_utterance()
+
+            try:
+                self.backend.speak(utterance.texts, utterance.interrupted)
+                state = "spoken"
+            except Exception as speech_exception:  # pylint: disable=broad-except
+                state = "failed"
+                log_exception(
+                    method="Speaker > __speak_forever", exception=speech_exception
+                )
+
+            with self.__condition:
+                self.__current = None
+                utterance.finish("canceled" if utterance.state == "canceled" else state)
+
+
+def __find_audio_player() -> Optional[List[str]]:
+    """
+    Returns the command that plays a WAV file given as its last argument.
+    Can be configured with audio_player in config.json, and is looked up otherwise.
+    Returns None if no player is found, or on Windows, where winsound is used.
+    """
+    if os.environ.get("AUDIO_PLAYER"):
+        return os.environ["AUDIO_PLAYER"].split()
+
+    for player in ("aplay", "afplay", "paplay"):
+        if shutil.which(player):
+            return [player]
+
+    return None
+
+
+def __create_speech_cache(audio_player: Optional[List[str]]) -> Optional[SpeechCache]:
+    """
+    Creates the cache of synthesized speech clips, configured with speech_cache_path
+    and speech_cache_max_bytes in config.json.
+    Returns None, so briefs are spoken directly, if the cache is disabled
+    or if cached clips can't be played on this machine.
+    """
+    cache_path = os.environ.get("SPEECH_CACHE_PATH", ".speech_cache")
+
+    if not cache_path or (sys.platform != "win32" and not audio_player):
+        return None
+
+    return SpeechCache(
+        directory=cache_path,
+        max_bytes=int(os.environ.get("SPEECH_CACHE_MAX_BYTES", 50 * 1024 * 1024)),
+    )
+
+
+def create_speech_backend() -> SpeechBackend:
+    """
+    Creates the speech backend configured with speech_backend in config.json.
+
+    :raises ValueError: The configured backend doesn't exist.
+    """
+    backend = os.environ.get("SPEECH_BACKEND", "pyttsx3")
+
+    if backend == "null":
+        return NullBackend()
+    if backend == "wav":
+        return WavFileBackend(os.environ.get("SPEECH_OUTPUT_PATH", "briefs"))
+    if backend == "pyttsx3":
+        audio_player = __find_audio_player()
+        return Pyttsx3Backend(__create_speech_cache(audio_player), audio_player)
+
+    raise ValueError(f"Unknown speech backend: {backend}")
@@ -0,0 +1,134 @@
+"""
+This module caches synthesized speech, so text spoken by many daily briefs,
+like greetings and data that haven't changed since the last brief, is only synthesized once.
+
+Text fragments are rendered to WAV clips with pyttsx3's save_to_file. Clips are keyed
+by a hash of the text and the voice settings, and are evicted least recently used first
+when the cache holds too many clips or too many bytes.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+# Voice properties of a pyttsx3 engine that change how text sounds
+__VOICE_PROPERTIES = ("voice", "rate", "volume")
+
+
+def voice_settings(engine: Any) -> str:
+    """
+    Describes the voice settings of a pyttsx3 engine, as part of the key of a clip.
+    """
+    return ";".join(f"{name}={engine.getProperty(name)}" for name in __VOICE_PROPERTIES)
+
+
+class SpeechCache:
+    """
+    A size-bounded, least recently used cache of synthesized speech clips on disk.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_clips: int = 1000):
+        """
+        :params directory: The folder clips are stored in. Clips already in it are reused.
+        :params max_bytes: The maximum total size of the clips, in bytes.
+        :params max_clips: The maximum number of clips.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_clips = max_clips
+        self.__lock = Lock()
+        # A map of clip keys to the size of the clip in bytes, least recently used first
+        self.__clips: "OrderedDict[str, int]" = OrderedDict()
+        self.__total_bytes = 0
+        self.__stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(directory, exist_ok=True)
+
+        # reuse clips from previous runs, oldest first
+        existing_clips = sorted(
+            (entry for entry in os.scandir(directory) if entry.name.endswith(".wav")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in existing_clips:
+            self.__clips[entry.name[: -len(".wav")]] = entry.stat().st_size
+            self.__total_bytes += entry.stat().st_size
+
+        with self.__lock:
+            self.__evict()
+
+    def clip(self, engine: Any, text: str) -> str:
+        """
+        Returns the path of the clip of the given text spoken with the engine's voice,
+        synthesizing it first if it is not cached.
+
+        :params engine: The pyttsx3 engine used to synthesize the clip.
+        :params text: The text to be spoken.
+        :returns: The path of the WAV clip.
+        """
+        key = hashlib.sha256(f"{voice_settings(engine)}\n{text}".encode()).hexdigest()
+        path = self.__path(key)
+
+        with self.__lock:
+            if key in self.__clips and os.path.exists(path):
+                self.__clips.move_to_end(key)
+                self.__stats["hits"] += 1
+                return path
+
+            self.__stats["misses"] += 1
+
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+
+        with self.__lock:
+            size = os.path.getsize(path)
+            self.__total_bytes += size - self.__clips.pop(key, 0)
+            self.__clips[key] = size
+            self.__evict(keep=key)
+
+        return path
+
+    def stats(self):
+        """
+        Returns the counters of this cache in the shape of:
+        {
+            "hits": number of clips reused,
+            "misses": number of clips synthesized,
+            "evictions": number of clips removed to make room,
+            "clips": number of cached clips,
+            "bytes": total size of cached clips,
+        }
+        """
+        with self.__lock:
+            return {
+                **self.__stats,
+                "clips": len(self.__clips),
+                "bytes": self.__total_bytes,
+            }
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def __evict(self, keep: str = None):
+        """
+        Removes least recently used clips until the cache is within its limits.
+        Must be called with the lock held.
+
+        :params keep: The key of a clip that must not be removed.
+        """
+        while self.__clips and (
+            len(self.__clips) > self.max_clips or self.__total_bytes > self.max_bytes
+        ):
+            key = next(iter(self.__clips))
+
+            if key == keep:
+                break
+
+            self.__total_bytes -= self.__clips.pop(key)
+            self.__stats["evictions"] += 1
+
+            try:
+                os.remove(self.__path(key))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,133 @@
+import threading
+
+from pytest_mock import mock
+
+from server.utils.cache import TTLCache
+
+
+class __MockClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_fresh_value():
+    clock = __MockClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    loader = mock.Mock(return_value="value")
+
+    assert cache.get("key", loader) == "value"
+    clock.now = 5
+    assert cache.get("key", loader) == "value"
+
+    loader.assert_called_once()
+    assert cache.stats() == {
+        "hits": 1,
+        "stale_hits": 0,
+        "misses": 1,
+        "refresh_errors": 0,
+        "size": 1,
+    }
+
+
+def test_get_expired_value():
+    clock = __MockClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    loader = mock.Mock(side_effect=["old", "new"])
+
+    cache.get("key", loader)
+    clock.now = 10
+
+    assert cache.get("key", loader) == "new"
+    assert cache.stats()["misses"] == 2
+
+
+def test_get_stale_value_refreshes_in_background():
+    clock = __MockClock()
+    cache = TTLCache(ttl=10, stale_ttl=100, clock=clock)
+    refreshed = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        release.wait(timeout=5)
+        refreshed.set()
+        return "new"
+
+    cache.get("key", lambda: "old")
+    clock.now = 20
+
+    # both calls are served the stale value while only one refresh runs
+    assert cache.get("key", slow_loader) == "old"
+    assert cache.get("key", slow_loader) == "old"
+
+    release.set()
+    assert refreshed.wait(timeout=5)
+
+    for _ in range(100):
+        if cache.get("key", slow_loader) == "new":
+            break
+        threading.Event().wait(0.01)
+
+    assert cache.get("key", slow_loader) == "new"
+    assert cache.stats()["stale_hits"] >= 2
+
+
+def test_failed_refresh_keeps_stale_value():
+    clock = __MockClock()
+    cache = TTLCache(ttl=10, stale_ttl=100, clock=clock)
+
+    cache.get("key", lambda: "old")
+    clock.now = 20
+
+    def failing_loader():
+        raise ConnectionError()
+
+    assert cache.get("key", failing_loader) == "old"
+
+    for _ in range(100):
+        if cache.stats()["refresh_errors"]:
+            break
+        threading.Event().wait(0.01)
+
+    assert cache.stats()["refresh_errors"] == 1
+    assert cache.get("key", failing_loader) == "old"
+
+
+def test_clear():
+    cache = TTLCache(ttl=10)
+    cache.get("key", lambda: "value")
+
+    cache.clear()
+
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["misses"] == 0
+
+
+def test_max_size_evicts_least_recently_used():
+    clock = __MockClock()
+    cache = TTLCache(ttl=10, clock=clock, max_size=2)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # a is used, so b is the least recently used
+    cache.get("a", mock.Mock())
+    cache.put("c", 3)
+
+    assert cache.age("b") is None
+    assert cache.get("a", mock.Mock()) == 1
+    assert cache.get("c", mock.Mock()) == 3
+    assert cache.stats()["size"] == 2
+
+
+def test_age():
+    clock = __MockClock()
+    cache = TTLCache(ttl=10, clock=clock)
+
+    assert cache.age("key") is None
+
+    cache.put("key", "value")
+    clock.now = 4
+
+    assert cache.age("key") == 4
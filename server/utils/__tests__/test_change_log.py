@@ -0,0 +1,64 @@
+from server.utils.change_log import ChangeLog, VersionMarks
+
+
+def test_changes_since():
+    change_log = ChangeLog()
+    change_log.record("a")
+    generation = change_log.record("b")
+
+    change_log.record("c")
+    change_log.record("b", removed=True)
+    change_log.record("a")
+
+    assert change_log.generation == 5
+    assert change_log.changes_since(generation) == (["c", "a"], ["b"])
+    assert change_log.changes_since(0) == (["c", "a"], ["b"])
+    assert change_log.changes_since(change_log.generation) == ([], [])
+
+
+def test_forgotten_changes():
+    change_log = ChangeLog(max_size=2)
+    change_log.record("a")
+    change_log.record("b")
+    change_log.record("c")
+
+    assert change_log.changes_since(0) is None
+    assert change_log.changes_since(1) == (["b", "c"], [])
+
+
+def test_changes_since_newer_generation():
+    change_log = ChangeLog()
+    change_log.record("a")
+    change_log.record("b")
+
+    # e.g. a generation returned before the server restarted
+    assert change_log.changes_since(50) is None
+
+
+def test_record_many():
+    change_log = ChangeLog(max_size=3)
+    change_log.record("a")
+    change_log.record("b", removed=True)
+
+    assert change_log.record_many(["c", "d"]) == 4
+    assert change_log.changes_since(1) == (["c", "d"], ["b"])
+
+    assert change_log.record_many(["e", "f", "g", "h"]) == 8
+    assert change_log.changes_since(4) is None
+    assert change_log.changes_since(5) == (["f", "g", "h"], [])
+
+
+def test_version_marks():
+    version_marks = VersionMarks(max_size=2)
+    version_marks.mark(1, 3)
+    version_marks.mark(2, 5)
+    version_marks.mark(2, 8)
+
+    assert version_marks.generation(1) == 3
+    assert version_marks.generation(2) == 5
+    assert version_marks.generation(4) is None
+
+    version_marks.mark(4, 9)
+
+    assert version_marks.generation(1) is None
+    assert version_marks.generation(4) == 9
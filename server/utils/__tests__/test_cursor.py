@@ -0,0 +1,16 @@
+import pytest
+
+from server.utils.cursor import decode_cursor, encode_cursor
+
+
+def test_cursor():
+    assert decode_cursor(encode_cursor([1606807800.0, "title"])) == [
+        1606807800.0,
+        "title",
+    ]
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
@@ -0,0 +1,35 @@
+from server.utils.event_hub import EventHub
+
+
+def test_publish():
+    hub = EventHub()
+    first = hub.subscribe()
+    second = hub.subscribe()
+
+    assert hub.publish("event") == 2
+    assert first.next_event(timeout=0) == "event"
+    assert second.next_event(timeout=0) == "event"
+    assert first.next_event(timeout=0) is None
+
+    hub.unsubscribe(second)
+
+    assert hub.publish("other event") == 1
+    assert len(hub) == 1
+
+
+def test_slow_subscribers_are_dropped():
+    hub = EventHub(max_pending=2, reset_event="reset")
+    slow = hub.subscribe()
+    fast = hub.subscribe()
+
+    for event in ["1", "2", "3"]:
+        hub.publish(event)
+        assert fast.next_event(timeout=0) == event
+
+    assert len(hub) == 1
+    assert hub.dropped_count == 1
+    assert not slow.closed
+    assert slow.next_event(timeout=0) == "reset"
+    assert slow.closed
+    assert slow.next_event(timeout=0) is None
+    assert hub.publish("4") == 1
@@ -0,0 +1,51 @@
+from server.utils.fingerprint import (
+    DedupIndex,
+    content_fingerprint,
+    hamming_distance,
+    simhash,
+)
+
+__HEADLINE = (
+    "Covid vaccine approved for use in the UK, with roll-out starting next week. "
+    "The regulator says the jab, which offers up to 95% protection against illness, "
+    "is safe to be rolled out."
+)
+
+
+def test_content_fingerprint():
+    fingerprint = content_fingerprint("Title", "Description")
+
+    assert len(fingerprint) == 16
+    assert fingerprint == content_fingerprint(" title", "DESCRIPTION ")
+    assert fingerprint != content_fingerprint("Titl", "eDescription")
+    # anagrams no longer collide
+    assert fingerprint != content_fingerprint("eltiT", "Description")
+
+
+def test_simhash():
+    reworded = __HEADLINE.replace("starting next", "to start from next")
+    unrelated = "Stock markets rally as investors welcome the trade deal"
+
+    assert simhash(__HEADLINE) == simhash(__HEADLINE.upper())
+    assert hamming_distance(simhash(__HEADLINE), simhash(reworded)) <= 6
+    assert hamming_distance(simhash(__HEADLINE), simhash(unrelated)) > 6
+
+
+def test_dedup_index():
+    index = DedupIndex()
+    index.add("id", simhash(__HEADLINE))
+
+    assert index.find_near_duplicate(simhash(__HEADLINE + " - BBC News")) == "id"
+    assert index.find_near_duplicate(simhash("Something else entirely")) is None
+
+
+def test_dedup_index_is_bounded():
+    index = DedupIndex(max_size=2)
+
+    index.add("first", simhash("first headline about football"))
+    index.add("second", simhash("second headline about weather"))
+    index.add("third", simhash("third headline about elections"))
+
+    assert len(index) == 2
+    assert "first" not in index
+    assert index.find_near_duplicate(simhash("first headline about football")) is None
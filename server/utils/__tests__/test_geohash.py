@@ -0,0 +1,20 @@
+from server.utils.geohash import decode_geohash, encode_geohash
+
+
+def test_encode_geohash():
+    assert encode_geohash(57.64911, 10.40744, precision=11) == "u4pruydqqvj"
+    assert encode_geohash(50.718410, -3.533899) == "gcj2x"
+    assert encode_geohash(0, 0, precision=1) == "s"
+
+
+def test_nearby_locations_share_a_cell():
+    assert encode_geohash(50.7184, -3.5339) == encode_geohash(50.7240, -3.5275)
+    assert encode_geohash(50.7184, -3.5339) != encode_geohash(51.5074, -0.1278)
+
+
+def test_decode_geohash():
+    lat, long = decode_geohash("u4pruydqqvj")
+
+    assert abs(lat - 57.64911) < 0.0001
+    assert abs(long - 10.40744) < 0.0001
+    assert encode_geohash(*decode_geohash("gcj2x")) == "gcj2x"
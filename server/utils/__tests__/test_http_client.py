@@ -0,0 +1,32 @@
+from pytest_mock import MockerFixture
+
+from server.utils.http_client import close_sessions, get_session, http_get
+
+
+def test_get_session():
+    close_sessions()
+
+    session = get_session("https://example.com/a")
+
+    assert get_session("https://example.com/b?c=d") is session
+    assert get_session("https://example.org/a") is not session
+
+    adapter = session.get_adapter("https://example.com/a")
+    assert adapter.max_retries.total == 2
+
+    close_sessions()
+
+
+def test_http_get(mocker: MockerFixture):
+    close_sessions()
+    mocker.patch("os.environ", {"HTTP_CONNECT_TIMEOUT": "1", "HTTP_READ_TIMEOUT": "2"})
+    session = get_session("https://example.com")
+    session_get = mocker.patch.object(session, "get", autospec=True)
+
+    http_get("https://example.com/path", params={"a": "b"})
+
+    session_get.assert_called_once_with(
+        "https://example.com/path", params={"a": "b"}, timeout=(1.0, 2.0)
+    )
+
+    close_sessions()
@@ -0,0 +1,58 @@
+import random
+import time
+
+import pytest
+
+from server.utils.refresher import Refresher
+
+
+def __wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+
+        time.sleep(0.005)
+
+    return True
+
+
+def test_sources_are_refreshed_on_their_cadence():
+    refresher = Refresher(rng=random.Random(0))
+    runs = {"fast": 0, "slow": 0}
+
+    def refresh_failing():
+        raise ConnectionError()
+
+    refresher.add("fast", lambda: runs.update(fast=runs["fast"] + 1), interval=0.01)
+    refresher.add("slow", lambda: runs.update(slow=runs["slow"] + 1), interval=60)
+    refresher.start()
+    # sources added after the start are refreshed right away
+    refresher.add("failing", refresh_failing, interval=60)
+
+    assert __wait_for(lambda: runs["fast"] >= 3 and runs["slow"] == 1)
+    assert __wait_for(lambda: refresher.stats()["failing"]["failures"] == 1)
+
+    stats = refresher.stats()
+
+    assert stats["slow"]["runs"] == 1
+    assert stats["slow"]["last_refreshed_at"] is not None
+    assert stats["failing"]["last_refreshed_at"] is None
+
+    with pytest.raises(ValueError):
+        refresher.add("fast", lambda: None, interval=1)
+
+
+def test_start():
+    refresher = Refresher()
+    refresher.add("source", lambda: None, interval=60)
+
+    assert not refresher.started
+    assert refresher.stats()["source"]["runs"] == 0
+
+    refresher.start()
+    refresher.start()
+
+    assert refresher.started
+    assert __wait_for(lambda: refresher.stats()["source"]["runs"] == 1)
@@ -0,0 +1,79 @@
+from server.utils.shared_state import SharedState
+
+
+class __MockClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_values(tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    state = SharedState(path)
+    other_process_state = SharedState(path)
+    version = other_process_state.data_version()
+
+    state.put("key", {"value": [1, 2]})
+
+    assert other_process_state.get("key") == {"value": [1, 2]}
+    assert other_process_state.get("missing", "default") == "default"
+    # changes made by this process don't change the data version
+    assert state.data_version() == state.data_version()
+    assert other_process_state.data_version() != version
+
+
+def test_increment(tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    state = SharedState(path)
+    other_process_state = SharedState(path)
+
+    assert state.increment("counter") == 1
+    assert other_process_state.increment("counter") == 2
+    assert state.get("counter") == 2
+
+
+def test_messages(tmp_path):
+    state = SharedState(str(tmp_path / "shared_state.db"), max_messages=2)
+
+    assert state.last_message_id("channel") == 0
+
+    first = state.send("channel", "1")
+    state.send("other channel", "other")
+    second = state.send("channel", "2")
+
+    assert state.receive("channel", 0) == [(first, "1"), (second, "2")]
+    assert state.receive("channel", first) == [(second, "2")]
+    assert state.last_message_id("channel") == second
+
+    third = state.send("channel", "3")
+
+    # only the latest max_messages messages are kept
+    assert state.receive("channel", 0) == [(second, "2"), (third, "3")]
+
+
+def test_lease(tmp_path):
+    path = str(tmp_path / "shared_state.db")
+    clock = __MockClock()
+    state = SharedState(path, clock=clock)
+    other_process_state = SharedState(path, clock=clock)
+
+    assert state.acquire_lease("scheduler", "a", ttl=10)
+    assert not other_process_state.acquire_lease("scheduler", "b", ttl=10)
+
+    clock.now = 9
+    # renewing the lease extends it
+    assert state.acquire_lease("scheduler", "a", ttl=10)
+
+    clock.now = 18
+    assert not other_process_state.acquire_lease("scheduler", "b", ttl=10)
+
+    clock.now = 20
+    # the lease is not renewed in time
+    assert other_process_state.acquire_lease("scheduler", "b", ttl=10)
+    assert not state.acquire_lease("scheduler", "a", ttl=10)
+
+    other_process_state.release_lease("scheduler", "b")
+
+    assert state.acquire_lease("scheduler", "a", ttl=10)
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from server.utils.single_flight import SingleFlight
+
+
+def test_do():
+    flight = SingleFlight()
+
+    assert flight.do("key", lambda: "value") == "value"
+    assert flight.stats() == {"calls": 1, "shared": 0, "in_flight": 0}
+
+
+def test_do_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    call_count = []
+    results = []
+
+    def slow_call():
+        call_count.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return "value"
+
+    leader = threading.Thread(
+        target=lambda: results.append(flight.do("key", slow_call))
+    )
+    leader.start()
+    started.wait(timeout=5)
+
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do("key", slow_call)))
+        for _ in range(5)
+    ]
+    for follower in followers:
+        follower.start()
+
+    # wait until every follower is waiting on the in-flight call
+    while flight.stats()["shared"] < len(followers):
+        threading.Event().wait(0.01)
+
+    release.set()
+    leader.join(timeout=5)
+    for follower in followers:
+        follower.join(timeout=5)
+
+    assert len(call_count) == 1
+    assert results == ["value"] * 6
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_do_shares_exceptions():
+    flight = SingleFlight()
+
+    def failing_call():
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        flight.do("key", failing_call)
+
+    # the failed call is not remembered
+    assert flight.do("key", lambda: "value") == "value"
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from server.utils.sorted_list import SortedList
+
+
+def test_add_keeps_order():
+    items = list(range(1000))
+    random.shuffle(items)
+    sorted_list = SortedList(bucket_size=4)
+
+    for item in items:
+        sorted_list.add(item)
+
+    assert list(sorted_list) == list(range(1000))
+    assert len(sorted_list) == 1000
+    assert sorted_list.first() == 0
+    assert 500 in sorted_list
+    assert 1000 not in sorted_list
+
+
+def test_remove():
+    sorted_list = SortedList(bucket_size=4)
+    for item in range(100):
+        sorted_list.add(item)
+
+    for item in range(0, 100, 2):
+        sorted_list.remove(item)
+
+    assert list(sorted_list) == list(range(1, 100, 2))
+
+    with pytest.raises(ValueError):
+        sorted_list.remove(2)
+
+    with pytest.raises(ValueError):
+        sorted_list.remove(1000)
+
+
+def test_iter_from():
+    sorted_list = SortedList(bucket_size=4)
+    for item in range(0, 100, 10):
+        sorted_list.add(item)
+
+    assert list(sorted_list.iter_from(25)) == [30, 40, 50, 60, 70, 80, 90]
+    assert list(sorted_list.iter_from(30)) == [30, 40, 50, 60, 70, 80, 90]
+    assert not list(sorted_list.iter_from(100))
+    assert SortedList().first() is None
+
+
+def test_update():
+    sorted_list = SortedList(bucket_size=4)
+    for item in range(0, 100, 2):
+        sorted_list.add(item)
+
+    sorted_list.update(range(99, 0, -2))
+    sorted_list.remove(50)
+    sorted_list.add(50)
+
+    assert list(sorted_list) == list(range(100))
+    assert len(sorted_list) == 100
+    assert 51 in sorted_list
+    assert list(sorted_list.iter_from(95)) == [95, 96, 97, 98, 99]
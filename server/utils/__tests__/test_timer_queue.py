@@ -0,0 +1,98 @@
+import threading
+import time
+
+from server.utils.timer_queue import TimerQueue
+
+
+def test_run_in_deadline_order():
+    timer_queue = TimerQueue()
+    fired = []
+    done = threading.Event()
+    now = time.time()
+
+    timer_queue.schedule(now + 0.06, lambda: (fired.append(3), done.set()))
+    timer_queue.schedule(now + 0.02, lambda: fired.append(1))
+    timer_queue.schedule(now + 0.04, lambda: fired.append(2))
+    timer_queue.start()
+
+    assert done.wait(timeout=5)
+    assert fired == [1, 2, 3]
+    assert len(timer_queue) == 0
+
+
+def test_wake_up_for_earlier_timer():
+    timer_queue = TimerQueue()
+    fired = threading.Event()
+
+    timer_queue.schedule(time.time() + 60, lambda: None)
+    timer_queue.start()
+
+    # the runner is already waiting for the timer above
+    timer_queue.schedule(time.time(), fired.set)
+
+    assert fired.wait(timeout=5)
+
+
+def test_cancel():
+    timer_queue = TimerQueue()
+    fired = []
+    done = threading.Event()
+    now = time.time()
+
+    cancelled = timer_queue.schedule(now + 0.01, lambda: fired.append("cancelled"))
+    timer_queue.schedule(now + 0.02, lambda: (fired.append("kept"), done.set()))
+
+    assert timer_queue.cancel(cancelled)
+    assert not timer_queue.cancel(cancelled)
+    assert len(timer_queue) == 1
+
+    timer_queue.start()
+
+    assert done.wait(timeout=5)
+    assert fired == ["kept"]
+
+
+def test_failing_callback_does_not_stop_runner():
+    timer_queue = TimerQueue()
+    fired = threading.Event()
+
+    def failing_callback():
+        raise ValueError()
+
+    timer_queue.schedule(time.time(), failing_callback)
+    timer_queue.schedule(time.time(), fired.set)
+    timer_queue.start()
+
+    assert fired.wait(timeout=5)
+
+
+def test_many_timers():
+    timer_queue = TimerQueue()
+    far_future = time.time() + 3600
+
+    timers = [timer_queue.schedule(far_future + i, lambda: None) for i in range(50000)]
+    for timer in timers[::2]:
+        timer_queue.cancel(timer)
+
+    assert len(timer_queue) == 25000
+
+
+def test_schedule_many():
+    timer_queue = TimerQueue()
+    fired = []
+    done = threading.Event()
+    now = time.time()
+
+    timer_queue.schedule(now + 0.04, fired.append, (3,))
+    timers = timer_queue.schedule_many(
+        [
+            (now + 0.06, lambda: (fired.append(4), done.set()), ()),
+            (now + 0.02, fired.append, (1,)),
+            (now + 0.03, fired.append, (2,)),
+        ]
+    )
+    timer_queue.start()
+
+    assert [timer.deadline for timer in timers] == [now + 0.06, now + 0.02, now + 0.03]
+    assert done.wait(timeout=5)
+    assert fired == [1, 2, 3, 4]
@@ -0,0 +1,156 @@
+"""
+Helpers for caching results of slow upstream calls
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Hashable, Set, Tuple
+
+from server.utils.logger import log_exception
+
+
+class TTLCache:
+    """
+    A keyed cache whose entries expire after a time-to-live (TTL).
+
+    Entries older than the TTL but younger than ttl + stale_ttl are still served
+    (stale-while-revalidate), while a single background thread refreshes them.
+    Entries older than that are treated as missing and are loaded synchronously.
+    When max_size is given, the least recently used entries are evicted to stay within it.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        stale_ttl: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+        max_size: int = None,
+    ):
+        """
+        :params ttl: Number of seconds an entry is considered fresh.
+        :params stale_ttl: Number of seconds after the ttl during which a stale entry
+        is still served while it is refreshed in the background.
+        :params clock: The function used to tell the current time, in seconds.
+        :params max_size: The maximum number of entries. Unbounded when not given.
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.__clock = clock
+        self.__lock = Lock()
+        # maps a key to a tuple of (time when the value is stored, value),
+        # least recently used first
+        self.__entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # keys that are currently refreshed by a background thread
+        self.__refreshing: Set[Hashable] = set()
+        self.__stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refresh_errors": 0}
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value of the given key, calling loader to fill the cache if needed.
+
+        :params key: The key of the cached value.
+        :params loader: A function that fetches a new value for the key.
+        :returns: The cached value, which may be stale.
+        :raises Exception: Any exception raised by loader when there is no usable cached value.
+        """
+        now = self.__clock()
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            age = now - entry[0] if entry else None
+
+            if entry:
+                self.__entries.move_to_end(key)
+
+            if entry and age < self.ttl:
+                self.__stats["hits"] += 1
+                return entry[1]
+
+            if entry and age < self.ttl + self.stale_ttl:
+                self.__stats["stale_hits"] += 1
+                should_refresh = key not in self.__refreshing
+                if should_refresh:
+                    self.__refreshing.add(key)
+            else:
+                self.__stats["misses"] += 1
+                entry = None
+
+        if entry:
+            if should_refresh:
+                Thread(target=self.__refresh, args=(key, loader), daemon=True).start()
+            return entry[1]
+
+        value = loader()
+        self.put(key, value)
+
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Stores the given value under the given key, resetting its age.
+        """
+        with self.__lock:
+            self.__entries[key] = (self.__clock(), value)
+            self.__entries.move_to_end(key)
+
+            while self.max_size is not None and len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def age(self, key: Hashable) -> float:
+        """
+        Returns the number of seconds since the value of the given key was stored,
+        or None if it is not cached.
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+        return self.__clock() - entry[0] if entry else None
+
+    def invalidate(self, key: Hashable):
+        """
+        Removes the cached value of the given key, if any.
+        """
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every cached value and resets the counters.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            for counter in self.__stats:
+                self.__stats[counter] = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit/miss counters of this cache in the shape of:
+        {
+            "hits": number of fresh values served,
+            "stale_hits": number of stale values served,
+            "misses": number of values loaded synchronously,
+            "refresh_errors": number of failed background refreshes,
+            "size": number of cached values,
+        }
+        """
+        with self.__lock:
+            return {**self.__stats, "size": len(self.__entries)}
+
+    def __refresh(self, key: Hashable, loader: Callable[[], Any]):
+        """
+        Reloads the value of the given key. Runs in a background thread.
+        The stale value is kept when loader raises.
+        """
+        try:
+            self.put(key, loader())
+            logging.info("Cache entry %s refreshed in the background.", key)
+        except Exception as refresh_exception:  # pylint: disable=broad-except
+            with self.__lock:
+                self.__stats["refresh_errors"] += 1
+            log_exception(method="TTLCache > __refresh", exception=refresh_exception)
+        finally:
+            with self.__lock:
+                self.__refreshing.discard(key)
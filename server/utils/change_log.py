@@ -0,0 +1,154 @@
+"""
+A log of changes to a keyed collection, so clients can ask what changed since they last looked.
+
+Every change bumps the generation of the log. Clients remember the generation they have seen,
+and later get the keys changed or removed after it, instead of the whole collection.
+
+When server processes mirror a collection from shared state, each of them has its own log,
+so clients remember the version of the shared state instead. VersionMarks maps it back
+to the generation of the log of a process.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, List, Optional, Tuple
+
+
+class ChangeLog:
+    """
+    Records the latest change of every key, for at most max_size keys.
+    When more keys have changed, the oldest changes are forgotten, and clients that
+    last looked before them have to fetch the whole collection again.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        """
+        :params max_size: The maximum number of keys whose latest change is remembered.
+        """
+        self.max_size = max_size
+        self.__lock = Lock()
+        # A map of keys to (generation of their latest change, whether they are removed),
+        # oldest change first
+        self.__changes: "OrderedDict[Hashable, Tuple[int, bool]]" = OrderedDict()
+        self.__generation = 0
+        # changes made up to this generation are forgotten
+        self.__horizon = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        The generation of the latest change. It is 0 before any change.
+        """
+        return self.__generation
+
+    def record(self, key: Hashable, removed: bool = False) -> int:
+        """
+        Records that a key is added, updated or removed.
+
+        :returns: The generation of the change.
+        """
+        with self.__lock:
+            self.__generation += 1
+            self.__changes[key] = (self.__generation, removed)
+            self.__changes.move_to_end(key)
+
+            while len(self.__changes) > self.max_size:
+                _, (generation, _) = self.__changes.popitem(last=False)
+                self.__horizon = generation
+
+            return self.__generation
+
+    def record_many(self, keys: List[Hashable]) -> int:
+        """
+        Records that distinct keys are added or updated, like calling record for each of them.
+        Changes that would be forgotten right away are skipped instead of being recorded.
+
+        :returns: The generation of the latest change.
+        """
+        with self.__lock:
+            first_generation = self.__generation + 1
+            self.__generation += len(keys)
+            # only the latest max_size changes are remembered
+            skipped_count = max(len(keys) - self.max_size, 0)
+
+            for generation, key in enumerate(
+                keys[skipped_count:], first_generation + skipped_count
+            ):
+                self.__changes[key] = (generation, False)
+                self.__changes.move_to_end(key)
+
+            while len(self.__changes) > self.max_size:
+                _, (generation, _) = self.__changes.popitem(last=False)
+                self.__horizon = generation
+
+            if skipped_count:
+                self.__horizon = max(
+                    self.__horizon, first_generation + skipped_count - 1
+                )
+
+            return self.__generation
+
+    def changes_since(
+        self, generation: int
+    ) -> Optional[Tuple[List[Hashable], List[Hashable]]]:
+        """
+        Returns the keys changed after the given generation.
+
+        :params generation: A generation returned by this log.
+        :returns: A tuple of (keys added or updated, keys removed), oldest change first,
+        or None if changes made after the given generation are forgotten, or if the generation
+        is newer than this log, e.g. when it was returned before the server restarted.
+        """
+        with self.__lock:
+            if generation < self.__horizon or generation > self.__generation:
+                return None
+
+            updated, removed = [], []
+
+            for key, (change_generation, is_removal) in reversed(
+                self.__changes.items()
+            ):
+                if change_generation <= generation:
+                    break
+
+                (removed if is_removal else updated).append(key)
+
+            return updated[::-1], removed[::-1]
+
+
+class VersionMarks:
+    """
+    Remembers the generation of a change log at which a process showed each version
+    of a collection shared by server processes, for at most max_size versions.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        """
+        :params max_size: The maximum number of versions remembered.
+        """
+        self.max_size = max_size
+        self.__lock = Lock()
+        # A map of versions to the generation they were shown at, oldest version first
+        self.__generations: "OrderedDict[int, int]" = OrderedDict()
+
+    def mark(self, version: int, generation: int):
+        """
+        Records that the collection is shown as of the given version at the given generation.
+        A version shown again at a later generation keeps the generation it was first shown at.
+        """
+        with self.__lock:
+            if version in self.__generations:
+                return
+
+            self.__generations[version] = generation
+
+            while len(self.__generations) > self.max_size:
+                self.__generations.popitem(last=False)
+
+    def generation(self, version: int) -> Optional[int]:
+        """
+        Returns the generation the given version was first shown at,
+        or None if it is not shown by this process or forgotten.
+        """
+        with self.__lock:
+            return self.__generations.get(version)
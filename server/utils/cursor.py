@@ -0,0 +1,32 @@
+"""
+Helpers for pagination cursors.
+
+A cursor is an opaque string that tells where the next page of a list starts.
+It encodes a JSON value, so clients don't depend on how positions are represented.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any
+
+
+def encode_cursor(position: Any) -> str:
+    """
+    Encodes a position in a list as a cursor.
+
+    :params position: A JSON serializable value, like the key of the last item of a page.
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Any:
+    """
+    Decodes a cursor made by encode_cursor.
+
+    :raises ValueError: The cursor is not made by encode_cursor.
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as decode_error:
+        raise ValueError(f"Invalid cursor: {cursor}") from decode_error
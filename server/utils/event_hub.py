@@ -0,0 +1,145 @@
+"""
+A publish/subscribe hub fanning events out to many slow consumers, like open event streams.
+
+Publishing never blocks: every subscriber has a bounded queue of pending events.
+A subscriber that falls too far behind is dropped instead of holding up the others,
+and is handed a final reset event, so it knows it has missed events.
+"""
+
+from collections import deque
+from threading import Condition, Lock
+from typing import Any, Deque, Optional, Set
+
+
+class Subscription:
+    """
+    The pending events of one subscriber of an EventHub, oldest first.
+    """
+
+    def __init__(self, max_pending: int, reset_event: Any):
+        """
+        :params max_pending: The maximum number of events waiting to be consumed.
+        :params reset_event: The event handed to the subscriber when it falls behind.
+        """
+        self.max_pending = max_pending
+        self.__reset_event = reset_event
+        self.__condition = Condition()
+        self.__pending: Deque[Any] = deque()
+        self.__overflowed = False
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the subscription is dropped and every pending event is consumed.
+        """
+        with self.__condition:
+            return self.__overflowed and not self.__pending
+
+    def next_event(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        Waits for the next event.
+
+        :params timeout: The maximum number of seconds to wait, or None to wait forever.
+        :returns: The next event, or None if no event comes in time
+        or the subscription is closed.
+        """
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: self.__pending or self.__overflowed, timeout
+            )
+
+            return self.__pending.popleft() if self.__pending else None
+
+    def put(self, event: Any) -> bool:
+        """
+        Queues an event. When the queue is full, the pending events are dropped
+        and replaced by the reset event, and no more events are accepted.
+
+        :returns: Whether the event is queued.
+        """
+        with self.__condition:
+            if self.__overflowed:
+                return False
+
+            if len(self.__pending) >= self.max_pending:
+                self.__overflowed = True
+                self.__pending.clear()
+                self.__pending.append(self.__reset_event)
+            else:
+                self.__pending.append(event)
+
+            self.__condition.notify_all()
+
+            return not self.__overflowed
+
+
+class EventHub:
+    """
+    Hands every published event to every subscriber.
+    """
+
+    def __init__(self, max_pending: int = 100, reset_event: Any = None):
+        """
+        :params max_pending: The maximum number of events a subscriber can fall behind by
+        before it is dropped.
+        :params reset_event: The event handed to dropped subscribers.
+        """
+        self.max_pending = max_pending
+        self.__reset_event = reset_event
+        self.__lock = Lock()
+        self.__subscriptions: Set[Subscription] = set()
+        self.__dropped_count = 0
+
+    def __len__(self) -> int:
+        """
+        Returns the number of subscribers.
+        """
+        with self.__lock:
+            return len(self.__subscriptions)
+
+    @property
+    def dropped_count(self) -> int:
+        """
+        The number of subscribers dropped for falling behind.
+        """
+        return self.__dropped_count
+
+    def subscribe(self) -> Subscription:
+        """
+        Subscribes to the events published from now on.
+        """
+        subscription = Subscription(self.max_pending, self.__reset_event)
+
+        with self.__lock:
+            self.__subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        Stops handing events to a subscription. Does nothing if it is already dropped.
+        """
+        with self.__lock:
+            self.__subscriptions.discard(subscription)
+
+    def publish(self, event: Any) -> int:
+        """
+        Hands an event to every subscriber, dropping the ones that fell behind.
+
+        :returns: The number of subscribers the event is handed to.
+        """
+        with self.__lock:
+            subscriptions = list(self.__subscriptions)
+
+        dropped = [
+            subscription
+            for subscription in subscriptions
+            if not subscription.put(event)
+        ]
+
+        if dropped:
+            with self.__lock:
+                self.__subscriptions.difference_update(dropped)
+                self.__dropped_count += len(dropped)
+
+        return len(subscriptions) - len(dropped)
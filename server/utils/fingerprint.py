@@ -0,0 +1,156 @@
+"""
+Helpers for identifying and deduplicating pieces of text, like news headlines.
+
+content_fingerprint gives the same id to texts that only differ in case and whitespace.
+simhash gives similar sketches to texts sharing most of their words, so reworded
+copies of the same headline can be found with DedupIndex.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Dict, Hashable, Set, Tuple
+
+# Number of bits in a simhash sketch
+SIMHASH_BITS = 64
+
+# Sketches are split into this many bands to find near-duplicates.
+# Two sketches within (__BANDS - 1) bits of each other share at least one band.
+__BANDS = 8
+
+__BAND_BITS = SIMHASH_BITS // __BANDS
+
+__WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """
+    Lower cases the text and collapses whitespace, so formatting doesn't change fingerprints.
+    """
+    return " ".join(text.lower().split())
+
+
+def content_fingerprint(*texts: str) -> str:
+    """
+    Calculates a stable 64-bit fingerprint of the given texts.
+    Unlike hash(), fingerprints are the same across processes and restarts.
+
+    :params texts: The texts to fingerprint, e.g. the title and the description of a headline.
+    :returns: The fingerprint as a 16-digit hexadecimal string.
+    """
+    hasher = hashlib.blake2b(digest_size=8)
+
+    for text in texts:
+        hasher.update(normalize(text).encode())
+        # separates texts, so ("ab", "c") and ("a", "bc") have different fingerprints
+        hasher.update(b"\x00")
+
+    return hasher.hexdigest()
+
+
+def simhash(text: str) -> int:
+    """
+    Calculates the SimHash sketch of the words of the given text.
+    Texts sharing most of their words have sketches differing in only a few bits.
+
+    :params text: The text to sketch.
+    :returns: A SIMHASH_BITS-bit sketch.
+    """
+    weights = [0] * SIMHASH_BITS
+
+    for word in __WORD_PATTERN.findall(text.lower()):
+        word_hash = int.from_bytes(
+            hashlib.blake2b(word.encode(), digest_size=SIMHASH_BITS // 8).digest(),
+            "big",
+        )
+
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if word_hash >> bit & 1 else -1
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(sketch: int, other_sketch: int) -> int:
+    """
+    Returns the number of bits two sketches differ in.
+    """
+    return bin(sketch ^ other_sketch).count("1")
+
+
+def sketch_bands(sketch: int) -> Tuple[Tuple[int, int], ...]:
+    """
+    Splits a sketch into bands. Sketches sharing a band are candidates for near-duplicates.
+    """
+    band_mask = (1 << __BAND_BITS) - 1
+
+    return tuple(
+        (band, sketch >> (band * __BAND_BITS) & band_mask) for band in range(__BANDS)
+    )
+
+
+class DedupIndex:
+    """
+    A bounded index of sketches, to find entries whose text is a near-duplicate
+    of an indexed one. The least recently added entries are evicted first.
+    """
+
+    def __init__(self, max_size: int = 10000, max_distance: int = 6):
+        """
+        :params max_size: The maximum number of entries kept in the index.
+        :params max_distance: The maximum number of bits near-duplicate sketches differ in.
+        Headlines are short, so rewording one changes more bits than in longer texts.
+        It is capped below the number of bands, so near-duplicates are always found.
+        """
+        self.max_size = max_size
+        self.max_distance = min(max_distance, len(sketch_bands(0)) - 1)
+        # A map of entry keys to their sketch, least recently added first
+        self.__sketches: "OrderedDict[Hashable, int]" = OrderedDict()
+        # A map of sketch bands to the keys of entries having that band
+        self.__bands: Dict[Tuple[int, int], Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__sketches)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__sketches
+
+    def add(self, key: Hashable, sketch: int):
+        """
+        Indexes an entry, evicting the oldest entry if the index is full.
+
+        :params key: Identifies the entry, e.g. the id of a headline.
+        :params sketch: The simhash of the text of the entry.
+        """
+        if key in self.__sketches:
+            self.__remove(key)
+
+        self.__sketches[key] = sketch
+        for band in sketch_bands(sketch):
+            self.__bands.setdefault(band, set()).add(key)
+
+        while len(self.__sketches) > self.max_size:
+            self.__remove(next(iter(self.__sketches)))
+
+    def find_near_duplicate(self, sketch: int) -> Hashable:
+        """
+        Finds an indexed entry whose sketch is within max_distance bits of the given sketch.
+
+        :params sketch: The simhash of the text to look up.
+        :returns: The key of a near-duplicate entry, or None if there is none.
+        """
+        for band in sketch_bands(sketch):
+            for key in self.__bands.get(band, ()):
+                if hamming_distance(sketch, self.__sketches[key]) <= self.max_distance:
+                    return key
+
+        return None
+
+    def __remove(self, key: Hashable):
+        sketch = self.__sketches.pop(key)
+
+        for band in sketch_bands(sketch):
+            keys = self.__bands[band]
+            keys.discard(key)
+
+            if not keys:
+                del self.__bands[band]
@@ -0,0 +1,74 @@
+"""
+Geohash encoding of coordinates.
+
+A geohash names a rectangular cell of the map. Every extra character splits a cell
+into 32 smaller cells, so nearby locations share the same geohash at a given precision,
+e.g. cells are about 4.9km wide with 5 characters and 1.2km wide with 6.
+"""
+
+from typing import Tuple
+
+__BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode_geohash(lat: float, long: float, precision: int = 5) -> str:
+    """
+    Returns the geohash of the cell containing the given location.
+
+    :params lat: The latitude of the location, between -90 and 90.
+    :params long: The longitude of the location, between -180 and 180.
+    :params precision: The number of characters of the geohash.
+    """
+    lat_range = [-90.0, 90.0]
+    long_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    # bits alternate between longitude and latitude, starting with longitude
+    is_long_bit = True
+
+    while len(geohash) < precision:
+        value, value_range = (long, long_range) if is_long_bit else (lat, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+
+        if value >= middle:
+            bits = bits << 1 | 1
+            value_range[0] = middle
+        else:
+            bits <<= 1
+            value_range[1] = middle
+
+        is_long_bit = not is_long_bit
+        bit_count += 1
+
+        if bit_count == 5:
+            geohash.append(__BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def decode_geohash(geohash: str) -> Tuple[float, float]:
+    """
+    Returns the (latitude, longitude) of the center of the cell with the given geohash.
+
+    :raises ValueError: The geohash contains a character that is not used by geohashes.
+    """
+    lat_range = [-90.0, 90.0]
+    long_range = [-180.0, 180.0]
+    is_long_bit = True
+
+    for character in geohash:
+        bits = __BASE32.index(character)
+
+        for shift in range(4, -1, -1):
+            value_range = long_range if is_long_bit else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            value_range[0 if bits >> shift & 1 else 1] = middle
+            is_long_bit = not is_long_bit
+
+    return (
+        (lat_range[0] + lat_range[1]) / 2,
+        (long_range[0] + long_range[1]) / 2,
+    )
@@ -0,0 +1,100 @@
+"""
+A shared HTTP client for calling external apis.
+
+Each host gets its own requests.Session, so connections are pooled and kept alive
+between calls instead of paying for a new TCP connection and TLS handshake every time.
+Every request has connect and read timeouts, and failed requests are retried with backoff.
+
+The client can be configured in config.json:
+- http_connect_timeout: seconds to wait for a connection to be established
+- http_read_timeout: seconds to wait for the server to send a response
+- http_max_retries: number of times a failed request is retried
+- http_backoff_factor: base number of seconds to back off between retries
+- http_pool_size: number of connections kept alive per host
+"""
+
+import os
+from threading import Lock
+from typing import Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Responses with these status codes are retried
+__RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# A map of hosts (scheme://host:port) to the session connecting to the host
+__sessions: Dict[str, requests.Session] = {}
+
+__sessions_lock = Lock()
+
+
+def http_get(url: str, params: Dict[str, Any] = None) -> requests.Response:
+    """
+    Sends a GET request through the pooled session of the host of the given url.
+
+    :params url: The url to send the request to.
+    :params params: The query parameters of the request.
+    :returns: The response of the request.
+    :raises requests.RequestException: The request failed after all retries,
+    or it has timed out.
+    """
+    return get_session(url).get(
+        url,
+        params=params,
+        timeout=(
+            float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05)),
+            float(os.environ.get("HTTP_READ_TIMEOUT", 10)),
+        ),
+    )
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    Returns the session of the host of the given url, creating it if it doesn't exist yet.
+
+    :params url: A url on the host.
+    :returns: The pooled session connecting to the host.
+    """
+    url_parts = urlsplit(url)
+    host = f"{url_parts.scheme}://{url_parts.netloc}"
+
+    with __sessions_lock:
+        if host not in __sessions:
+            __sessions[host] = __create_session(host)
+
+        return __sessions[host]
+
+
+def close_sessions():
+    """
+    Closes every pooled session and the connections kept alive by them.
+    """
+    with __sessions_lock:
+        for session in __sessions.values():
+            session.close()
+
+        __sessions.clear()
+
+
+def __create_session(host: str) -> requests.Session:
+    """
+    Creates a session with connection pooling and retries mounted on the given host.
+    """
+    pool_size = int(os.environ.get("HTTP_POOL_SIZE", 10))
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=int(os.environ.get("HTTP_MAX_RETRIES", 2)),
+            backoff_factor=float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.3)),
+            status_forcelist=__RETRY_STATUSES,
+        ),
+    )
+
+    session = requests.Session()
+    session.mount(host, adapter)
+
+    return session
@@ -0,0 +1,174 @@
+"""
+A background service refreshing upstream data, each source on its own cadence.
+
+Refreshes are scheduled on a TimerQueue and run on a small thread pool,
+so a slow source doesn't hold up the others. A source is refreshed again only after
+its previous refresh is done, and intervals are jittered, so sources refreshed
+at the same cadence don't hit their apis in lockstep.
+"""
+
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict
+
+from server.utils.logger import log_exception
+from server.utils.timer_queue import TimerQueue
+
+
+# pylint: disable=too-few-public-methods
+class _RefreshTask:
+    """
+    A source refreshed by a Refresher, and the stats of its refreshes.
+    """
+
+    def __init__(self, refresh: Callable[[], None], interval: float, jitter: float):
+        self.refresh = refresh
+        self.interval = interval
+        self.jitter = jitter
+        self.runs = 0
+        self.failures = 0
+        self.last_refreshed_at: float = None
+        self.last_duration: float = None
+
+
+class Refresher:
+    """
+    Refreshes registered sources in the background until the process exits.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        clock: Callable[[], float] = time.time,
+        rng: random.Random = None,
+    ):
+        """
+        :params max_workers: The maximum number of sources refreshed at the same time.
+        :params clock: The function used to tell the current time, in seconds.
+        :params rng: The random number generator used to jitter intervals.
+        """
+        self.__clock = clock
+        self.__rng = rng or random.Random()
+        self.__timer_queue = TimerQueue(clock=clock)
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="refresher"
+        )
+        self.__lock = Lock()
+        self.__tasks: Dict[str, _RefreshTask] = {}
+        self.__started = False
+
+    @property
+    def started(self) -> bool:
+        """
+        Whether the refresher is started.
+        """
+        return self.__started
+
+    def add(
+        self,
+        name: str,
+        refresh: Callable[[], None],
+        interval: float,
+        jitter: float = 0.1,
+    ):
+        """
+        Registers a source. Sources added after the refresher is started
+        are refreshed right away.
+
+        :params name: The name of the source, which must be unique.
+        :params refresh: The function refreshing the source.
+        :params interval: The number of seconds between the end of a refresh and the next one.
+        :params jitter: The fraction of the interval it is randomly lengthened or shortened by.
+        :raises ValueError: A source with the same name is already registered.
+        """
+        with self.__lock:
+            if name in self.__tasks:
+                raise ValueError(f"A source named {name} is already registered.")
+
+            task = _RefreshTask(refresh, interval, jitter)
+            self.__tasks[name] = task
+
+            if self.__started:
+                self.__schedule(name, task, delay=0)
+
+    def start(self):
+        """
+        Refreshes every source right away, then on its cadence.
+        Does nothing if the refresher is already started.
+        """
+        with self.__lock:
+            if self.__started:
+                return
+
+            self.__started = True
+
+            for name, task in self.__tasks.items():
+                self.__schedule(name, task, delay=0)
+
+        self.__timer_queue.start()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns stats of the refreshes of every source in the shape of:
+        {
+            "source name": {
+                "runs": number of refreshes so far,
+                "failures": number of refreshes that raised an exception,
+                "last_refreshed_at": the time the last successful refresh ended, or None,
+                "last_duration": seconds the last refresh took, or None,
+            },
+        }
+        """
+        with self.__lock:
+            return {
+                name: {
+                    "runs": task.runs,
+                    "failures": task.failures,
+                    "last_refreshed_at": task.last_refreshed_at,
+                    "last_duration": task.last_duration,
+                }
+                for name, task in self.__tasks.items()
+            }
+
+    def __schedule(self, name: str, task: _RefreshTask, delay: float):
+        """
+        Schedules the next refresh of a source.
+        """
+        self.__timer_queue.schedule(
+            self.__clock() + delay,
+            lambda: self.__executor.submit(self.__run, name, task),
+        )
+
+    def __run(self, name: str, task: _RefreshTask):
+        """
+        Refreshes a source, records the stats of the refresh and schedules the next one.
+        Runs on the thread pool.
+        """
+        started_at = self.__clock()
+
+        try:
+            task.refresh()
+            succeeded = True
+        except Exception as refresh_exception:  # pylint: disable=broad-except
+            succeeded = False
+            log_exception(
+                method=f"Refresher > __run ({name})", exception=refresh_exception
+            )
+
+        finished_at = self.__clock()
+
+        with self.__lock:
+            task.runs += 1
+            task.last_duration = finished_at - started_at
+
+            if succeeded:
+                task.last_refreshed_at = finished_at
+            else:
+                task.failures += 1
+
+        delay = task.interval * (1 + self.__rng.uniform(-task.jitter, task.jitter))
+        logging.debug("Refreshed %s. The next refresh is in %.0fs.", name, delay)
+        self.__schedule(name, task, delay)
@@ -0,0 +1,208 @@
+"""
+State shared by server processes running on the same machine, like gunicorn workers.
+
+The state is kept in a SQLite database in WAL mode, so readers in one process never block
+writers in another. It holds json values by key, channels of messages sent from
+one process to the others, and leases electing a single process for a job.
+Processes find out cheaply whether anything changed with data_version.
+"""
+
+import json
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Callable, List, Tuple
+
+
+class SharedState:
+    """
+    A connection to the state shared by server processes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_messages: int = 1000,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :params path: Path to the database file, which every process must use.
+        :params max_messages: The number of latest messages kept in every channel.
+        :params clock: The function used to tell the current time, in seconds.
+        It must agree between processes.
+        """
+        self.max_messages = max_messages
+        self.__clock = clock
+        # the connection is shared by request threads and background threads
+        self.__connection = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.__lock = Lock()
+
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS shared_values (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """)
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    value TEXT NOT NULL
+                )
+                """)
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS messages_by_channel ON messages (channel, id)"
+            )
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """)
+
+    def data_version(self) -> int:
+        """
+        Returns a number that changes whenever another process changes the shared state.
+        Changes made through this connection don't change it.
+        """
+        with self.__lock:
+            return self.__connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def put(self, key: str, value: Any):
+        """
+        Stores a json serializable value under the given key, replacing the stored value.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO shared_values VALUES (?, ?)",
+                (key, json.dumps(value)),
+            )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Returns the value stored under the given key, or default if nothing is stored.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT value FROM shared_values WHERE key = ?", (key,)
+            ).fetchone()
+
+        return json.loads(row[0]) if row else default
+
+    def increment(self, key: str) -> int:
+        """
+        Adds one to the number stored under the given key, which starts from 0,
+        in a single transaction, so increments made by several processes at once are never lost.
+
+        :returns: The incremented number.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT INTO shared_values VALUES (?, '1') "
+                "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1",
+                (key,),
+            )
+
+            return json.loads(
+                self.__connection.execute(
+                    "SELECT value FROM shared_values WHERE key = ?", (key,)
+                ).fetchone()[0]
+            )
+
+    def send(self, channel: str, value: Any) -> int:
+        """
+        Sends a json serializable message to every process receiving from the channel.
+        Only the max_messages latest messages of a channel are kept.
+
+        :returns: The ID of the message. IDs grow in the order messages are sent.
+        """
+        with self.__lock, self.__connection:
+            message_id = self.__connection.execute(
+                "INSERT INTO messages (channel, value) VALUES (?, ?)",
+                (channel, json.dumps(value)),
+            ).lastrowid
+            self.__connection.execute(
+                """
+                DELETE FROM messages WHERE channel = ? AND id <= (
+                    SELECT id FROM messages WHERE channel = ?
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (channel, channel, self.max_messages),
+            )
+
+            return message_id
+
+    def receive(self, channel: str, after: int) -> List[Tuple[int, Any]]:
+        """
+        Returns the messages sent to a channel after the message with the given ID.
+
+        :params after: The ID of the last message received, or 0 for every kept message.
+        :returns: A list of (message ID, message), oldest first.
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT id, value FROM messages WHERE channel = ? AND id > ? ORDER BY id",
+                (channel, after),
+            ).fetchall()
+
+        return [(message_id, json.loads(value)) for message_id, value in rows]
+
+    def last_message_id(self, channel: str) -> int:
+        """
+        Returns the ID of the latest message sent to a channel, or 0 if there is none,
+        so a process can start receiving the messages sent from now on.
+        """
+        with self.__lock:
+            return self.__connection.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM messages WHERE channel = ?",
+                (channel,),
+            ).fetchone()[0]
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Acquires or renews a lease, which is held by at most one owner at a time.
+        A lease that is not renewed within its ttl can be acquired by another owner.
+
+        :params name: The name of the lease.
+        :params owner: Identifies the process asking for the lease.
+        :params ttl: The number of seconds the lease is held for.
+        :returns: Whether the owner holds the lease.
+        """
+        now = self.__clock()
+
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                """
+                INSERT INTO leases VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+                """,
+                (name, owner, now + ttl, now),
+            )
+            holder = self.__connection.execute(
+                "SELECT owner FROM leases WHERE name = ?", (name,)
+            ).fetchone()[0]
+
+        return holder == owner
+
+    def release_lease(self, name: str, owner: str):
+        """
+        Gives up a lease, if the owner holds it, so another owner can acquire it right away.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)
+            )
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self.__lock:
+            self.__connection.close()
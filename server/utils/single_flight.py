@@ -0,0 +1,84 @@
+"""
+Helpers for coalescing concurrent identical calls to slow upstream apis
+"""
+
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable
+
+
+# pylint: disable=too-few-public-methods
+class _InFlightCall:
+    """
+    An in-flight call whose result is shared by every caller waiting on it.
+    """
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Any = None
+        self.exception: Exception = None
+        # number of callers sharing this call, including the one running it
+        self.callers = 1
+
+
+class SingleFlight:
+    """
+    Makes sure only one call per key is in flight at a time.
+    Callers asking for a key that is already being fetched wait for that call
+    and share its result (or its exception) instead of making their own.
+    """
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__calls: Dict[Hashable, _InFlightCall] = {}
+        self.__stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Runs func, unless a call with the same key is already in flight,
+        in which case the result of that call is returned.
+
+        :params key: Identifies calls that are interchangeable with each other.
+        :params func: The function that makes the call.
+        :returns: The result of func.
+        :raises Exception: Any exception raised by func.
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+
+            if call:
+                call.callers += 1
+                self.__stats["shared"] += 1
+                is_leader = False
+            else:
+                call = self.__calls[key] = _InFlightCall()
+                self.__stats["calls"] += 1
+                is_leader = True
+
+        if is_leader:
+            try:
+                call.result = func()
+            except Exception as call_exception:  # pylint: disable=broad-except
+                call.exception = call_exception
+            finally:
+                with self.__lock:
+                    self.__calls.pop(key, None)
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.exception:
+            raise call.exception
+
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the counters of this SingleFlight in the shape of:
+        {
+            "calls": number of calls actually made,
+            "shared": number of callers that shared an in-flight call,
+            "in_flight": number of calls currently in flight,
+        }
+        """
+        with self.__lock:
+            return {**self.__stats, "in_flight": len(self.__calls)}
@@ -0,0 +1,148 @@
+"""
+A sorted list with logarithmic inserts and removals.
+
+Items are kept in sorted buckets of bounded size, with an index of the largest item
+of every bucket. Finding a bucket is a binary search over that index, and inserting
+into or removing from a bucket only moves the items of that bucket, so the cost
+doesn't grow with the total number of items like it does for a single Python list.
+"""
+
+import bisect
+from typing import Any, Iterable, Iterator, List
+
+# The default preferred number of items in a bucket.
+# Buckets are split when they grow beyond twice this size.
+DEFAULT_BUCKET_SIZE = 512
+
+
+class SortedList:
+    """
+    A list of comparable items that is always sorted. Items must be unique.
+    """
+
+    def __init__(self, bucket_size: int = DEFAULT_BUCKET_SIZE):
+        """
+        :params bucket_size: The preferred number of items in a bucket.
+        """
+        self.__bucket_size = bucket_size
+        self.__buckets: List[List[Any]] = []
+        # the largest item of each bucket
+        self.__maxes: List[Any] = []
+        self.__length = 0
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __iter__(self) -> Iterator[Any]:
+        for bucket in self.__buckets:
+            yield from bucket
+
+    def __contains__(self, item: Any) -> bool:
+        index = bisect.bisect_left(self.__maxes, item)
+
+        if index == len(self.__maxes):
+            return False
+
+        bucket = self.__buckets[index]
+        position = bisect.bisect_left(bucket, item)
+
+        return position < len(bucket) and bucket[position] == item
+
+    def add(self, item: Any):
+        """
+        Inserts an item at its sorted position.
+        """
+        if not self.__buckets:
+            self.__buckets.append([item])
+            self.__maxes.append(item)
+            self.__length += 1
+            return
+
+        index = bisect.bisect_left(self.__maxes, item)
+
+        if index == len(self.__maxes):
+            # the item is larger than every item, so it goes at the end of the last bucket
+            index -= 1
+            self.__buckets[index].append(item)
+            self.__maxes[index] = item
+        else:
+            bisect.insort(self.__buckets[index], item)
+
+        self.__length += 1
+
+        if len(self.__buckets[index]) > 2 * self.__bucket_size:
+            self.__split(index)
+
+    def update(self, items: Iterable[Any]):
+        """
+        Inserts many items at once. The items are sorted together with the current ones
+        and the buckets are rebuilt, which is much faster than adding them one by one.
+        """
+        merged = list(self)
+        merged.extend(items)
+        # sorting is close to linear when the new items are mostly in order
+        merged.sort()
+        size = self.__bucket_size
+
+        self.__buckets = [
+            merged[start : start + size] for start in range(0, len(merged), size)
+        ]
+        self.__maxes = [bucket[-1] for bucket in self.__buckets]
+        self.__length = len(merged)
+
+    def remove(self, item: Any):
+        """
+        Removes an item.
+
+        :raises ValueError: The item is not in the list.
+        """
+        index = bisect.bisect_left(self.__maxes, item)
+
+        if index == len(self.__maxes):
+            raise ValueError(f"{item} is not in the list")
+
+        bucket = self.__buckets[index]
+        position = bisect.bisect_left(bucket, item)
+
+        if position == len(bucket) or bucket[position] != item:
+            raise ValueError(f"{item} is not in the list")
+
+        del bucket[position]
+        self.__length -= 1
+
+        if not bucket:
+            del self.__buckets[index]
+            del self.__maxes[index]
+        elif position == len(bucket):
+            self.__maxes[index] = bucket[-1]
+
+    def first(self) -> Any:
+        """
+        Returns the smallest item, or None if the list is empty.
+        """
+        return self.__buckets[0][0] if self.__buckets else None
+
+    def iter_from(self, minimum: Any) -> Iterator[Any]:
+        """
+        Iterates over the items greater than or equal to minimum, in order.
+        """
+        index = bisect.bisect_left(self.__maxes, minimum)
+
+        if index == len(self.__maxes):
+            return
+
+        position = bisect.bisect_left(self.__buckets[index], minimum)
+
+        yield from self.__buckets[index][position:]
+        for bucket in self.__buckets[index + 1 :]:
+            yield from bucket
+
+    def __split(self, index: int):
+        """
+        Splits an oversized bucket into two halves.
+        """
+        bucket = self.__buckets[index]
+        half = len(bucket) // 2
+
+        self.__buckets[index : index + 1] = [bucket[:half], bucket[half:]]
+        self.__maxes[index : index + 1] = [bucket[half - 1], bucket[-1]]
@@ -0,0 +1,204 @@
+"""
+An event-driven timer engine.
+
+Timers are kept in a heap ordered by deadline. The runner thread sleeps on a condition
+variable until the earliest deadline, or until a new timer is scheduled, so it uses
+no CPU when idle. Scheduling is O(log n) and cancelling is O(1).
+"""
+
+import heapq
+import itertools
+import math
+import operator
+import time
+from threading import Condition, Thread
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from server.utils.logger import log_exception
+
+
+# pylint: disable=too-few-public-methods
+class Timer:
+    """
+    A handle of a scheduled callback, returned by TimerQueue.schedule.
+    """
+
+    # timers are created by the hundred thousand when stored alarms are restored
+    __slots__ = ("deadline", "callback", "arguments", "cancelled", "__sequence")
+
+    def __init__(
+        self,
+        deadline: float,
+        sequence: int,
+        callback: Callable[..., None],
+        arguments: Tuple = (),
+    ):
+        self.deadline = deadline
+        self.callback = callback
+        self.arguments = arguments
+        self.cancelled = False
+        # breaks ties between timers with the same deadline, in scheduling order
+        self.__sequence = sequence
+
+    def __lt__(self, other: "Timer") -> bool:
+        return (self.deadline, self.__sequence) < (other.deadline, other.__sequence)
+
+
+class TimerQueue:
+    """
+    Runs callbacks at their deadlines on a single runner thread.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        """
+        :params clock: The function used to tell the current time, in seconds.
+        Deadlines are given in the same unit.
+        """
+        self.__clock = clock
+        self.__condition = Condition()
+        self.__heap: List[Timer] = []
+        self.__sequence = itertools.count()
+        # number of cancelled timers still in the heap
+        self.__cancelled_count = 0
+        self.__thread: Optional[Thread] = None
+
+    def __len__(self) -> int:
+        """
+        Returns the number of pending timers.
+        """
+        with self.__condition:
+            return len(self.__heap) - self.__cancelled_count
+
+    def schedule(
+        self, deadline: float, callback: Callable[..., None], arguments: Tuple = ()
+    ) -> Timer:
+        """
+        Schedules a callback to run at the given deadline.
+
+        :params deadline: The time when the callback should run.
+        :params callback: The function to run.
+        :params arguments: The arguments the callback is called with.
+        :returns: A handle that can be given to cancel.
+        """
+        with self.__condition:
+            timer = Timer(deadline, next(self.__sequence), callback, arguments)
+            heapq.heappush(self.__heap, timer)
+
+            # wake up the runner only if the new timer is due before the one it waits for
+            if self.__heap[0] is timer:
+                self.__condition.notify()
+
+        return timer
+
+    def schedule_many(
+        self, timers: Iterable[Tuple[float, Callable[..., None], Tuple[Any, ...]]]
+    ) -> List[Timer]:
+        """
+        Schedules many callbacks at once. The heap is built in a single pass
+        instead of pushing every timer, unless there are few of them.
+        Passing arguments instead of binding them in closures saves
+        an object per timer for the garbage collector to scan.
+
+        :params timers: (deadline, callback, arguments) of every callback to run.
+        :returns: The handles of the timers, in the given order.
+        """
+        with self.__condition:
+            new_timers = [
+                Timer(deadline, next(self.__sequence), callback, arguments)
+                for deadline, callback, arguments in timers
+            ]
+
+            if not self.__heap:
+                # a sorted list is a heap. The sort is stable,
+                # so timers with the same deadline keep their scheduling order
+                self.__heap = sorted(new_timers, key=operator.attrgetter("deadline"))
+            elif len(new_timers) * math.log2(len(self.__heap)) < len(self.__heap):
+                # pushing a few timers is cheaper than rebuilding a large heap
+                for timer in new_timers:
+                    heapq.heappush(self.__heap, timer)
+            else:
+                self.__heap.extend(new_timers)
+                heapq.heapify(self.__heap)
+
+            self.__condition.notify()
+
+        return new_timers
+
+    def cancel(self, timer: Timer) -> bool:
+        """
+        Cancels a scheduled timer. The timer is only marked as cancelled,
+        and it is dropped when it reaches the top of the heap.
+
+        :params timer: The handle returned by schedule.
+        :returns: Whether the timer was pending.
+        """
+        with self.__condition:
+            if timer.cancelled:
+                return False
+
+            timer.cancelled = True
+            self.__cancelled_count += 1
+
+            # compact the heap when most of it is made of cancelled timers
+            if self.__cancelled_count > len(self.__heap) // 2:
+                self.__heap = [
+                    pending for pending in self.__heap if not pending.cancelled
+                ]
+                heapq.heapify(self.__heap)
+                self.__cancelled_count = 0
+
+            return True
+
+    def start(self) -> Thread:
+        """
+        Starts the runner thread, if it is not running yet.
+
+        :returns: The runner thread.
+        """
+        with self.__condition:
+            if self.__thread is None:
+                self.__thread = Thread(
+                    target=self.run_forever, name="timer-queue", daemon=True
+                )
+                self.__thread.start()
+
+            return self.__thread
+
+    def run_forever(self):
+        """
+        Runs due callbacks forever, blocking until the next deadline in between.
+        """
+        while True:
+            timer = self.__next_due_timer()
+
+            # one failing callback must not stop the runner
+            try:
+                timer.callback(*timer.arguments)
+            except Exception as callback_exception:  # pylint: disable=broad-except
+                log_exception(
+                    method="TimerQueue > run_forever", exception=callback_exception
+                )
+
+    def __next_due_timer(self) -> Timer:
+        """
+        Blocks until the earliest timer is due, then removes it from the heap.
+        """
+        with self.__condition:
+            while True:
+                while self.__heap and self.__heap[0].cancelled:
+                    heapq.heappop(self.__heap)
+                    self.__cancelled_count -= 1
+
+                if not self.__heap:
+                    self.__condition.wait()
+                    continue
+
+                delay = self.__heap[0].deadline - self.__clock()
+
+                if delay <= 0:
+                    timer = heapq.heappop(self.__heap)
+                    # a fired timer can no longer be cancelled
+                    timer.cancelled = True
+                    return timer
+
+                self.__condition.wait(timeout=delay)